@@ -1,18 +1,86 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Header, HTTPException, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
+from event_bus import event_bus
 from run_manager import run_manager, execute_act_run
 from nova.process_manager import process_manager
+from run_state import API_WORKERS, IDEMPOTENCY_KEY_TTL, RUN_COALESCING, is_active, run_state
+from scheduler import MAX_RUN_PRIORITY, scheduler, RunQueueFull
 from nova.types import Agent
+from nova.workflow import WorkflowError, plan
+from nova.result_cache import ACT_CACHE_MODE, CACHE_MODES
+from startup import startup
+from tracing import tracer
+from typing import Optional
 import asyncio
+import hashlib
+import json
+import re
+import sys
+import threading
+import time
+import metrics
+
+
+def _loaded(module: str):
+    """A module that warm-up (or a run) has already imported. Raises KeyError otherwise."""
+    return sys.modules[module]
+
+
+def _register_gauges():
+    # Gauges read heavy modules only once they are loaded; until then the
+    # lookup raises and the gauge is left out of the scrape.
+    metrics.Gauge("nova_runs_active", "Runs holding a scheduler slot.", lambda: scheduler.stats()["active"])
+    metrics.Gauge("nova_runs_queued", "Runs waiting for a scheduler slot.", lambda: scheduler.stats()["queued"])
+    metrics.Gauge("nova_threads", "Live threads in the API process.", threading.active_count)
+    metrics.Gauge(
+        "nova_event_queue_depth", "Run events buffered in memory before the spool.",
+        lambda: _loaded("db").event_sink.pending_count(),
+    )
+    metrics.Gauge(
+        "nova_event_spool_depth", "Spooled events and statuses not yet shipped to Supabase.",
+        lambda: _loaded("db").event_spool.pending_count(),
+    )
+    metrics.Gauge(
+        "nova_thinking_queue_depth", "Thinking lines waiting to be batched.",
+        lambda: _loaded("nova.thinking_dispatcher").thinking_dispatcher.pending_count(),
+    )
+    metrics.Gauge(
+        "nova_agent_pool_agents", "Pooled agents by state.",
+        lambda: {k: v for k, v in _loaded("nova.agent_factory").agent_pool.stats().items() if k in ("idle", "leased")},
+        labelnames=("state",),
+    )
+    metrics.Gauge(
+        "nova_execution_workers", "Execution backend worker processes by state.",
+        lambda: {k: v for k, v in _loaded("nova.execution_backend").execution_backend.stats().items() if k in ("idle", "busy")},
+        labelnames=("state",),
+    )
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("🚀 Nova Flow API starting up...")
     print("📚 Routes available at /docs")
+    startup.check_config()
+    _register_gauges()
+    await run_state.start()
+    warm_up = asyncio.create_task(startup.warm_up())
     yield
     print("🛑 Nova Flow API shutting down...")
+    warm_up.cancel()
+    await run_state.close()
+    # Only shut down what was actually started.
+    modules = sys.modules
+    if "nova.thinking_dispatcher" in modules:
+        modules["nova.thinking_dispatcher"].thinking_dispatcher.close()
+    if "db" in modules:
+        modules["db"].event_sink.close()
+        await asyncio.to_thread(modules["db"].event_spool.close)
+    if "nova.agent_factory" in modules:
+        await asyncio.to_thread(modules["nova.agent_factory"].agent_pool.shutdown)
+    if "nova.execution_backend" in modules:
+        await asyncio.to_thread(modules["nova.execution_backend"].execution_backend.shutdown)
 
 
 app = FastAPI(
@@ -40,27 +108,444 @@ async def root():
     }
 
 
+@app.get("/healthz", response_model=dict)
+async def healthz():
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz", response_model=dict)
+async def readyz():
+    """Readiness: warm-up has loaded every required dependency. Includes the startup profile."""
+    report = startup.report()
+    if not report["ready"]:
+        raise HTTPException(status_code=503, detail=report)
+    return report
+
+
+def _require_ready():
+    """
+    Refuse to dispatch runs until warm-up has loaded db and nova_act, so no run
+    imports them on the event loop.
+    """
+    if not startup.ready:
+        detail = "Server is warming up" if startup.finished_at is None else "Server failed to warm up, see /readyz"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": "1"})
+
+
+def _run_fingerprint(config: dict, tenant: Optional[str]) -> str:
+    """Hash of everything that decides what a run does, for spotting duplicate start requests."""
+    canonical = json.dumps({"tenant": tenant, **config}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+async def _claim_run(
+    run_id: str, fingerprint: str, tenant: Optional[str], idempotency_key: Optional[str], coalesce: bool,
+) -> tuple:
+    """
+    Reserve `run_id` for a start request. Returns (run_id, reason, claimed
+    keys): an existing run and what matched it ("config" or "idempotency_key"),
+    or `run_id` itself with reason None.
+    """
+    claimed = []
+    reason = None
+    if coalesce:
+        key = f"config:{fingerprint}"
+        bound, _ = await asyncio.to_thread(run_state.claim_key, key, run_id, fingerprint)
+        if bound == run_id:
+            claimed.append(key)
+        else:
+            run_id, reason = bound, "config"
+    if idempotency_key:
+        key = f"idempotency:{tenant or ''}:{idempotency_key}"
+        bound, bound_fingerprint = await asyncio.to_thread(
+            run_state.claim_key, key, run_id, fingerprint, IDEMPOTENCY_KEY_TTL
+        )
+        if bound != run_id:
+            await _release_keys(claimed, run_id)
+            if bound_fingerprint != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request")
+            return bound, "idempotency_key", []
+        if reason is None:
+            claimed.append(key)
+    return run_id, reason, claimed
+
+
+async def _release_keys(keys: list, run_id: str):
+    for key in keys:
+        await asyncio.to_thread(run_state.release_key, key, run_id)
+
+
+def _priority(data: dict) -> int:
+    """
+    The request's `priority`: an integer, or a string of digits, clamped to
+    ±MAX_RUN_PRIORITY so no tenant can jump the whole queue.
+    """
+    priority = data.get("priority")
+    if priority is None:
+        return 0
+    if isinstance(priority, str) and re.fullmatch(r"\s*[+-]?[0-9]+\s*", priority):
+        priority = int(priority)
+    if isinstance(priority, bool) or not isinstance(priority, int):
+        raise HTTPException(status_code=400, detail="priority must be an integer")
+    return max(-MAX_RUN_PRIORITY, min(MAX_RUN_PRIORITY, priority))
+
+
+def _trace_flag(data: dict) -> Optional[bool]:
+    """The request's `trace` field; None leaves the decision to sampling."""
+    trace = data.get("trace")
+    return None if trace is None else bool(trace)
+
+
 @app.post("/start-act", response_model=dict)
-async def start_act(data: dict):
+async def start_act(data: dict, idempotency_key: Optional[str] = Header(None)):
     """
-    Start a new Nova Act run. Executes immediately in the background.
+    Start a new Nova Act run. The run executes in the background as soon as the
+    scheduler has a free browser slot; until then its status is "queued".
+    Agents run on `url` and on each of `pages`; an optional `workflow` DAG of
+    steps bound to pages replaces that (see nova/workflow.py).
     Streams all events to Supabase — subscribe via Realtime on the frontend.
+
+    A request identical to one whose run is still active gets that run's id
+    instead of a new run (unless RUN_COALESCING=0 or `"coalesce": false`), as
+    does a repeat of an `Idempotency-Key` header (or `idempotency_key` field)
+    within IDEMPOTENCY_KEY_TTL seconds. The response then has `coalesced: true`.
+
+    `"trace": true` records the run's span timeline (GET /runs/{run_id}/trace);
+    otherwise a TRACE_SAMPLE_RATE fraction of runs is traced.
+
+    Answers 503 until the server is ready (see /readyz).
     """
+    _require_ready()
     url = data.get("url", "")
     pages = data.get("pages", [])
     agent_config = list(map(lambda x: Agent(**x), data.get("agent_config", [])))
+    tenant = data.get("tenant") or data.get("repo_id")
+    priority = _priority(data)
+    cache_mode = data.get("cache_mode", ACT_CACHE_MODE)
+    if cache_mode not in CACHE_MODES:
+        raise HTTPException(status_code=400, detail=f"cache_mode must be one of {', '.join(CACHE_MODES)}")
+    workflow = data.get("workflow")
+    try:
+        plan(url, pages, agent_config, workflow)
+    except WorkflowError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    config = {"url": url, "pages": pages, "agent_config": agent_config, "cache_mode": cache_mode}
+    if workflow:
+        config["workflow"] = workflow
+    tenant = str(tenant) if tenant is not None else None
+    config["tenant"] = tenant   # scopes cached browser sessions, and survives into checkpoints for resume
 
-    run_id = run_manager.create_run()
-    config = {"url": url, "pages": pages, "agent_config": agent_config}
+    run_id, reason, claimed = await _claim_run(
+        run_manager.create_run(),
+        _run_fingerprint(config, tenant),
+        tenant,
+        idempotency_key or data.get("idempotency_key"),
+        bool(data.get("coalesce", RUN_COALESCING)),
+    )
+    if reason is not None:
+        metrics.RUNS_COALESCED_TOTAL.inc(reason=reason)
+        run = await asyncio.to_thread(run_state.get, run_id)
+        position = scheduler.position(run_id)
+        return {
+            "run_id": run_id,
+            "status": run["status"] if run else "queued",
+            "queue_position": position,
+            "coalesced": True,
+            "traced": tracer.sampled(run_id),
+        }
+
+    try:
+        task = scheduler.submit(
+            run_id,
+            lambda: execute_act_run(run_id, config),
+            tenant=tenant,
+            priority=priority,
+        )
+    except RunQueueFull as e:
+        await _release_keys(claimed, run_id)
+        raise HTTPException(status_code=429, detail=str(e))
+
+    # The task cannot start before this handler yields, so its queue time is covered.
+    traced = tracer.start(run_id, _trace_flag(data))
     run_manager.store_run_config(run_id, config)
+    process_manager.register(run_id, task, config, tenant=tenant)
+    run_manager.register_task(run_id, task)
+
+    position = scheduler.position(run_id)
+    return {
+        "run_id": run_id,
+        "status": "running" if position == 0 else "queued",
+        "queue_position": position,
+        "coalesced": False,
+        "traced": traced,
+    }
+
+
+@app.get("/runs", response_model=dict)
+async def list_runs(status: Optional[str] = None, limit: int = 50, offset: int = 0):
+    """Runs known to this server (every worker's, with a shared run state), newest first. Finished runs age out."""
+    limit = max(1, min(limit, 500))
+    total, runs = await asyncio.to_thread(run_state.query, status, limit, max(0, offset))
+    return {
+        "total": total,
+        "limit": limit,
+        "offset": offset,
+        "runs": runs,
+    }
+
+
+@app.get("/runs/{run_id}", response_model=dict)
+async def get_run(run_id: str):
+    run = await asyncio.to_thread(run_state.get, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return {**run, "queue_position": scheduler.position(run_id)}
+
+
+async def _sse_frames(run_id: str, last_id: int):
+    yield "retry: 2000\n\n"
+    async for message in event_bus.subscribe(run_id, last_id):
+        if message.type == "heartbeat":
+            yield ": heartbeat\n\n"
+        elif message.id:
+            payload = {"type": message.type, "data": message.data, "created_at": message.created_at}
+            yield f"id: {message.id}\ndata: {json.dumps(payload, default=str)}\n\n"
+        else:
+            yield f"event: {message.type}\ndata: {json.dumps(message.data, default=str)}\n\n"
+
+
+@app.get("/runs/{run_id}/events")
+async def stream_run_events(run_id: str, after: int = 0, last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events stream of a run's events and statuses, straight from
+    this process (see event_bus.py); Supabase still receives them through the
+    spool. Each event carries an `id`; reconnecting with Last-Event-ID (or
+    `?after=`) resumes after it. Control events: "gap" (events were lost,
+    backfill from the database), "reset" (the id is ahead of the stream, which
+    starts over; reload from the database), "end" (the run finished).
+    """
+    try:
+        last_id = int(last_event_id) if last_event_id else max(0, after)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Last-Event-ID must be an event id")
+
+    if not event_bus.has_stream(run_id) and process_manager.get(run_id) is None:
+        run = await asyncio.to_thread(run_state.get, run_id)
+        if run is not None and is_active(run):
+            raise HTTPException(status_code=409, detail=f"Run is executing on worker {run['owner']}")
+        raise HTTPException(status_code=404, detail="No live event stream for this run")
+
+    return StreamingResponse(
+        _sse_frames(run_id, last_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/runs/{run_id}/trace")
+async def get_run_trace(run_id: str):
+    """
+    Download the run's span timeline as Chrome trace JSON, which opens in
+    chrome://tracing or ui.perfetto.dev (see tracing.py). Only traced runs
+    have one, kept by the worker that executed the run. A resumed run's
+    trace covers every attempt.
+    """
+    trace = await asyncio.to_thread(tracer.export, run_id)
+    if trace is None:
+        run = await asyncio.to_thread(run_state.get, run_id)
+        if run is not None and is_active(run) and process_manager.get(run_id) is None:
+            raise HTTPException(status_code=409, detail=f"Run is executing on worker {run['owner']}")
+        raise HTTPException(status_code=404, detail="No trace for this run")
+    return Response(
+        content=json.dumps(trace, default=str),
+        media_type="application/json",
+        headers={"Content-Disposition": f'attachment; filename="trace-{run_id}.json"'},
+    )
+
+
+@app.post("/runs/{run_id}/cancel", response_model=dict)
+async def cancel_run(run_id: str, wait: bool = False):
+    """
+    Cancel a queued or running run. Agents stop before their next step. On
+    the process backend, a worker still busy NOVA_CANCEL_GRACE seconds later
+    is killed; on the thread backend an act_get in flight cannot be
+    interrupted, so its browser is shut down once the step returns or hits
+    its deadline. With `wait`, respond once the run has released its
+    resources; `stopped` is false, and `agents_running` lists the agents,
+    while any are still busy. Runs owned by another API worker are
+    cancelled by that worker.
+    """
+    from nova.execution_backend import CANCEL_GRACE
+
+    run = await asyncio.to_thread(run_state.get, run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    record = process_manager.get(run_id)
+    task = record.task if record else None
+    if not is_active(run) or not await asyncio.to_thread(run_state.request_cancel, run_id):
+        raise HTTPException(status_code=409, detail=f"Run already {run['status']}")
 
-    task = asyncio.create_task(execute_act_run(run_id, config))
-    process_manager.register(run_id, task, config)
+    if wait and task is not None:
+        await asyncio.wait({task}, timeout=CANCEL_GRACE + 10)
+    elif wait:
+        # Owned by another worker: watch the shared state until it lets go.
+        deadline = time.monotonic() + CANCEL_GRACE + 10
+        while is_active(run) and time.monotonic() < deadline:
+            await asyncio.sleep(0.25)
+            run = await asyncio.to_thread(run_state.get, run_id)
+    run = await asyncio.to_thread(run_state.get, run_id)
+    running = run_manager.agents_running(run_id)
+    stopped = not is_active(run) and not running
+    status = (run["status"] if run else "cancelled") if stopped else "cancelling"
+    response = {"run_id": run_id, "status": status, "stopped": stopped}
+    if running:
+        response["agents_running"] = running
+    return response
+
+
+@app.post("/runs/{run_id}/resume", response_model=dict)
+async def resume_run(run_id: str, data: Optional[dict] = None):
+    """
+    Resume a failed or cancelled run from its checkpoints. Each agent restores
+    its saved browser session and continues from its first unfinished step.
+    The run keeps its id, so new events append to the same stream.
+    Answers 503 until the server is ready (see /readyz), and 409 while the run
+    is active anywhere, including when another resume of it won the race.
+    """
+    from checkpoints import checkpoint_store
+    from db import seed_event_positions
+
+    _require_ready()
+    data = data or {}
+    tenant = data.get("tenant") or data.get("repo_id")
+    priority = _priority(data)
+    run = await asyncio.to_thread(run_state.get, run_id)
+    if is_active(run):
+        raise HTTPException(status_code=409, detail="Run is still active")
+    state = await asyncio.to_thread(checkpoint_store.load, run_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="No checkpoints for this run")
+    if not await asyncio.to_thread(run_state.claim_run, run_id):
+        raise HTTPException(status_code=409, detail="Run is still active")
+    # Nothing below awaits until the run is registered, so this also settles
+    # concurrent resumes within this worker.
+    if scheduler.position(run_id) is not None or process_manager.is_running(run_id):
+        raise HTTPException(status_code=409, detail="Run is still active")
+
+    config = state["config"]
+    resume = state["agents"]
+    try:
+        task = scheduler.submit(
+            run_id,
+            lambda: execute_act_run(run_id, config, resume=resume),
+            tenant=str(tenant) if tenant is not None else None,
+            priority=priority,
+        )
+    except RunQueueFull as e:
+        await asyncio.to_thread(run_state.release_run, run_id, run["status"] if run else "failed")
+        raise HTTPException(status_code=429, detail=str(e))
+
+    # Before the run's first status ("queued" or "running") is published,
+    # which cannot happen until this handler awaits.
+    seed_event_positions(run_id, state)
+    traced = tracer.start(run_id, _trace_flag(data))
+    run_manager.store_run_config(run_id, config)
+    process_manager.register(run_id, task, config, tenant=str(tenant) if tenant is not None else None)
     run_manager.register_task(run_id, task)
 
-    return {"run_id": run_id}
+    position = scheduler.position(run_id)
+    return {
+        "run_id": run_id,
+        "status": "running" if position == 0 else "queued",
+        "queue_position": position,
+        "resumed_agents": {agent_id: cp["step"] + 1 for agent_id, cp in resume.items()},
+        "traced": traced,
+    }
+
+
+@app.get("/screenshots/{blob_id}")
+async def get_screenshot(blob_id: str, thumbnail: bool = False):
+    """Serve a screenshot referenced by a metadata event."""
+    from blob_store import screenshot_store, sniff_media_type
+
+    data = await asyncio.to_thread(screenshot_store.get, blob_id, thumbnail)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Screenshot not found")
+    return Response(
+        content=data,
+        media_type=sniff_media_type(data),
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus text exposition of latency histograms, counters and gauges."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/scheduler", response_model=dict)
+async def scheduler_stats():
+    return scheduler.stats()
+
+
+@app.get("/agent-pool", response_model=dict)
+async def agent_pool_stats():
+    from nova.agent_factory import agent_pool
+    return agent_pool.stats()
+
+
+@app.get("/execution-backend", response_model=dict)
+async def execution_backend_stats():
+    from nova.execution_backend import execution_backend
+    return execution_backend.stats()
+
+
+@app.get("/act-cache", response_model=dict)
+async def act_cache_stats():
+    from nova.result_cache import result_cache
+    return await asyncio.to_thread(result_cache.stats)
+
+
+@app.get("/session-cache", response_model=dict)
+async def session_cache_stats():
+    from nova.session_cache import session_cache
+    return await asyncio.to_thread(session_cache.stats)
+
+
+@app.get("/step-budgets", response_model=dict)
+async def step_budget_stats():
+    from nova.step_budget import step_budgets
+    return await asyncio.to_thread(step_budgets.stats)
+
+
+@app.get("/event-spool", response_model=dict)
+async def event_spool_stats():
+    from db import event_spool
+    return await asyncio.to_thread(event_spool.stats)
+
+
+@app.get("/event-bus", response_model=dict)
+async def event_bus_stats():
+    return event_bus.stats()
+
+
+@app.get("/tracing", response_model=dict)
+async def tracing_stats():
+    return tracer.stats()
+
+
+@app.get("/run-state", response_model=dict)
+async def run_state_stats():
+    return await asyncio.to_thread(run_state.stats)
 
 
 def start_server():
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    if API_WORKERS > 1:
+        # Each worker imports the app itself; runs are shared through run_state.
+        uvicorn.run("api:app", host="0.0.0.0", port=8000, workers=API_WORKERS)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
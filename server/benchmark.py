@@ -0,0 +1,378 @@
+"""
+Offline throughput benchmark for the run pipeline.
+
+Swaps in a scripted fake NovaAct and an in-process stand-in for the supabase
+client, then drives the /start-act handler at a fixed number of in-flight
+runs. Reports runs/sec, event-write throughput, p50/p99 event latency (from
+enqueue to the batched insert), peak thread count and peak RSS.
+
+    python main.py bench --runs 200 --concurrency 20 --steps 5 --step-latency 0.05
+
+No Nova Act key or Supabase project is needed. The fakes only exist in this
+process, so the benchmark always uses the thread execution backend.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+
+# ── Fake NovaAct ───────────────────────────────────────────────────────────────
+
+@dataclass
+class BenchProfile:
+    step_latency: float = 0.05      # seconds per act_get
+    thinking_lines: int = 5         # trace lines logged per act_get
+    failure_rate: float = 0.0       # probability that act_get raises
+    fault_rate: float = 0.1         # probability that a step reports a fault
+    create_latency: float = 0.0     # seconds to start a browser
+    db_latency: float = 0.005       # seconds per supabase call
+
+
+profile = BenchProfile()
+
+
+@dataclass(frozen=True)
+class FakeActMetadata:
+    prompt: str
+    num_steps_executed: int
+
+
+class FakeActTimeoutError(Exception):
+    pass
+
+
+class FakeActExceededMaxStepsError(Exception):
+    pass
+
+
+class _FakeResult:
+    def __init__(self, prompt: str, fault: bool):
+        self.metadata = FakeActMetadata(prompt, 1)
+        self.matches_schema = fault
+        self.parsed_response = {"faults": [{"message": "bench fault", "type": "bench", "traceback": ""}]} if fault else None
+
+
+class _FakeContext:
+    def storage_state(self) -> dict:
+        return {"cookies": [], "origins": []}
+
+    def add_cookies(self, cookies):
+        pass
+
+    def clear_cookies(self):
+        pass
+
+
+class _FakePage:
+    def __init__(self, url: str):
+        self.url = url
+        self.context = _FakeContext()
+
+    def page_errors(self) -> list:
+        return []
+
+    def evaluate(self, script, *args):
+        return 1
+
+    def is_closed(self) -> bool:
+        return False
+
+
+class FakeNovaAct:
+    def __init__(self, starting_page: str = "", **kwargs):
+        self.page = _FakePage(starting_page)
+        self._trace = logging.getLogger("nova_act.trace")
+
+    def start(self):
+        time.sleep(profile.create_latency)
+
+    def stop(self):
+        pass
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def go_to_url(self, url: str):
+        self.page.url = url
+
+    def act_get(self, prompt: str, timeout: Optional[float] = None, **kwargs):
+        if timeout is not None and profile.step_latency > timeout:
+            time.sleep(timeout)
+            raise FakeActTimeoutError(f"act_get timed out after {timeout}s")
+        time.sleep(profile.step_latency)
+        tag = f"{random.randrange(0xffff):04x}"
+        for i in range(profile.thinking_lines):
+            self._trace.info(f'{tag}> think("bench line {i} for {prompt}")')
+        if random.random() < profile.failure_rate:
+            raise RuntimeError("scripted failure")
+        return _FakeResult(prompt, random.random() < profile.fault_rate)
+
+
+def _install_fake_nova_act():
+    nova_act = types.ModuleType("nova_act")
+    nova_act.NovaAct = FakeNovaAct
+    nova_act.ActMetadata = FakeActMetadata
+    nova_act.ActTimeoutError = FakeActTimeoutError
+    nova_act.ActExceededMaxStepsError = FakeActExceededMaxStepsError
+    nova_act.GuardrailDecision = types.SimpleNamespace(PASS="pass")
+    nova_act.GuardrailInputState = object
+
+    callbacks = types.ModuleType("nova_act.tools.human.interface.human_input_callback")
+    callbacks.HumanInputCallbacksBase = object
+    callbacks.ApprovalResponse = dict
+    callbacks.UiTakeoverResponse = dict
+
+    sys.modules["nova_act"] = nova_act
+    for name in ("nova_act.tools", "nova_act.tools.human", "nova_act.tools.human.interface"):
+        sys.modules[name] = types.ModuleType(name)
+    sys.modules[callbacks.__name__] = callbacks
+    trace = logging.getLogger("nova_act.trace")
+    trace.setLevel(logging.INFO)
+    trace.propagate = False
+
+
+# ── Supabase stand-in ──────────────────────────────────────────────────────────
+
+class FakeSupabase:
+    """Just enough of the supabase client for db.py, recording what was written."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rows_written = 0              # events, after expanding compact batches
+        self.bytes_written = 0             # serialized size of the inserted rows
+        self.inserts = 0
+        self.latencies: List[float] = []   # seconds from event enqueue to insert
+        self.statuses: dict = {}
+
+    def table(self, name: str) -> "_FakeQuery":
+        return _FakeQuery(self, name)
+
+
+class _FakeQuery:
+    def __init__(self, client: FakeSupabase, table: str):
+        self.client = client
+        self.table = table
+        self._rows: Optional[list] = None
+        self._update: Optional[dict] = None
+        self._eq: Optional[tuple] = None
+
+    def insert(self, rows):
+        self._rows = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def update(self, values: dict):
+        self._update = values
+        return self
+
+    def eq(self, column: str, value):
+        self._eq = (column, value)
+        return self
+
+    def execute(self):
+        from event_codec import unpack_row
+
+        time.sleep(profile.db_latency)
+        now = time.time()
+        with self.client.lock:
+            if self._rows is not None:
+                self.client.inserts += 1
+                self.client.bytes_written += len(json.dumps(self._rows))
+                for event in (e for row in self._rows for e in unpack_row(row)):
+                    self.client.rows_written += 1
+                    created = event.get("created_at")
+                    if created:
+                        self.client.latencies.append(now - datetime.fromisoformat(created).timestamp())
+            if self._update is not None and self._eq:
+                self.client.statuses[self._eq[1]] = self._update.get("status")
+        return types.SimpleNamespace(data=self._rows or [])
+
+
+fake_supabase = FakeSupabase()
+
+
+def _install_fake_supabase():
+    supabase = types.ModuleType("supabase")
+    supabase.create_client = lambda url, key: fake_supabase
+    sys.modules["supabase"] = supabase
+
+
+# ── Driver ─────────────────────────────────────────────────────────────────────
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def _drive(args) -> dict:
+    import api
+    from scheduler import scheduler
+    from nova.process_manager import process_manager
+    from startup import startup
+
+    scheduler.max_concurrent = max(scheduler.max_concurrent, args.concurrency)
+    scheduler.max_queued = 0
+
+    agent = {
+        "id": "bench-agent",
+        "name": "bench",
+        "actions": [f"bench step {i}" for i in range(args.steps)],
+        "context": "",
+        "url": args.url,
+        "fileNames": [],
+        "config": {},
+        "selectedTools": [],
+        "created": "",
+    }
+    body = {
+        "url": args.url,
+        "pages": [],
+        "agent_config": [dict(agent, id=f"bench-agent-{i}") for i in range(args.agents)],
+        "coalesce": False,   # every client starts its own run
+    }
+
+    peak = {"threads": threading.active_count(), "rss_mb": _rss_mb()}
+    stop_sampling = asyncio.Event()
+
+    async def sample():
+        while not stop_sampling.is_set():
+            peak["threads"] = max(peak["threads"], threading.active_count())
+            peak["rss_mb"] = max(peak["rss_mb"], _rss_mb())
+            try:
+                await asyncio.wait_for(stop_sampling.wait(), 0.1)
+            except asyncio.TimeoutError:
+                pass
+
+    in_flight = asyncio.Semaphore(args.concurrency)
+
+    async def client():
+        async with in_flight:
+            started = await api.start_act(dict(body), idempotency_key=None)
+            task = process_manager.get(started["run_id"]).task
+            if task is not None:
+                await asyncio.wait({task})
+
+    sampler = asyncio.create_task(sample())
+    async with api.lifespan(api.app):
+        while startup.finished_at is None:
+            await asyncio.sleep(0.01)
+        if not startup.ready:
+            raise RuntimeError(f"Warm-up failed: {startup.report()['steps']}")
+        started_at = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(args.runs)))
+        elapsed = time.perf_counter() - started_at
+        stop_sampling.set()
+        await sampler
+
+    statuses = list(fake_supabase.statuses.values())
+    return {
+        "runs": args.runs,
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "runs_per_s": round(args.runs / elapsed, 2),
+        "completed": statuses.count("completed"),
+        "failed": statuses.count("failed"),
+        "events_written": fake_supabase.rows_written,
+        "inserts": fake_supabase.inserts,
+        "event_bytes_per_run": round(fake_supabase.bytes_written / args.runs),
+        "events_per_s": round(fake_supabase.rows_written / elapsed, 1),
+        "event_latency_p50_ms": _ms(_percentile(fake_supabase.latencies, 50)),
+        "event_latency_p99_ms": _ms(_percentile(fake_supabase.latencies, 99)),
+        "peak_threads": peak["threads"],
+        "peak_rss_mb": round(peak["rss_mb"], 1),
+    }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline Nova Flow throughput benchmark")
+    parser.add_argument("--runs", type=int, default=50, help="total runs to start")
+    parser.add_argument("--concurrency", type=int, default=10, help="runs kept in flight")
+    parser.add_argument("--agents", type=int, default=1, help="agents per run")
+    parser.add_argument("--steps", type=int, default=5, help="actions per agent")
+    parser.add_argument("--step-latency", type=float, default=profile.step_latency)
+    parser.add_argument("--thinking-lines", type=int, default=profile.thinking_lines)
+    parser.add_argument("--failure-rate", type=float, default=profile.failure_rate)
+    parser.add_argument("--fault-rate", type=float, default=profile.fault_rate)
+    parser.add_argument("--create-latency", type=float, default=profile.create_latency)
+    parser.add_argument("--db-latency", type=float, default=profile.db_latency)
+    parser.add_argument("--url", default="https://bench.invalid/")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="show server logs (scripted failures log errors)")
+    args = parser.parse_args(argv)
+
+    profile.step_latency = args.step_latency
+    profile.thinking_lines = args.thinking_lines
+    profile.failure_rate = args.failure_rate
+    profile.fault_rate = args.fault_rate
+    profile.create_latency = args.create_latency
+    profile.db_latency = args.db_latency
+
+    os.environ.setdefault("NOVA_ACT_API_KEY", "bench")
+    os.environ.setdefault("SUPABASE_URL", "http://supabase.bench.invalid")
+    os.environ.setdefault("SUPABASE_KEY", "bench")
+    os.environ["NOVA_EXECUTION_BACKEND"] = "thread"
+    os.environ["NOVA_ACT_CACHE_MODE"] = "off"
+    # Every on-disk store goes to a throwaway directory: a spool left behind would
+    # be shipped to the real Supabase by the next server start, and bench runs
+    # must not show up in, or evict from, the server's run state and caches.
+    spool_dir = tempfile.mkdtemp(prefix="nova-bench-")
+    os.environ["CHECKPOINT_DIR"] = os.path.join(spool_dir, "checkpoints")
+    os.environ["EVENT_SPOOL_PATH"] = os.path.join(spool_dir, "event_spool.sqlite3")
+    os.environ["RUN_STATE_PATH"] = os.path.join(spool_dir, "run_state.sqlite3")
+    os.environ["SCREENSHOT_DIR"] = os.path.join(spool_dir, "screenshots")
+    os.environ["NOVA_STEP_BUDGET_PATH"] = os.path.join(spool_dir, "step_budget.sqlite3")
+    os.environ["NOVA_SESSION_CACHE_PATH"] = os.path.join(spool_dir, "session_cache", "sessions.sqlite3")
+    os.environ["NOVA_ACT_CACHE_PATH"] = os.path.join(spool_dir, "act_cache.sqlite3")
+    _install_fake_nova_act()
+    _install_fake_supabase()
+    logging.basicConfig(level=logging.WARNING if args.verbose else logging.CRITICAL)
+
+    try:
+        report = asyncio.run(_drive(args))
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key, value in report.items():
+            print(f"{key:>22}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Content-addressed store for run screenshots.
+
+Screenshots used to travel inline as base64 in metadata events, which bloated
+every test_run_events row. They are now written once to local disk under the
+SHA-256 of their bytes, so identical frames are stored once, and events only
+carry a reference that the client resolves through GET /screenshots/{blob_id}.
+
+If Pillow is installed, a downscaled thumbnail is produced in a background
+thread after the original is stored.
+
+Blobs are evicted by age and total size, at most once per
+SCREENSHOT_SWEEP_INTERVAL, on the same background thread: a screenshot not
+stored again for SCREENSHOT_TTL seconds is deleted, and while the directory
+holds more than SCREENSHOT_MAX_BYTES the least recently stored blobs go
+first. Storing an identical frame again counts as recent. A reference to an
+evicted blob answers 404.
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Union
+
+logger = logging.getLogger(__name__)
+
+SCREENSHOT_DIR = os.getenv("SCREENSHOT_DIR", os.path.join(os.path.dirname(__file__), ".screenshots"))
+THUMBNAIL_SIZE = int(os.getenv("SCREENSHOT_THUMBNAIL_SIZE", "320"))  # longest edge in px, 0 disables
+SCREENSHOT_TTL = float(os.getenv("SCREENSHOT_TTL", str(30 * 24 * 3600)))      # 0 = keep regardless of age
+SCREENSHOT_MAX_BYTES = int(os.getenv("SCREENSHOT_MAX_BYTES", str(5 * 1024 ** 3)))   # 0 = no size cap
+SCREENSHOT_SWEEP_INTERVAL = float(os.getenv("SCREENSHOT_SWEEP_INTERVAL", "600"))
+
+BLOB_ID = re.compile(r"^[0-9a-f]{64}$")
+_DATA_URI = re.compile(r"^data:[^;,]+;base64,")
+
+
+def sniff_media_type(data: bytes) -> str:
+    if data.startswith(b"\x89PNG"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+class ScreenshotStore:
+    def __init__(
+        self,
+        directory: str = SCREENSHOT_DIR,
+        thumbnail_size: int = THUMBNAIL_SIZE,
+        ttl: float = SCREENSHOT_TTL,
+        max_bytes: int = SCREENSHOT_MAX_BYTES,
+        sweep_interval: Optional[float] = SCREENSHOT_SWEEP_INTERVAL,
+    ):
+        self.directory = directory
+        self.thumbnail_size = thumbnail_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sweep_interval = sweep_interval   # None: only sweep() evicts
+        self._thumbnailer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="thumbnailer")
+        self._swept_at: Optional[float] = None
+
+    def put(self, screenshot: Union[str, bytes]) -> str:
+        """Store a screenshot (raw bytes, base64 or a data URI) and return its blob id."""
+        data = self._decode(screenshot)
+        blob_id = hashlib.sha256(data).hexdigest()
+        path = self.path(blob_id)
+        if not os.path.exists(path):
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            if self.thumbnail_size:
+                self._thumbnailer.submit(self._make_thumbnail, blob_id, data)
+        else:
+            try:
+                os.utime(path)   # a frame stored again is recent again
+            except FileNotFoundError:
+                pass
+        if self.sweep_interval is not None and (
+            self._swept_at is None or time.monotonic() - self._swept_at >= self.sweep_interval
+        ):
+            self._swept_at = time.monotonic()
+            self._thumbnailer.submit(self.sweep)
+        return blob_id
+
+    def reference(self, screenshot: Union[str, bytes]) -> Optional[dict]:
+        """Store a screenshot and return the reference that replaces it in events."""
+        try:
+            blob_id = self.put(screenshot)
+        except Exception as e:
+            logger.warning(f"Failed to store screenshot: {e}")
+            return None
+        return {
+            "id": blob_id,
+            "url": f"/screenshots/{blob_id}",
+            "thumbnail_url": f"/screenshots/{blob_id}?thumbnail=true" if self.thumbnail_size else None,
+        }
+
+    def get(self, blob_id: str, thumbnail: bool = False) -> Optional[bytes]:
+        """Return the stored bytes, falling back to the original while a thumbnail is missing."""
+        if not BLOB_ID.match(blob_id):
+            return None
+        paths = [self.path(blob_id, thumbnail=True)] if thumbnail else []
+        paths.append(self.path(blob_id))
+        for path in paths:
+            try:
+                with open(path, "rb") as f:
+                    return f.read()
+            except FileNotFoundError:
+                continue
+        return None
+
+    def path(self, blob_id: str, thumbnail: bool = False) -> str:
+        return os.path.join(self.directory, f"{blob_id}.thumb" if thumbnail else blob_id)
+
+    def sweep(self) -> int:
+        """Delete blobs past the TTL, then the oldest ones while over the size cap. Returns how many."""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.warning(f"Failed to list screenshots: {e}")
+            return 0
+
+        now = time.time()
+        blobs = []   # (mtime, size, path) of originals, with their thumbnails folded in
+        removed = 0
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if name.endswith(".tmp"):
+                if now - stat.st_mtime > 3600:   # left behind by a crashed write
+                    self._remove(path)
+                continue
+            if not BLOB_ID.match(name):
+                continue
+            size = stat.st_size
+            try:
+                size += os.path.getsize(self.path(name, thumbnail=True))
+            except OSError:
+                pass
+            blobs.append((stat.st_mtime, size, path))
+
+        blobs.sort()
+        total = sum(size for _, size, _ in blobs)
+        for mtime, size, path in blobs:
+            expired = self.ttl and now - mtime > self.ttl
+            if not expired and not (self.max_bytes and total > self.max_bytes):
+                break
+            if self._remove(path):
+                removed += 1
+                total -= size
+                self._remove(f"{path}.thumb")
+        for name in names:
+            # Thumbnails whose original is gone.
+            if name.endswith(".thumb") and not os.path.exists(os.path.join(self.directory, name[:-len(".thumb")])):
+                self._remove(os.path.join(self.directory, name))
+        if removed:
+            logger.info(f"Evicted {removed} screenshots ({total / 1024 ** 2:.1f} MiB left)")
+        return removed
+
+    # ── Internals ──────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logger.warning(f"Failed to delete screenshot {os.path.basename(path)}: {e}")
+            return False
+
+    @staticmethod
+    def _decode(screenshot: Union[str, bytes]) -> bytes:
+        if isinstance(screenshot, bytes):
+            return screenshot
+        return base64.b64decode(_DATA_URI.sub("", screenshot.strip()))
+
+    def _make_thumbnail(self, blob_id: str, data: bytes):
+        try:
+            from io import BytesIO
+            from PIL import Image
+        except ImportError:
+            return
+
+        try:
+            image = Image.open(BytesIO(data))
+            image.thumbnail((self.thumbnail_size, self.thumbnail_size))
+            out = BytesIO()
+            image.convert("RGB").save(out, format="JPEG", quality=70)
+            path = self.path(blob_id, thumbnail=True)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(out.getvalue())
+            os.replace(tmp, path)
+        except Exception as e:
+            logger.warning(f"Failed to create thumbnail for screenshot {blob_id}: {e}")
+
+
+screenshot_store = ScreenshotStore()
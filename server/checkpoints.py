@@ -0,0 +1,157 @@
+"""
+Step-level checkpoints so a failed or cancelled run can be resumed.
+
+After every completed step an agent records the step index, the page URL it
+ended on and the browser storage state (cookies + localStorage). Checkpoints
+are kept on local disk, one JSON file per run next to the run config, because
+storage state carries session cookies and must not land in test_run_events.
+
+Resuming restores each agent's session and continues from the first step it
+had not finished; agents that had finished every step are skipped. The file
+also records where the run's numbering stands (noted with every checkpoint
+and when the run stops): "event_seq", the seq its next test_run_events row
+gets, and "stream_id", the id of its next event_bus message. A run resumed in
+another process, or after a restart, numbers on from there.
+Checkpoints for a run are deleted once it completes. Those of failed and
+cancelled runs are kept so the run can be resumed, until they are
+CHECKPOINT_TTL seconds old; expired files are swept when a run begins, at most
+once per CHECKPOINT_SWEEP_INTERVAL.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = os.getenv("CHECKPOINT_DIR", os.path.join(os.path.dirname(__file__), ".checkpoints"))
+CHECKPOINT_TTL = float(os.getenv("CHECKPOINT_TTL", str(7 * 24 * 3600)))
+CHECKPOINT_SWEEP_INTERVAL = float(os.getenv("CHECKPOINT_SWEEP_INTERVAL", "3600"))
+
+
+class CheckpointStore:
+    def __init__(self, directory: str = CHECKPOINT_DIR, ttl: float = CHECKPOINT_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._swept_at: Optional[float] = None
+
+    def begin(self, run_id: str, config: dict):
+        """Record the run config so the run can be rebuilt by `resume`."""
+        with self._lock:
+            if self._swept_at is None or time.monotonic() - self._swept_at >= CHECKPOINT_SWEEP_INTERVAL:
+                self._sweep()
+            state = self._read(run_id) or {"agents": {}}
+            state["config"] = config
+            self._write(run_id, state)
+
+    def save(self, run_id: str, agent_id: str, checkpoint: dict, positions: Optional[Dict[str, int]] = None):
+        """Record that `agent_id` finished step `checkpoint["step"]`, and where the run's numbering stands."""
+        with self._lock:
+            state = self._read(run_id)
+            if state is None:
+                return
+            state["agents"][agent_id] = checkpoint
+            _advance(state, positions or {})
+            self._write(run_id, state)
+
+    def note_positions(self, run_id: str, positions: Dict[str, int]):
+        """Record where the run's numbering stands, if the run still has checkpoints."""
+        with self._lock:
+            state = self._read(run_id)
+            if state is not None and _advance(state, positions):
+                self._write(run_id, state)
+
+    def load(self, run_id: str) -> Optional[dict]:
+        """Return {"config": ..., "agents": {agent_id: checkpoint}, "event_seq": ..., "stream_id": ...} or None."""
+        with self._lock:
+            return self._read(run_id)
+
+    def agents(self, run_id: str) -> Dict[str, dict]:
+        state = self.load(run_id)
+        return state["agents"] if state else {}
+
+    def discard(self, run_id: str):
+        with self._lock:
+            try:
+                os.remove(self._path(run_id))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to delete checkpoints for run {run_id}: {e}")
+
+    def sweep(self) -> int:
+        """Delete checkpoint files not written for `ttl` seconds. Returns how many were removed."""
+        with self._lock:
+            return self._sweep()
+
+    # ── Internals ──────────────────────────────────────────────────────────────
+
+    def _sweep(self) -> int:
+        """Lock must be held."""
+        self._swept_at = time.monotonic()
+        cutoff = time.time() - self.ttl
+        removed = 0
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return 0
+        except OSError as e:
+            logger.warning(f"Failed to list checkpoints: {e}")
+            return 0
+        for name in names:
+            if not name.endswith((".json", ".json.tmp")):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Failed to delete expired checkpoint {name}: {e}")
+        if removed:
+            logger.info(f"Removed {removed} expired checkpoint files")
+        return removed
+
+    def _path(self, run_id: str) -> str:
+        return os.path.join(self.directory, f"{os.path.basename(run_id)}.json")
+
+    def _read(self, run_id: str) -> Optional[dict]:
+        try:
+            with open(self._path(run_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.error(f"Failed to read checkpoints for run {run_id}: {e}")
+            return None
+
+    def _write(self, run_id: str, state: dict):
+        path = self._path(run_id)
+        tmp = f"{path}.tmp"
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            # Storage state holds session cookies, so the file is readable by its owner only.
+            with os.fdopen(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+                json.dump(state, f)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError) as e:
+            logger.error(f"Failed to write checkpoints for run {run_id}: {e}")
+
+
+def _advance(state: dict, positions: Dict[str, int]) -> bool:
+    """Move `state`'s numbering positions forward (never back). Returns whether any moved."""
+    moved = False
+    for key, value in positions.items():
+        if value > state.get(key, 0):
+            state[key] = value
+            moved = True
+    return moved
+
+
+checkpoint_store = CheckpointStore()
@@ -1,30 +1,104 @@
 import json
 import logging
+from datetime import datetime, timezone
 from supabase import create_client
 import os
 
+import metrics
+from event_bus import event_bus
+from event_codec import pack_rows
+from event_sink import EventSink
+from spool import EventSpool
+from tracing import tracer
+
 logger = logging.getLogger(__name__)
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "50"))
+EVENT_FLUSH_INTERVAL = float(os.getenv("EVENT_FLUSH_INTERVAL", "0.25"))
+
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 
+def insert_events(rows: list[dict]) -> None:
+    """
+    Write a batch of test_run_events rows in a single multi-row insert, one
+    row per event, or packed into the compact format (see event_codec.py)
+    with EVENT_FORMAT=compact.
+    """
+    with tracer.span_each("db.insert_events", (row["run_id"] for row in rows), rows=len(rows)):
+        supabase.table("test_run_events").insert(pack_rows(rows)).execute()
+
+
+def write_run_status(run_id: str, status: str) -> None:
+    with tracer.span("db.write_run_status", run_id=run_id, status=status):
+        supabase.table("test_runs").update({"status": status}).eq("id", run_id).execute()
+
+
+# Events are batched in memory, then appended to the local spool, which ships
+# them (and status changes) to Supabase in the background with retries.
+event_spool = EventSpool(insert_events, write_run_status)
+event_sink = EventSink(
+    event_spool.append_events, max_batch=EVENT_BATCH_SIZE, flush_interval=EVENT_FLUSH_INTERVAL, seq_field="seq",
+)
+
+
 def persist_event(run_id: str, event_type: str, data) -> None:
-    """Insert a single streaming event into test_run_events. data column is text (JSON string)."""
+    """
+    Publish a streaming event to live SSE subscribers and queue it for
+    test_run_events. data column is text (JSON string).
+    """
     try:
-        supabase.table("test_run_events").insert({
-            "run_id": run_id,
-            "type": event_type,
-            "data": json.dumps(data),
-        }).execute()
+        with metrics.PERSIST_EVENT_SECONDS.time(type=event_type):
+            created_at = datetime.now(timezone.utc).isoformat()
+            event_bus.publish(run_id, event_type, data, created_at)
+            event_sink.put(run_id, {
+                "run_id": run_id,
+                "type": event_type,
+                "data": json.dumps(data),
+                "created_at": created_at,
+            })
     except Exception as e:
         logger.error(f"Failed to persist event '{event_type}' for run {run_id}: {e}")
 
 
+def flush_events(run_id: str, timeout: float = 10.0) -> bool:
+    """Block until every event queued for run_id has been written to the spool."""
+    return event_sink.flush(run_id, timeout=timeout)
+
+
+def event_positions(run_id: str) -> dict:
+    """Where the run's numbering stands: its next event seq and event_bus id (see checkpoints.py)."""
+    return {"event_seq": event_sink.next_seq(run_id), "stream_id": event_bus.next_id(run_id)}
+
+
+def seed_event_positions(run_id: str, positions: dict) -> None:
+    """Number a resumed run's events on from `event_positions` recorded before it stopped."""
+    if positions.get("event_seq"):
+        event_sink.seed_seq(run_id, positions["event_seq"])
+    if positions.get("stream_id"):
+        event_bus.seed(run_id, positions["stream_id"])
+
+
 def update_run_status(run_id: str, status: str) -> None:
-    try:
-        supabase.table("test_runs").update({"status": status}).eq("id", run_id).execute()
-    except Exception as e:
-        logger.error(f"Failed to update status for run {run_id}: {e}")
+    """
+    Spool a test_runs.status update. Terminal statuses first flush the run's
+    queued events into the spool, so the status never lands before the
+    events it closes. Never waits on Supabase.
+    """
+    with metrics.UPDATE_RUN_STATUS_SECONDS.time(status=status), tracer.span(
+        "db.update_run_status", run_id=run_id, status=status,
+    ):
+        if status in TERMINAL_STATUSES:
+            flush_events(run_id)
+            event_sink.forget(run_id)
+            metrics.RUNS_FINISHED_TOTAL.inc(status=status)
+        event_bus.publish(run_id, "status", status)
+        try:
+            event_spool.append_status(run_id, status)
+        except Exception as e:
+            logger.error(f"Failed to update status for run {run_id}: {e}")
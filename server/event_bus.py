@@ -0,0 +1,222 @@
+"""
+In-process event bus behind GET /runs/{run_id}/events.
+
+persist_event and update_run_status publish every run event and status here
+as well as to the Supabase spool, so a live view streaming over SSE sees an
+event as soon as it is produced rather than after the spool has shipped it
+and Realtime has echoed it back.
+
+Each run keeps its last `buffer_size` messages in a ring buffer, numbered
+from 1 in publish order. A resumed run numbers on from where it stopped (the
+checkpoint records it, see checkpoints.py), so ids stay monotonic even after
+the stream expired or when it is resumed on another worker. A subscriber
+passes the last id it saw (Last-Event-ID) and first gets what it missed from
+the buffer. If the buffer no longer reaches back that far, it gets a "gap"
+message and should backfill from the database. If the id is ahead of the
+stream, which numbering could not be carried over, it gets a "reset" message
+and the stream from its start. A subscriber that falls `max_queue` messages
+behind is disconnected with a gap too, and can reconnect from where it
+stopped.
+
+Publishing never blocks and may happen on any thread; subscribers are
+asyncio consumers. A run's stream is dropped `ttl` seconds after the run
+finishes.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import AsyncIterator, Deque, Dict, NamedTuple, Optional, Set
+
+from nova.process_manager import FINISHED_STATUSES
+
+logger = logging.getLogger(__name__)
+
+EVENT_BUS_BUFFER_SIZE = int(os.getenv("EVENT_BUS_BUFFER_SIZE", "1000"))
+EVENT_BUS_MAX_QUEUE = int(os.getenv("EVENT_BUS_MAX_QUEUE", "500"))
+EVENT_BUS_TTL = float(os.getenv("EVENT_BUS_TTL", "300"))
+EVENT_BUS_HEARTBEAT = float(os.getenv("EVENT_BUS_HEARTBEAT", "15"))
+
+
+class Message(NamedTuple):
+    id: int             # 1-based position in the run's stream; 0 for control messages
+    type: str           # event type, "status", or a control type: "gap" / "reset" / "end" / "heartbeat"
+    data: object
+    created_at: str
+
+
+class _Subscriber:
+    def __init__(self, loop: asyncio.AbstractEventLoop, max_queue: int):
+        self.loop = loop
+        self.queue: "asyncio.Queue[Message]" = asyncio.Queue()
+        self.max_queue = max_queue
+        self.lagging = False
+
+    def offer(self, message: Message):
+        """Runs on the subscriber's loop."""
+        if self.lagging:
+            return
+        if self.queue.qsize() >= self.max_queue:
+            self.lagging = True
+        self.queue.put_nowait(message)
+
+
+class _RunStream:
+    def __init__(self, buffer_size: int):
+        self.buffer: Deque[Message] = deque(maxlen=buffer_size)
+        self.next_id = 1
+        self.subscribers: Set[_Subscriber] = set()
+        self.finished_at: Optional[float] = None
+
+
+class EventBus:
+    def __init__(
+        self,
+        buffer_size: int = EVENT_BUS_BUFFER_SIZE,
+        max_queue: int = EVENT_BUS_MAX_QUEUE,
+        ttl: float = EVENT_BUS_TTL,
+    ):
+        self.buffer_size = max(1, buffer_size)
+        self.max_queue = max(1, max_queue)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._runs: Dict[str, _RunStream] = {}
+        self._counters = {"published": 0, "gaps": 0, "resets": 0, "lagged": 0}
+
+    def publish(self, run_id: str, event_type: str, data, created_at: Optional[str] = None):
+        """Append a message to the run's stream and hand it to its subscribers. Never blocks."""
+        created_at = created_at or datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            stream = self._stream(run_id)
+            message = Message(stream.next_id, event_type, data, created_at)
+            stream.next_id += 1
+            stream.buffer.append(message)
+            finished = event_type == "status" and data in FINISHED_STATUSES
+            if event_type == "status":
+                # A resumed run streams again under the same id.
+                stream.finished_at = time.monotonic() if finished else None
+            subscribers = list(stream.subscribers)
+            self._counters["published"] += 1
+        for sub in subscribers:
+            self._deliver(sub, message)
+            if finished:
+                self._deliver(sub, Message(0, "end", data, created_at))
+
+    def next_id(self, run_id: str) -> int:
+        """The id the run's next message will get."""
+        with self._lock:
+            self._prune()
+            stream = self._runs.get(run_id)
+            return stream.next_id if stream is not None else 1
+
+    def seed(self, run_id: str, next_id: int):
+        """Number the run's next message at least `next_id`, e.g. for a run resumed in another process."""
+        with self._lock:
+            stream = self._stream(run_id)
+            stream.next_id = max(stream.next_id, next_id)
+
+    def has_stream(self, run_id: str) -> bool:
+        with self._lock:
+            self._prune()
+            return run_id in self._runs
+
+    async def subscribe(self, run_id: str, last_id: int = 0, heartbeat: float = EVENT_BUS_HEARTBEAT) -> AsyncIterator[Message]:
+        """
+        Messages of the run after `last_id`: the buffered backlog, then live
+        ones until the run finishes. Yields a "heartbeat" message after
+        `heartbeat` idle seconds, and ends with "end" or, when messages were
+        lost, with "gap". A `last_id` the stream has not reached yet starts
+        over with a "reset" message.
+        """
+        sub = _Subscriber(asyncio.get_running_loop(), self.max_queue)
+        with self._lock:
+            stream = self._stream(run_id)
+            reset = None
+            if last_id >= stream.next_id:
+                reset = {"after": last_id, "head": stream.next_id - 1}
+                last_id = 0
+            backlog = [m for m in stream.buffer if m.id > last_id]
+            first = backlog[0].id if backlog else stream.next_id
+            missed = first > last_id + 1
+            finished = stream.finished_at is not None
+            if not finished:
+                stream.subscribers.add(sub)
+        try:
+            if reset:
+                self._counters["resets"] += 1
+                yield Message(0, "reset", reset, _now())
+            if missed:
+                self._counters["gaps"] += 1
+                yield Message(0, "gap", {"after": last_id, "resumes_at": first}, _now())
+            for message in backlog:
+                last_id = message.id
+                yield message
+            if finished:
+                yield Message(0, "end", None, _now())
+                return
+            while True:
+                try:
+                    message = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield Message(0, "heartbeat", None, _now())
+                    continue
+                if message.id and message.id <= last_id:
+                    continue
+                if message.type == "end":
+                    yield message
+                    return
+                if sub.lagging and sub.queue.empty():
+                    self._counters["lagged"] += 1
+                    yield message
+                    yield Message(0, "gap", {"after": message.id, "resumes_at": None}, _now())
+                    return
+                last_id = message.id
+                yield message
+        finally:
+            with self._lock:
+                stream.subscribers.discard(sub)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._prune()
+            return {
+                "runs": len(self._runs),
+                "subscribers": sum(len(s.subscribers) for s in self._runs.values()),
+                "buffered": sum(len(s.buffer) for s in self._runs.values()),
+                "buffer_size": self.buffer_size,
+                **self._counters,
+            }
+
+    # ── Internals ──────────────────────────────────────────────────────────────
+
+    def _stream(self, run_id: str) -> _RunStream:
+        """The run's stream, created on first use. Lock must be held."""
+        self._prune()
+        stream = self._runs.get(run_id)
+        if stream is None:
+            stream = self._runs[run_id] = _RunStream(self.buffer_size)
+        return stream
+
+    def _prune(self):
+        """Drop streams of runs that finished more than `ttl` seconds ago. Lock must be held."""
+        cutoff = time.monotonic() - self.ttl
+        for run_id in [r for r, s in self._runs.items() if s.finished_at is not None and s.finished_at < cutoff]:
+            del self._runs[run_id]
+
+    @staticmethod
+    def _deliver(sub: _Subscriber, message: Message):
+        try:
+            sub.loop.call_soon_threadsafe(sub.offer, message)
+        except RuntimeError:
+            pass   # the subscriber's loop is closed
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+event_bus = EventBus()
@@ -0,0 +1,193 @@
+"""
+Compact encoding for the test_run_events stream.
+
+The default (EVENT_FORMAT=json) stores every event as its own row whose `data`
+column is a JSON string, which is what existing queries of the table expect.
+The compact format is opt-in (EVENT_FORMAT=compact), for deployments whose
+readers all go through `unpack_row` or src/lib/eventCodec.ts. In it, the
+events of one run that are shipped together become a single row of type
+"batch" whose `data` is an envelope:
+
+    nf1:<codec>:<payload>
+
+    codec    j  payload is the envelope JSON
+             z  payload is base64 of the zlib-compressed JSON
+             s  payload is base64 of the zstd-compressed JSON (analytics only;
+                browsers cannot inflate it)
+
+    envelope {"v": 1, "s": <seq of the first event>, "t": <epoch ms of the first event>,
+              "e": [[<type code>, <ms since the previous event>, <data>], ...]}
+
+Type codes are listed in TYPE_CODES; a type without a code is written out in
+full. Fault rows stay standalone, in the legacy format, because fault counts
+are computed by filtering on the type column.
+
+`unpack_row` turns a stored row back into legacy-shaped rows (plus `seq`).
+src/lib/eventCodec.ts is the frontend counterpart.
+"""
+
+import base64
+import json
+import logging
+import os
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+PREFIX = f"nf{FORMAT_VERSION}:"
+BATCH_TYPE = "batch"
+STANDALONE_TYPES = ("fault",)
+
+TYPE_CODES = {
+    "metadata": "m",
+    "thinking": "t",
+    "fault": "f",
+    "page_error": "p",
+    "error": "e",
+    "status": "s",
+    "step_timeout": "d",
+}
+TYPE_NAMES = {code: name for name, code in TYPE_CODES.items()}
+
+EVENT_FORMAT = os.getenv("EVENT_FORMAT", "json")                       # json (one row per event) | compact
+EVENT_COMPRESSION = os.getenv("EVENT_COMPRESSION", "zlib")             # zlib | zstd | none
+EVENT_COMPRESS_MIN_BYTES = int(os.getenv("EVENT_COMPRESS_MIN_BYTES", "256"))
+
+if EVENT_FORMAT == "compact" and EVENT_COMPRESSION == "zstd":
+    logger.warning("EVENT_COMPRESSION=zstd: src/lib/eventCodec.ts can only inflate zlib envelopes")
+
+
+def _zstd() -> Optional[tuple]:
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard.ZstdCompressor().compress, zstandard.ZstdDecompressor().decompress
+
+
+# ── Encoding ───────────────────────────────────────────────────────────────────
+
+def pack_rows(rows: List[dict], event_format: str = EVENT_FORMAT) -> List[dict]:
+    """Turn queued test_run_events rows into the rows to insert, in order."""
+    if event_format != "compact":
+        return [{k: v for k, v in row.items() if k != "seq"} for row in rows]
+
+    packed: List[dict] = []
+    pending: Dict[str, List[dict]] = {}   # run_id -> events waiting to be batched
+
+    def flush(run_id: str):
+        events = pending.pop(run_id, None)
+        if events:
+            packed.append({
+                "run_id": run_id,
+                "type": BATCH_TYPE,
+                "data": encode_events(events),
+                "created_at": events[0].get("created_at"),
+            })
+
+    for row in rows:
+        if row["type"] in STANDALONE_TYPES:
+            # Keep the row after the events that were queued before it.
+            flush(row["run_id"])
+            packed.append({k: v for k, v in row.items() if k != "seq"})
+            continue
+        events = pending.get(row["run_id"])
+        if events and not _follows(events[-1].get("seq"), row.get("seq")):
+            # An envelope stores only its first seq, so a gap starts a new one.
+            flush(row["run_id"])
+        pending.setdefault(row["run_id"], []).append(row)
+    for run_id in list(pending):
+        flush(run_id)
+    return packed
+
+
+def _follows(previous: Optional[int], seq: Optional[int]) -> bool:
+    if previous is None or seq is None:
+        return previous is None and seq is None
+    return seq == previous + 1
+
+
+def encode_events(rows: List[dict], compression: str = EVENT_COMPRESSION) -> str:
+    """
+    Envelope for rows of one run, each with type, data (a JSON string),
+    created_at and seq. The seqs must be consecutive (see pack_rows).
+    """
+    base = _epoch_ms(rows[0].get("created_at"))
+    previous = base
+    entries = []
+    for row in rows:
+        at = _epoch_ms(row.get("created_at"))
+        entries.append([TYPE_CODES.get(row["type"], row["type"]), at - previous, json.loads(row["data"])])
+        previous = at
+    envelope = {"v": FORMAT_VERSION, "s": rows[0].get("seq"), "t": base, "e": entries}
+    return _wrap(json.dumps(envelope, separators=(",", ":")), compression)
+
+
+def _wrap(text: str, compression: str) -> str:
+    if compression != "none" and len(text) >= EVENT_COMPRESS_MIN_BYTES:
+        codec, compress = "z", lambda b: zlib.compress(b, 6)
+        if compression == "zstd":
+            zstd = _zstd()
+            if zstd is not None:
+                codec, compress = "s", zstd[0]
+        body = compress(text.encode())
+        if len(body) * 4 / 3 < len(text):
+            return f"{PREFIX}{codec}:{base64.b64encode(body).decode()}"
+    return f"{PREFIX}j:{text}"
+
+
+def _epoch_ms(created_at: Optional[str]) -> int:
+    if not created_at:
+        return int(time.time() * 1000)
+    return int(datetime.fromisoformat(created_at).timestamp() * 1000)
+
+
+# ── Decoding ───────────────────────────────────────────────────────────────────
+
+def decode(data: str) -> dict:
+    """Parse an `nf1:` envelope."""
+    if not data.startswith(PREFIX):
+        raise ValueError("Not a compact event envelope")
+    codec, payload = data[len(PREFIX):].split(":", 1)
+    if codec == "j":
+        text = payload
+    else:
+        decompress: Callable[[bytes], bytes]
+        if codec == "z":
+            decompress = zlib.decompress
+        elif codec == "s":
+            zstd = _zstd()
+            if zstd is None:
+                raise ValueError("zstd envelope but the zstandard package is not installed")
+            decompress = zstd[1]
+        else:
+            raise ValueError(f"Unknown envelope codec '{codec}'")
+        text = decompress(base64.b64decode(payload)).decode()
+    envelope = json.loads(text)
+    if envelope.get("v") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported envelope version {envelope.get('v')}")
+    return envelope
+
+
+def unpack_row(row: dict) -> List[dict]:
+    """Expand a stored test_run_events row into legacy-shaped rows, each with a `seq` (None if unknown)."""
+    if row.get("type") != BATCH_TYPE:
+        return [{**row, "seq": row.get("seq")}]
+    envelope = decode(row["data"])
+    at = envelope["t"]
+    seq = envelope.get("s")
+    expanded = []
+    for i, (code, delta, data) in enumerate(envelope["e"]):
+        at += delta
+        expanded.append({
+            "run_id": row.get("run_id"),
+            "type": TYPE_NAMES.get(code, code),
+            "data": json.dumps(data),
+            "created_at": datetime.fromtimestamp(at / 1000, timezone.utc).isoformat(),
+            "seq": None if seq is None else seq + i,
+        })
+    return expanded
@@ -0,0 +1,235 @@
+"""
+Buffers run events in memory and writes them to Supabase in multi-row inserts.
+
+Callers (the event loop, the act worker thread, the thinking streamer) only
+append to a per-run buffer, which never blocks on the network. A single
+background flusher thread writes a run's buffer once it reaches `max_batch`
+rows or has been waiting for `flush_interval` seconds. Because one thread
+writes every batch and each run's rows stay in append order, events for a
+run are stored in the order they were produced.
+
+With `seq_field` set, `put` numbers each run's rows in that field, under the
+same lock that appends them, so the numbers follow the stored order. A run's
+numbering survives `forget`, so a resumed run carries on from where it
+stopped; the counters of the latest `keep_seqs` forgotten runs are kept.
+
+`flush(run_id)` blocks until everything queued for that run so far has been
+written, which lets status updates be ordered after the events they close.
+`flush_async(run_id)` is the same wait for the event loop; the flusher
+resolves it with `call_soon_threadsafe`, so no executor thread is held.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EventSink:
+    def __init__(
+        self,
+        writer: Callable[[List[dict]], None],
+        max_batch: int = 50,
+        flush_interval: float = 0.25,
+        seq_field: Optional[str] = None,
+        keep_seqs: int = 10000,
+    ):
+        self.writer = writer
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.seq_field = seq_field
+        self.keep_seqs = keep_seqs
+
+        self._cond = threading.Condition()
+        self._pending: Dict[str, List[dict]] = {}   # run_id -> rows not yet written
+        self._first_at: Dict[str, float] = {}       # run_id -> monotonic time of oldest pending row
+        self._enqueued: Dict[str, int] = {}         # run_id -> rows accepted so far
+        self._written: Dict[str, int] = {}          # run_id -> rows handled by the flusher so far
+        self._seqs: Dict[str, int] = {}             # run_id -> next seq_field value
+        self._forgotten: "OrderedDict[str, None]" = OrderedDict()   # forgotten runs whose seq is kept, oldest first
+        self._urgent: set = set()                   # run_ids with a flush() waiting on them
+        self._waiters: List[tuple] = []             # (run_id, target, loop, future) from flush_async()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+    # ── Producer side ──────────────────────────────────────────────────────────
+
+    def put(self, run_id: str, row: dict):
+        """Queue one row for `run_id`. Returns immediately."""
+        row.setdefault("created_at", datetime.now(timezone.utc).isoformat())
+        with self._cond:
+            self._ensure_started()
+            rows = self._pending.setdefault(run_id, [])
+            was_empty = not rows
+            if was_empty:
+                self._first_at[run_id] = time.monotonic()
+            if self.seq_field:
+                row[self.seq_field] = self._seqs.get(run_id, 0)
+                self._seqs[run_id] = row[self.seq_field] + 1
+                self._forgotten.pop(run_id, None)
+            rows.append(row)
+            self._enqueued[run_id] = self._enqueued.get(run_id, 0) + 1
+            if was_empty or len(rows) >= self.max_batch:
+                self._cond.notify_all()
+
+    def flush(self, run_id: str, timeout: Optional[float] = 10.0) -> bool:
+        """
+        Block until every row queued for `run_id` before this call has been
+        written (or dropped after a failed write). Returns False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self._enqueued.get(run_id, 0)
+            if self._written.get(run_id, 0) >= target:
+                return True
+            self._urgent.add(run_id)
+            self._cond.notify_all()
+            while self._written.get(run_id, 0) < target:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    logger.warning(f"Timed out flushing events for run {run_id}")
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    async def flush_async(self, run_id: str, timeout: Optional[float] = 10.0) -> bool:
+        """Awaitable `flush`. Returns False on timeout."""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            target = self._enqueued.get(run_id, 0)
+            if self._written.get(run_id, 0) >= target:
+                return True
+            future = loop.create_future()
+            self._waiters.append((run_id, target, loop, future))
+            self._urgent.add(run_id)
+            self._cond.notify_all()
+        try:
+            await asyncio.wait_for(future, timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f"Timed out flushing events for run {run_id}")
+            return False
+        finally:
+            with self._cond:
+                self._waiters = [w for w in self._waiters if w[3] is not future]
+
+    def forget(self, run_id: str):
+        """Drop bookkeeping for a finished run once its buffer is empty."""
+        with self._cond:
+            if not self._pending.get(run_id):
+                self._pending.pop(run_id, None)
+                self._first_at.pop(run_id, None)
+                self._enqueued.pop(run_id, None)
+                self._written.pop(run_id, None)
+                self._urgent.discard(run_id)
+                if run_id in self._seqs:
+                    self._forgotten[run_id] = None
+                    self._forgotten.move_to_end(run_id)
+                    while len(self._forgotten) > self.keep_seqs:
+                        self._seqs.pop(self._forgotten.popitem(last=False)[0], None)
+
+    def next_seq(self, run_id: str) -> int:
+        """The `seq_field` value the run's next row will get."""
+        with self._cond:
+            return self._seqs.get(run_id, 0)
+
+    def seed_seq(self, run_id: str, seq: int):
+        """Number the run's next row at least `seq`, e.g. for a run resumed in another process."""
+        with self._cond:
+            self._seqs[run_id] = max(self._seqs.get(run_id, 0), seq)
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return sum(len(rows) for rows in self._pending.values())
+
+    def close(self, timeout: float = 10.0):
+        """Write everything that is still buffered and stop the flusher."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread:
+            thread.join(timeout=timeout)
+
+    # ── Flusher thread ─────────────────────────────────────────────────────────
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="event-sink", daemon=True)
+            self._thread.start()
+
+    def _take_ready(self) -> List[tuple]:
+        """Pop the batches that are due. Must be called with the lock held."""
+        now = time.monotonic()
+        ready = []
+        for run_id, rows in self._pending.items():
+            if not rows:
+                continue
+            due = (
+                self._stopping
+                or run_id in self._urgent
+                or len(rows) >= self.max_batch
+                or now - self._first_at.get(run_id, now) >= self.flush_interval
+            )
+            if due:
+                ready.append((run_id, rows[: self.max_batch]))
+                del rows[: self.max_batch]
+                if rows:
+                    self._first_at[run_id] = now
+        return ready
+
+    def _next_wakeup(self) -> Optional[float]:
+        """Seconds until the oldest pending batch is due, or None when idle. Lock must be held."""
+        waiting = [t for rid, t in self._first_at.items() if self._pending.get(rid)]
+        if not waiting:
+            return None
+        return max(0.0, self.flush_interval - (time.monotonic() - min(waiting)))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                ready = self._take_ready()
+                while not ready:
+                    if self._stopping:
+                        return
+                    self._cond.wait(self._next_wakeup())
+                    ready = self._take_ready()
+
+            for run_id, rows in ready:
+                try:
+                    self.writer(rows)
+                except Exception as e:
+                    logger.error(f"Failed to persist {len(rows)} events for run {run_id}: {e}")
+
+                with self._cond:
+                    self._written[run_id] = self._written.get(run_id, 0) + len(rows)
+                    if not self._pending.get(run_id):
+                        self._urgent.discard(run_id)
+                    self._wake_async_waiters(run_id)
+                    self._cond.notify_all()
+
+    def _wake_async_waiters(self, run_id: str):
+        """Resolve flush_async() futures that are now satisfied. Lock must be held."""
+        written = self._written.get(run_id, 0)
+        remaining = []
+        for waiter in self._waiters:
+            waiter_run, target, loop, future = waiter
+            if waiter_run != run_id or written < target:
+                remaining.append(waiter)
+                continue
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                pass  # loop closed; nobody is waiting any more
+        self._waiters = remaining
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
@@ -12,6 +12,13 @@ if __name__ == "__main__":
     if 'test' in sys.argv[1:]:
         from test_playwright import test_playwright
         test_playwright()
+    elif sys.argv[1:2] == ['bench']:
+        from benchmark import main as bench
+        bench(sys.argv[2:])
     else:
+        import time
+        started, modules = time.perf_counter(), len(sys.modules)
         from api import start_server
+        from startup import startup
+        startup.record("import api", started, modules)
         start_server()
\ No newline at end of file
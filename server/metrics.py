@@ -0,0 +1,204 @@
+"""
+In-process metrics rendered in the Prometheus text exposition format.
+
+Counters and histograms are updated on hot paths, so recording is a dict
+lookup, a bisect and an add under a per-metric lock. Gauges are read through
+callbacks only when /metrics is scraped.
+
+Process-backend workers cannot share memory with the API, so a worker calls
+`forward_to` and its samples travel back over the job's result queue; the
+API process applies them with `apply`.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_registry: Dict[str, "_Metric"] = {}
+_forward: Optional[Callable[[tuple], None]] = None
+
+
+def forward_to(fn: Optional[Callable[[tuple], None]]):
+    """Send samples to `fn` instead of recording them locally (used by worker processes)."""
+    global _forward
+    _forward = fn
+
+
+def apply(record: tuple):
+    """Record a sample forwarded from a worker process."""
+    name, labels, value = record
+    metric = _registry.get(name)
+    if metric is not None:
+        metric._record(labels, value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _registry[name] = self
+
+    def _labels(self, labels: dict) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _emit(self, labels: dict, value: float):
+        values = self._labels(labels)
+        if _forward is not None:
+            _forward((self.name, values, value))
+        else:
+            self._record(values, value)
+
+    def _record(self, labels: LabelValues, value: float):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        self._emit(labels, amount)
+
+    def _record(self, labels: LabelValues, value: float):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, list] = {}   # labels -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        self._emit(labels, value)
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _record(self, labels: LabelValues, value: float):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = []
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+class Gauge(_Metric):
+    """A value read from `fn` at scrape time. `fn` returns a number or {label values: number}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], object], labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def _record(self, labels: LabelValues, value: float):
+        pass
+
+    def render(self) -> List[str]:
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        if isinstance(value, dict):
+            return [
+                f"{self.name}{_format_labels(self.labelnames, k if isinstance(k, tuple) else (k,))} {v}"
+                for k, v in value.items()
+            ]
+        return [f"{self.name} {value}"]
+
+
+def render() -> str:
+    lines = []
+    for metric in list(_registry.values()):
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ── Hot-path instruments ───────────────────────────────────────────────────────
+
+AGENT_CREATE_SECONDS = Histogram("nova_agent_create_seconds", "Time to create a NovaAct agent.")
+ACT_GET_SECONDS = Histogram("nova_act_get_seconds", "Latency of one act_get step.")
+GO_TO_URL_SECONDS = Histogram("nova_go_to_url_seconds", "Latency of go_to_url recovery after a step left the start URL.")
+PERSIST_EVENT_SECONDS = Histogram(
+    "nova_persist_event_seconds", "Time to queue one run event.", ("type",),
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05),
+)
+UPDATE_RUN_STATUS_SECONDS = Histogram("nova_update_run_status_seconds", "Time to spool a test_runs status update.", ("status",))
+
+FAULTS_TOTAL = Counter("nova_faults_total", "Fault responses reported by agents.")
+PAGE_ERRORS_TOTAL = Counter("nova_page_errors_total", "Page error events recorded after steps.")
+STEP_FAILURES_TOTAL = Counter("nova_step_failures_total", "Steps that raised, by step index.", ("step",))
+STEP_TIMEOUTS_TOTAL = Counter(
+    "nova_step_timeouts_total", "Steps aborted for exceeding their deadline or step budget.", ("reason",),
+)
+SPOOL_SHIP_FAILURES_TOTAL = Counter("nova_spool_ship_failures_total", "Spooled batches that failed to reach Supabase.")
+SPOOL_DEAD_LETTERED_TOTAL = Counter(
+    "nova_spool_dead_lettered_total", "Spooled entries given up on after EVENT_SPOOL_MAX_ATTEMPTS failed writes.",
+)
+RUNS_FINISHED_TOTAL = Counter("nova_runs_finished_total", "Runs that reached a terminal status.", ("status",))
+RUNS_COALESCED_TOTAL = Counter(
+    "nova_runs_coalesced_total", "Start requests answered with an existing run, by what matched.", ("reason",),
+)
@@ -1,149 +1,298 @@
 import asyncio
 import logging
 import os
-import queue
 import threading
-import time
 import traceback
-from typing import AsyncGenerator, Optional
+from typing import AsyncGenerator, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
 
 from nova_act import ActMetadata
 
-from nova.agent_factory import create_agent
-from nova.schemas.fault import Faults
-from nova.thinking_log_handler import ThinkingLogHandler
-from nova.thinking_streamer import ThinkingStreamer
+import metrics
+from nova.async_bridge import AsyncBridge
+from nova.execution_backend import CANCEL_GRACE, AgentJob, execution_backend
+from nova.result_cache import ACT_CACHE_MODE
+from nova.thinking_dispatcher import thinking_dispatcher
 from nova.types import Agent
+from nova.workflow import merge_storage_states, plan
+from tracing import tracer
 
 logger = logging.getLogger(__name__)
 
 KEY = os.getenv("NOVA_ACT_API_KEY")
+MAX_PARALLEL_AGENTS = int(os.getenv("NOVA_MAX_PARALLEL_AGENTS", "3"))
 
 if not KEY:
     raise ValueError("NOVA_ACT_API_KEY environment variable is not set")
 
 
+class AgentActMetadata(NamedTuple):
+    """An ActMetadata result tagged with the id of the agent that produced it."""
+    agent_id: str
+    metadata: ActMetadata
+
+
+class _AgentDone(NamedTuple):
+    agent_id: str
+
+
 class ActRunner:
     """Manages Nova Act agent execution, streaming events to Supabase."""
 
-    def __init__(self, run_id: Optional[str] = None):
+    def __init__(
+        self,
+        run_id: Optional[str] = None,
+        max_parallel_agents: int = MAX_PARALLEL_AGENTS,
+        backend=None,
+        cache_mode: str = ACT_CACHE_MODE,
+        tenant: Optional[str] = None,
+    ):
         self.run_id = run_id
-        self.nova = None
+        self.max_parallel_agents = max(1, max_parallel_agents)
+        self.backend = backend or execution_backend
+        self.cache_mode = cache_mode
+        self.tenant = tenant
+        self.agents: Dict[str, Callable[[], object]] = {}   # agent_id -> stops its pooled browser (thread backend only)
+        self.running: Set[str] = set()                      # agent ids whose threads have not exited
+        self._running_lock = threading.Lock()                # guards `running`, read by the cancel timer
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """
+        Ask every agent to stop. Agents check the event between steps. A
+        pooled browser still busy after `CANCEL_GRACE` seconds is stopped on
+        its owner thread as soon as that thread is free, so it is not handed
+        back to the pool. Playwright's sync API cannot be driven from another
+        thread, so an act_get already in flight on the thread backend runs
+        until it returns or hits its step deadline. Process-backend workers
+        are killed by the backend itself.
+        """
+        if self.cancel_event.is_set():
+            return
+        self.cancel_event.set()
+        timer = threading.Timer(CANCEL_GRACE, self._force_stop)
+        timer.daemon = True
+        timer.start()
+
+    def running_agents(self) -> List[str]:
+        """Ids of the agents whose threads have not exited."""
+        with self._running_lock:
+            return sorted(self.running)
+
+    async def wait_stopped(self):
+        """
+        Wait until every agent thread has exited, so the browsers they drive
+        are closed. After a cancel this lasts at most until the step in flight
+        returns or hits its deadline. Cancelling the wait does not end it.
+        """
+        cancelled = False
+        while self.running_agents():
+            try:
+                await asyncio.sleep(0.25)
+            except asyncio.CancelledError:
+                cancelled = True
+        if cancelled:
+            raise asyncio.CancelledError()
+
+    def _force_stop(self):
+        for agent_id in self.running_agents():
+            stop = self.agents.get(agent_id)
+            logger.warning(
+                f"Agent {agent_id} is still busy {CANCEL_GRACE:g}s after cancel; "
+                f"its browser is stopped once the step in flight returns"
+            )
+            if stop is None:
+                continue   # an unpooled agent closes its own browser on the way out
+            try:
+                stop()
+            except Exception as e:
+                logger.warning(f"Failed to schedule stop of agent {agent_id}: {e}")
 
     async def run_act(
         self,
         url: str,
         pages: list[str],
         agent_config: list[Agent],
-    ) -> AsyncGenerator[ActMetadata, None]:
-        from db import persist_event
+        resume: Optional[Dict[str, dict]] = None,
+        workflow: Optional[List[dict]] = None,
+    ) -> AsyncGenerator[AgentActMetadata, None]:
+        """
+        Run the branches planned from `url`, `pages`, `agent_config` and the
+        optional `workflow` DAG (see nova/workflow.py), each in its own browser
+        session, with at most `max_parallel_agents` running at once. A branch
+        waits for the branches it depends on and starts with their merged
+        session state; if one of them fails, it is skipped. Results from all
+        branches are merged into one stream in arrival order. If any branch
+        fails, the others are allowed to finish and the first error is raised
+        at the end.
+
+        `resume` maps branch ids to their last checkpoint (see checkpoints.py);
+        those branches restore their session and continue after that step.
+
+        If the consumer stops early (the run task is cancelled or the stream
+        is closed), the agents are cancelled via `cancel()`.
+        """
+        from checkpoints import checkpoint_store
+        from db import event_positions, persist_event
 
-        results_queue: queue.Queue = queue.Queue()
         loop = asyncio.get_running_loop()
+        results: AsyncBridge = AsyncBridge(loop)
+        slots = threading.BoundedSemaphore(self.max_parallel_agents)
+
+        branches = plan(url, pages, agent_config, workflow)
+        finished: Dict[str, threading.Event] = {b.id: threading.Event() for b in branches}
+        failed: set = set()
+        states: Dict[str, Optional[dict]] = {}   # branch id -> latest storage state, for dependents
 
-        # Thinking log capture
-        thinking_queue: queue.Queue = queue.Queue()
-        thinking_handler = ThinkingLogHandler(thinking_queue)
-        thinking_streamer: Optional[ThinkingStreamer] = None
+        jobs = []
+        for branch in branches:
+            resume_from = (resume or {}).get(branch.id)
+            if resume_from:
+                states[branch.id] = resume_from.get("storage_state")
+                if resume_from["step"] + 1 >= len(branch.agent.get("actions", [])):
+                    finished[branch.id].set()
+                    continue  # finished every step before the run stopped
+            job = AgentJob(
+                branch.page, branch.id, branch.agent, self.run_id, resume_from, self.cache_mode,
+                trace=tracer.sampled(self.run_id), tenant=self.tenant,
+            )
+            jobs.append((job, branch.depends_on))
+
+        running_threads = len(jobs)
+        threads_exited = asyncio.Event()
+
+        def thread_exited():
+            nonlocal running_threads
+            running_threads -= 1
+            if running_threads <= 0:
+                threads_exited.set()
 
         if self.run_id:
-            trace_logger = logging.getLogger(ThinkingLogHandler.LOGGER_NAME)
-            trace_logger.addHandler(thinking_handler)
-            thinking_streamer = ThinkingStreamer(self.run_id, thinking_queue, loop)
-            thinking_streamer.start()
+            thinking_dispatcher.install()
 
-        def run_sync():
-            use_agent = agent_config[0]
-            use_agent_config = use_agent.get("config", {})
-            temp = use_agent_config.get("temperature", 0.7)
-            model_top_P = use_agent_config.get("topP", 5)
+        def emit(agent_id: str, kind: str, payload):
+            if kind == "metadata":
+                results.put(AgentActMetadata(agent_id, payload))
+            elif kind == "error":
+                failed.add(agent_id)
+                results.put(Exception(payload))
+            elif kind == "thinking" and self.run_id:
+                thinking_dispatcher.put(self.run_id, payload)
+            elif kind == "event":
+                event_type, data = payload
+                if event_type == "fault":
+                    metrics.FAULTS_TOTAL.inc()
+                elif event_type == "page_error":
+                    metrics.PAGE_ERRORS_TOTAL.inc()
+                if self.run_id:
+                    persist_event(self.run_id, event_type, data)
+            elif kind == "checkpoint":
+                states[agent_id] = payload.get("storage_state")
+                if self.run_id:
+                    checkpoint_store.save(self.run_id, agent_id, payload, event_positions(self.run_id))
+            elif kind == "metric":
+                metrics.apply(payload)
+            elif kind == "span":
+                tracer.add(*payload)
 
-            agent = create_agent(url, None, use_agent)
-            self.nova = agent
+        def track_agent(agent_id: str, stop):
+            if stop is None:
+                self.agents.pop(agent_id, None)
+            else:
+                self.agents[agent_id] = stop
 
-            try:
-                with agent:
-                    for step in use_agent.get("actions", []):
-                        step_start = time.time()
-                        try:
-                            res = agent.act_get(
-                                step,
-                                max_steps=10,
-                                timeout=200,
-                                model_seed=1,
-                                model_top_k=model_top_P,
-                                model_temperature=temp,
-                                schema=Faults.model_json_schema(),
-                            )
-                            results_queue.put(res.metadata)
-
-                            if res.matches_schema and self.run_id:
-                                persist_event(self.run_id, "fault", res.parsed_response)
-
-                            if not agent.page.url.startswith(url):
-                                agent.go_to_url(url)
-                                if errors := agent.page.page_errors():
-                                    if self.run_id:
-                                        persist_event(self.run_id, "page_error", {
-                                            "page": agent.page.url,
-                                            "errors": errors,
-                                        })
-
-                        except Exception as step_error:
-                            error_msg = f"Error executing step '{step}': {str(step_error)}"
-                            logger.error(error_msg)
-                            logger.debug(traceback.format_exc())
-                            results_queue.put(Exception(error_msg))
-                            break
-                        finally:
-                            step_end = time.time()
-                            logger.info(f"Step '{step}' completed in {step_end - step_start:.2f} seconds")
+        def wait_for(depends_on: Tuple[str, ...]) -> Optional[str]:
+            """Block until every upstream branch has finished. Returns why this branch must be skipped, if so."""
+            for dep in depends_on:
+                while not finished[dep].wait(0.25):
+                    if self.cancel_event.is_set():
+                        break
+                if self.cancel_event.is_set():
+                    return "the run was cancelled"
+                if dep in failed:
+                    return f"branch '{dep}' failed"
+            return None
 
+        def run_sync(job: AgentJob, depends_on: Tuple[str, ...]):
+            agent_id = job.agent_id
+            try:
+                with tracer.bind(self.run_id), tracer.span("run_sync", agent_id=agent_id, backend=self.backend.name):
+                    with tracer.span("wait_for_dependencies", depends_on=list(depends_on)):
+                        skip = wait_for(depends_on)
+                    if skip:
+                        failed.add(agent_id)
+                        results.put(Exception(f"Skipped branch '{agent_id}': {skip}"))
+                        return
+                    if depends_on:
+                        job = job._replace(storage_state=merge_storage_states([states.get(d) for d in depends_on]))
+                    with tracer.span("wait_for_slot"):
+                        slots.acquire()
+                    try:
+                        self.backend.run(
+                            job,
+                            lambda kind, payload: emit(agent_id, kind, payload),
+                            on_agent=lambda stop: track_agent(agent_id, stop),
+                            cancel=self.cancel_event,
+                        )
+                    finally:
+                        slots.release()
             except Exception as agent_error:
-                error_msg = f"Error during agent execution: {str(agent_error)}"
+                failed.add(agent_id)
+                error_msg = f"Error during agent execution (agent {agent_id}): {str(agent_error)}"
                 logger.error(error_msg)
                 logger.debug(traceback.format_exc())
-                results_queue.put(Exception(error_msg))
+                results.put(Exception(error_msg))
+            finally:
+                with self._running_lock:
+                    self.running.discard(agent_id)
+                finished[agent_id].set()
+                results.put(_AgentDone(agent_id))
+                try:
+                    loop.call_soon_threadsafe(thread_exited)
+                except RuntimeError:
+                    pass  # event loop already closed
+
+        threads = []
+        with self._running_lock:
+            self.running.update(job.agent_id for job, _ in jobs)
+        for job, depends_on in jobs:
+            thread = threading.Thread(target=run_sync, args=(job, depends_on), daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        # The loop side of the run: relaying results until every agent thread
+        # has exited and the run's thinking lines are persisted.
+        with tracer.span("run_act", branches=len(branches), agents=len(jobs)):
+            remaining = len(threads)
+            try:
+                first_error: Optional[Exception] = None
+                while remaining:
+                    item = await results.get()
+                    if isinstance(item, _AgentDone):
+                        remaining -= 1
+                    elif isinstance(item, Exception):
+                        first_error = first_error or item
+                    else:
+                        yield item
+
+                if first_error:
+                    raise first_error
+
+            except Exception as exec_error:
+                logger.error(f"Error during act execution: {str(exec_error)}")
+                logger.debug(traceback.format_exc())
+                raise
 
             finally:
-                if self.nova:
+                if remaining:
+                    self.cancel()
+                # Unblock agent threads still waiting to hand over results.
+                results.close()
+                if threads:
                     try:
-                        if hasattr(self.nova, "close"):
-                            self.nova.close()
-                    except Exception as cleanup_error:
-                        logger.warning(f"Error closing Nova agent: {str(cleanup_error)}")
-                self.nova = None
-                results_queue.put(None)  # sentinel
-
-        thread = threading.Thread(target=run_sync, daemon=True)
-        thread.start()
-
-        try:
-            while True:
-                item = await loop.run_in_executor(None, results_queue.get)
-                if item is None:
-                    break
-                if isinstance(item, Exception):
-                    raise item
-                yield item
-
-        except Exception as exec_error:
-            logger.error(f"Error during act execution: {str(exec_error)}")
-            logger.debug(traceback.format_exc())
-            raise
-
-        finally:
-            if thinking_streamer:
-                thinking_streamer.stop()
-                thinking_streamer.join(timeout=5.0)
-
-            if self.run_id:
-                trace_logger = logging.getLogger(ThinkingLogHandler.LOGGER_NAME)
-                trace_logger.removeHandler(thinking_handler)
+                        await asyncio.wait_for(threads_exited.wait(), timeout=CANCEL_GRACE + 10)
+                    except asyncio.TimeoutError:
+                        logger.error(f"Agents {', '.join(self.running_agents())} did not stop after cancel (run {self.run_id})")
 
-            try:
-                await asyncio.wait_for(loop.run_in_executor(None, thread.join), timeout=10)
-            except asyncio.TimeoutError:
-                logger.warning("Timeout waiting for thread to finish")
-            except Exception as join_error:
-                logger.warning(f"Error waiting for thread to finish: {str(join_error)}")
+                if self.run_id:
+                    with tracer.span("thinking_dispatcher.flush"):
+                        await thinking_dispatcher.flush_async(self.run_id)
@@ -1,18 +1,29 @@
+import contextvars
 import logging
+import threading
+import time
 import traceback
 import os
-from typing import Optional
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, Optional, TypeVar
+from urllib.parse import urlparse
 
 from nova_act import NovaAct
 from nova_act.tools.human.interface.human_input_callback import HumanInputCallbacksBase
 
+import metrics
 from nova.types import Agent
 from nova.guardrails import autopass_guardrail
+from tracing import tracer
 
 logger = logging.getLogger(__name__)
 
 KEY = os.getenv("NOVA_ACT_API_KEY")
 
+T = TypeVar("T")
+
 
 def create_agent(
     url: str,
@@ -39,12 +50,13 @@ def create_agent(
             raise ValueError("NOVA_ACT_API_KEY environment variable is not set")
 
         logger.info(f"Creating Nova Act agent for URL: {url}")
-        act = NovaAct(
-            nova_act_api_key=KEY,
-            starting_page=url,
-            human_input_callbacks=human_callback,
-            state_guardrail=autopass_guardrail,
-        )
+        with metrics.AGENT_CREATE_SECONDS.time(), tracer.span("create_agent"):
+            act = NovaAct(
+                nova_act_api_key=KEY,
+                starting_page=url,
+                human_input_callbacks=human_callback,
+                state_guardrail=autopass_guardrail,
+            )
         logger.info("Nova Act agent created successfully")
         return act
     except ValueError as ve:
@@ -54,3 +66,374 @@ def create_agent(
         logger.error(f"Error creating Nova Act agent: {str(e)}")
         logger.debug(traceback.format_exc())
         raise Exception(f"Failed to create Nova Act agent: {str(e)}")
+
+
+def capture_storage_state(agent: NovaAct) -> dict:
+    """
+    Cookies and localStorage of the agent's browser context, as Playwright
+    reports them, plus the sessionStorage of the current page under
+    "sessionStorage" (Playwright leaves it out).
+    """
+    state = agent.page.context.storage_state()
+    try:
+        items = agent.page.evaluate(
+            "() => Object.entries(sessionStorage).map(([name, value]) => ({ name, value }))"
+        )
+    except Exception as e:
+        logger.debug(f"Could not read sessionStorage: {e}")
+        items = None
+    if isinstance(items, list) and items:
+        state["sessionStorage"] = [{"origin": origin_of(agent.page.url), "items": items}]
+    return state
+
+
+def restore_storage_state(agent: NovaAct, state: dict, url: str):
+    """
+    Load a captured storage state into the agent's browser and open `url`.
+    Web storage can only be written from a page on the same origin, so each
+    saved origin is visited once before navigating to `url`. Expired cookies
+    are skipped.
+    """
+    from nova.session_cache import live_cookies
+
+    context = agent.page.context
+    if cookies := live_cookies(state):
+        context.add_cookies(cookies)
+    storage: Dict[str, dict] = {}
+    for entry in state.get("origins", []):
+        storage.setdefault(entry["origin"], {})["localStorage"] = entry.get("localStorage") or []
+    for entry in state.get("sessionStorage", []):
+        storage.setdefault(entry["origin"], {})["sessionStorage"] = entry.get("items") or []
+    for origin, areas in storage.items():
+        if not any(areas.values()):
+            continue
+        agent.go_to_url(origin)
+        agent.page.evaluate(
+            "(areas) => { for (const [area, items] of Object.entries(areas))"
+            " for (const { name, value } of items) window[area].setItem(name, value); }",
+            areas,
+        )
+    agent.go_to_url(url)
+
+
+def session_identity(agent_config: Optional[Agent]) -> Optional[str]:
+    """The account an agent acts as, if its config declares one (see nova/session_cache.py)."""
+    identity = ((agent_config or {}).get("config") or {}).get("sessionIdentity")
+    return str(identity) if identity else None
+
+
+def restore_cached_session(agent: NovaAct, url: str, agent_config: Optional[Agent], tenant: Optional[str]) -> bool:
+    """
+    Start a freshly created or leased agent from the cached session of its
+    identity within `tenant`, if there is one. Returns whether the session held: one that
+    lands on a login page is dropped from the cache.
+    """
+    from nova.session_cache import looks_like_login, session_cache
+
+    identity = session_identity(agent_config)
+    state = session_cache.get(tenant, url, identity) if identity else None
+    if not state:
+        return False
+    restore_storage_state(agent, state, url)
+    if looks_like_login(url, agent.page.url):
+        session_cache.invalidate(tenant, url, identity, f"redirected to {agent.page.url}")
+        return False
+    logger.info(f"Restored cached session for {identity} on {origin_of(url)}")
+    return True
+
+
+def save_session(agent: NovaAct, url: str, agent_config: Optional[Agent], tenant: Optional[str]):
+    """Cache the agent's session for `tenant` after a successful run, if it declares an identity."""
+    from nova.session_cache import session_cache
+
+    identity = session_identity(agent_config)
+    if identity and session_cache.enabled:
+        session_cache.put(tenant, url, identity, capture_storage_state(agent))
+
+
+# ── Warm agent pool ────────────────────────────────────────────────────────────
+#
+# Playwright's sync API binds a browser to the thread that launched it, so every
+# pooled agent owns a single-thread executor. All calls that touch the agent
+# (launch, reset, the run itself, stop) are funnelled through `PooledAgent.call`.
+
+POOL_SIZE = int(os.getenv("NOVA_AGENT_POOL_SIZE", "0"))  # 0 disables pooling
+POOL_MAX_IDLE_PER_ORIGIN = int(os.getenv("NOVA_AGENT_POOL_MAX_IDLE_PER_ORIGIN", "2"))
+POOL_MAX_USES = int(os.getenv("NOVA_AGENT_POOL_MAX_USES", "20"))
+POOL_LEASE_TIMEOUT = float(os.getenv("NOVA_AGENT_POOL_LEASE_TIMEOUT", "120"))
+
+
+def origin_of(url: str) -> str:
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}".lower()
+
+
+class PooledAgent:
+    """A started NovaAct together with the thread that owns it."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.origin = origin_of(url)
+        self.uses = 0
+        self.agent: Optional[NovaAct] = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nova-agent")
+
+    def call(self, fn: Callable[[NovaAct], T], timeout: Optional[float] = None) -> T:
+        """
+        Run fn(agent) on the agent's owner thread and return its result. fn
+        sees the caller's context variables, such as its trace binding.
+        """
+        return self._executor.submit(contextvars.copy_context().run, fn, self.agent).result(timeout=timeout)
+
+    def launch(self):
+        def _launch(_):
+            agent = create_agent(self.url)
+            with tracer.span("agent.start"):
+                agent.start()
+            return agent
+
+        self.agent = self.call(_launch)
+
+    def reset(self, url: str, clear_storage: bool = False):
+        """Put the agent back on `url`, optionally wiping cookies and web storage."""
+        def _reset(agent: NovaAct):
+            with tracer.span("agent_pool.reset", clear_storage=clear_storage):
+                if clear_storage:
+                    agent.page.context.clear_cookies()
+                    agent.page.evaluate("() => { localStorage.clear(); sessionStorage.clear(); }")
+                agent.go_to_url(url)
+
+        self.call(_reset)
+
+    def healthy(self) -> bool:
+        if self.agent is None:
+            return False
+        try:
+            return self.call(lambda agent: not agent.page.is_closed() and agent.page.evaluate("1") == 1, timeout=10)
+        except Exception:
+            return False
+
+    def request_stop(self):
+        """
+        Stop the agent on its owner thread once the call in progress returns,
+        without waiting. The pool then finds it unhealthy and discards it.
+        """
+        def _stop(agent: Optional[NovaAct]):
+            if agent is not None and not agent.page.is_closed():
+                agent.stop()
+
+        return self._executor.submit(_stop, self.agent)
+
+    def close(self):
+        def _stop(agent: Optional[NovaAct]):
+            if agent is not None:
+                agent.stop()
+
+        try:
+            self.call(_stop, timeout=30)
+        except Exception as e:
+            logger.warning(f"Error stopping pooled agent for {self.origin}: {e}")
+        finally:
+            self.agent = None
+            self._executor.shutdown(wait=False)
+
+
+class AgentPool:
+    """
+    Keeps up to `max_size` started agents, parked per starting origin between
+    runs. Agents are reset on lease and recycled after `max_uses` leases or
+    when a health check fails.
+    """
+
+    def __init__(
+        self,
+        max_size: int = POOL_SIZE,
+        max_idle_per_origin: int = POOL_MAX_IDLE_PER_ORIGIN,
+        max_uses: int = POOL_MAX_USES,
+        lease_timeout: float = POOL_LEASE_TIMEOUT,
+    ):
+        self.max_size = max_size
+        self.max_idle_per_origin = max_idle_per_origin
+        self.max_uses = max_uses
+        self.lease_timeout = lease_timeout
+
+        self._cond = threading.Condition()
+        self._idle: Dict[str, Deque[PooledAgent]] = {}   # origin -> parked agents
+        self._size = 0                                   # launched agents, idle or leased
+        self._leased = 0
+        self._counters = {
+            "leases": 0,
+            "hits": 0,
+            "launches": 0,
+            "recycled": 0,
+            "crashed": 0,
+            "waits": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    @contextmanager
+    def lease(self, url: str, clear_storage: bool = False) -> Iterator[PooledAgent]:
+        """
+        Borrow an agent positioned on `url`. The body must drive the agent via
+        `PooledAgent.call`. If the body raises, the agent is health-checked
+        before it is parked again.
+        """
+        with tracer.span("agent_pool.acquire", origin=origin_of(url)):
+            pooled = self._acquire(url, clear_storage)
+        failed = False
+        try:
+            yield pooled
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._release(pooled, failed)
+
+    def prewarm(self, url: str, count: int = 1):
+        """Launch agents for `url` ahead of demand, up to the pool and idle limits."""
+        origin = origin_of(url)
+        for _ in range(count):
+            with self._cond:
+                idle = self._idle.get(origin)
+                if self._size >= self.max_size or (idle and len(idle) >= self.max_idle_per_origin):
+                    return
+                self._size += 1
+            pooled = self._launch(url)
+            if pooled is None:
+                return
+            with self._cond:
+                self._idle.setdefault(origin, deque()).append(pooled)
+                self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            idle = sum(len(q) for q in self._idle.values())
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": idle,
+                "leased": self._leased,
+                "idle_by_origin": {origin: len(q) for origin, q in self._idle.items() if q},
+                **self._counters,
+            }
+
+    def shutdown(self):
+        with self._cond:
+            agents = [p for q in self._idle.values() for p in q]
+            self._idle.clear()
+            self._size -= len(agents)
+        for pooled in agents:
+            pooled.close()
+
+    # ── Internals ──────────────────────────────────────────────────────────────
+
+    def _launch(self, url: str) -> Optional[PooledAgent]:
+        pooled = PooledAgent(url)
+        try:
+            pooled.launch()
+        except Exception as e:
+            logger.error(f"Failed to launch pooled agent for {pooled.origin}: {e}")
+            pooled.close()
+            with self._cond:
+                self._size -= 1
+                self._cond.notify_all()
+            return None
+        with self._cond:
+            self._counters["launches"] += 1
+        return pooled
+
+    def _acquire(self, url: str, clear_storage: bool) -> PooledAgent:
+        origin = origin_of(url)
+        started = time.monotonic()
+        waited = False
+
+        while True:
+            evict: Optional[PooledAgent] = None
+            with self._cond:
+                while True:
+                    idle = self._idle.get(origin)
+                    if idle:
+                        pooled, launch = idle.popleft(), False
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        pooled, launch = None, True
+                        break
+                    # Pool is full: make room by retiring an idle agent parked for another origin.
+                    other = next((q for q in self._idle.values() if q), None)
+                    if other:
+                        evict = other.popleft()
+                        pooled, launch = None, True
+                        break
+                    remaining = self.lease_timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        raise TimeoutError(f"Timed out waiting for a pooled agent for {origin}")
+                    waited = True
+                    self._cond.wait(remaining)
+
+            if evict is not None:
+                evict.close()
+                with self._cond:
+                    self._counters["recycled"] += 1
+
+            if launch:
+                pooled = self._launch(url)
+                if pooled is None:
+                    raise Exception(f"Failed to launch pooled agent for {origin}")
+            elif not pooled.healthy():
+                self._discard(pooled, crashed=True)
+                continue
+            else:
+                try:
+                    pooled.reset(url, clear_storage)
+                except Exception as e:
+                    logger.warning(f"Failed to reset pooled agent for {origin}: {e}")
+                    self._discard(pooled, crashed=True)
+                    continue
+
+            wait = time.monotonic() - started
+            with self._cond:
+                self._leased += 1
+                self._counters["leases"] += 1
+                if not launch:
+                    self._counters["hits"] += 1
+                if waited:
+                    self._counters["waits"] += 1
+                self._counters["wait_seconds_total"] += wait
+                self._counters["wait_seconds_max"] = max(self._counters["wait_seconds_max"], wait)
+            return pooled
+
+    def _release(self, pooled: PooledAgent, failed: bool):
+        pooled.uses += 1
+        with self._cond:
+            self._leased -= 1
+
+        if pooled.uses >= self.max_uses:
+            self._discard(pooled)
+            return
+        if failed and not pooled.healthy():
+            self._discard(pooled, crashed=True)
+            return
+
+        with self._cond:
+            idle = self._idle.setdefault(pooled.origin, deque())
+            if len(idle) < self.max_idle_per_origin:
+                idle.append(pooled)
+                self._cond.notify_all()
+                return
+        self._discard(pooled)
+
+    def _discard(self, pooled: PooledAgent, crashed: bool = False):
+        pooled.close()
+        with self._cond:
+            self._size -= 1
+            self._counters["crashed" if crashed else "recycled"] += 1
+            self._cond.notify_all()
+
+
+agent_pool = AgentPool()
@@ -0,0 +1,81 @@
+"""
+Bounded channel from worker threads to an asyncio consumer.
+
+Producers call `put` from any thread. Items are handed to the event loop with
+`loop.call_soon_threadsafe`, so the consumer awaits an `asyncio.Queue` and no
+executor thread is parked while the channel is idle. Once `maxsize` items are
+in flight, `put` blocks the producing thread until the consumer catches up,
+which throttles the browser thread instead of buffering without limit.
+"""
+
+import asyncio
+import os
+import threading
+from typing import Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+BRIDGE_MAX_SIZE = int(os.getenv("NOVA_BRIDGE_MAX_SIZE", "256"))
+
+
+class BridgeClosed(Exception):
+    """Raised by `get` once the bridge is closed and drained."""
+
+
+class AsyncBridge(Generic[T]):
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int = BRIDGE_MAX_SIZE):
+        self.loop = loop
+        self.maxsize = max(1, maxsize)
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._closed = False
+
+    # ── Producer side (any thread) ─────────────────────────────────────────────
+
+    def put(self, item: T, timeout: Optional[float] = None) -> bool:
+        """
+        Hand `item` to the consumer, blocking while the bridge is full.
+        Returns False if the bridge was closed or `timeout` expired.
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._closed or self._in_flight < self.maxsize, timeout):
+                return False
+            if self._closed:
+                return False
+            self._in_flight += 1
+        try:
+            self.loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        except RuntimeError:
+            # Event loop is closed; nobody will ever consume this item.
+            self.close()
+            return False
+        return True
+
+    # ── Consumer side (event loop) ─────────────────────────────────────────────
+
+    async def get(self) -> T:
+        if self._closed and self._queue.empty():
+            raise BridgeClosed()
+        item = await self._queue.get()
+        if item is _CLOSED:
+            raise BridgeClosed()
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify()
+        return item
+
+    def close(self):
+        """Stop accepting items and release blocked producers. Safe from any thread."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        try:
+            self.loop.call_soon_threadsafe(self._queue.put_nowait, _CLOSED)
+        except RuntimeError:
+            pass
+
+
+_CLOSED = object()
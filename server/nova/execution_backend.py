@@ -0,0 +1,537 @@
+"""
+Execution backends for ActRunner.
+
+A backend runs one agent's steps somewhere and reports back through an
+`emit(kind, payload)` callback:
+
+    ("metadata", ActMetadata)       one act_get result
+    ("event", (event_type, data))   a fault / page_error / step_timeout row for test_run_events
+    ("thinking", line)              one nova_act trace line
+    ("checkpoint", dict)            a step finished: {"step", "url", "storage_state"}
+    ("metric", record)              a metrics sample recorded in a worker process
+    ("span", record)                a trace span recorded in a worker process, see tracing.py
+    ("error", message)              the agent failed; nothing else follows
+
+ThreadBackend runs the agent in the calling thread of the API process.
+ProcessPoolBackend hands it to a pool of worker processes and relays their
+output over IPC, so runs use every core and a wedged or crashed browser only
+takes down its own worker.
+
+Both take a `cancel` event. The agent checks it before launching a browser
+and between steps. The process backend additionally terminates a worker that
+has not finished within `NOVA_CANCEL_GRACE` seconds of the cancel, which is
+the only way to abort an act_get that is already in flight.
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Callable, Deque, List, NamedTuple, Optional
+
+import metrics
+from nova.step_budget import STEP_MAX_STEPS
+from nova.types import Agent
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+EXECUTION_BACKEND = os.getenv("NOVA_EXECUTION_BACKEND", "thread")  # "thread" or "process"
+PROCESS_WORKERS = int(os.getenv("NOVA_PROCESS_WORKERS", "0"))  # 0 = one per core
+PROCESS_MAX_TASKS_PER_WORKER = int(os.getenv("NOVA_PROCESS_MAX_TASKS_PER_WORKER", "20"))
+PROCESS_START_METHOD = os.getenv("NOVA_PROCESS_START_METHOD", "spawn")
+PROCESS_ACQUIRE_TIMEOUT = float(os.getenv("NOVA_PROCESS_ACQUIRE_TIMEOUT", "300"))
+# A pooled browser otherwise hands the previous lease's cookies and web storage,
+# possibly another tenant's, to the next run on the same origin.
+POOL_CLEAR_STORAGE = os.getenv("NOVA_AGENT_POOL_CLEAR_STORAGE", "1") == "1"
+CANCEL_GRACE = float(os.getenv("NOVA_CANCEL_GRACE", "5"))
+
+Emit = Callable[[str, object], None]
+
+
+class AgentJob(NamedTuple):
+    """Everything a backend needs to run one agent. Must stay picklable."""
+    url: str
+    agent_id: str
+    agent: Agent
+    run_id: Optional[str] = None
+    resume_from: Optional[dict] = None   # checkpoint of the last finished step, see checkpoints.py
+    cache_mode: str = "off"              # see nova/result_cache.py
+    storage_state: Optional[dict] = None # session inherited from upstream workflow branches
+    trace: bool = False                  # the run is sampled for tracing
+    tenant: Optional[str] = None         # scopes cached sessions, see nova/session_cache.py
+
+
+def run_agent(
+    job: AgentJob,
+    emit: Emit,
+    on_agent: Optional[Callable[[object], None]] = None,
+    cancel=None,
+):
+    """
+    Run every action of `job.agent` against a fresh or pooled NovaAct and
+    report results through `emit`. `on_agent` is given a callable that stops
+    a pooled agent's browser on its owner thread when it starts (and None when
+    it is released); an unpooled agent is driven, and stopped, on this thread. Stops before the next step
+    once `cancel` (a threading or multiprocessing Event) is set. Never raises.
+    """
+    url, agent_id, use_agent = job.url, job.agent_id, job.agent
+    resume_from = job.resume_from
+    first_step = resume_from["step"] + 1 if resume_from else 0
+    use_agent_config = use_agent.get("config", {})
+    temp = use_agent_config.get("temperature", 0.7)
+    model_top_P = use_agent_config.get("topP", 5)
+    actions = use_agent.get("actions", [])
+    model_params = {"max_steps": STEP_MAX_STEPS, "model_seed": 1, "model_top_k": model_top_P, "model_temperature": temp}
+
+    def cancelled() -> bool:
+        return cancel is not None and cancel.is_set()
+
+    def cache_key(index: int) -> str:
+        return step_key(url, actions[:index], actions[index], model_params, schema)
+
+    def emit_result(metadata, fault, page_error):
+        emit("metadata", metadata)
+        if fault is not None:
+            emit("event", ("fault", fault))
+        if page_error is not None:
+            emit("event", ("page_error", page_error))
+
+    def replay(entries: List[dict]):
+        logger.info(f"Replaying {len(entries)} cached steps (agent {agent_id})")
+        for entry in entries:
+            emit_result(entry["metadata"], entry["fault"], entry["page_error"])
+
+    def checkpoint(agent, index: int) -> dict:
+        try:
+            with tracer.span("capture_storage_state", step=index):
+                storage_state = capture_storage_state(agent)
+        except Exception as e:
+            logger.warning(f"Failed to capture storage state after step {index} (agent {agent_id}): {e}")
+            storage_state = None
+        return {"step": index, "url": agent.page.url, "storage_state": storage_state}
+
+    def run_steps(agent):
+        # Runs on whichever thread drives the agent, so trace lines logged
+        # from here are routed to this run.
+        with thinking_dispatcher.bind(job.run_id), tracer.span("run_steps", agent_id=agent_id):
+            run_actions(agent)
+
+    def run_actions(agent):
+        cached_session = False
+        with tracer.span("restore_session"):
+            if resume_from:
+                restore_storage_state(agent, resume_from.get("storage_state") or {}, resume_from.get("url") or url)
+            elif job.storage_state:
+                restore_storage_state(agent, job.storage_state, url)
+            else:
+                cached_session = restore_cached_session(agent, url, use_agent, job.tenant)
+        succeeded = True
+        for index, step in enumerate(actions):
+            if index < first_step:
+                continue
+            if cancelled():
+                logger.info(f"Agent {agent_id} cancelled before step {index}")
+                succeeded = False
+                break
+            step_start = time.time()
+            step_url = agent.page.url
+            budget = step_budgets.budget(step_url, step)
+            try:
+                try:
+                    with metrics.ACT_GET_SECONDS.time(), tracer.span(
+                        "act_get", timeout=budget.timeout, max_steps=budget.max_steps, adaptive=budget.adaptive,
+                    ):
+                        res = agent.act_get(
+                            step, timeout=budget.timeout, schema=schema, **dict(model_params, max_steps=budget.max_steps)
+                        )
+                except (ActTimeoutError, ActExceededMaxStepsError) as budget_error:
+                    timed_out = isinstance(budget_error, ActTimeoutError)
+                    outcome = "timeout" if timed_out else "max_steps"
+                    elapsed = time.time() - step_start
+                    # Recorded at the limit it hit: the real cost is at least that.
+                    step_budgets.record(
+                        step_url, step,
+                        max(elapsed, budget.timeout) if timed_out else elapsed,
+                        None if timed_out else budget.max_steps,
+                        outcome,
+                    )
+                    metrics.STEP_TIMEOUTS_TOTAL.inc(reason=outcome)
+                    emit("event", ("step_timeout", {
+                        "agent_id": agent_id,
+                        "step": index,
+                        "action": step,
+                        "page": step_url,
+                        "reason": outcome,
+                        "timeout": budget.timeout,
+                        "max_steps": budget.max_steps,
+                        "elapsed": round(elapsed, 2),
+                        "adaptive": budget.adaptive,
+                        "samples": budget.samples,
+                    }))
+                    limit = f"its {budget.timeout:g}s deadline" if timed_out else f"its {budget.max_steps}-step budget"
+                    raise RuntimeError(f"exceeded {limit}") from budget_error
+                step_budgets.record(step_url, step, time.time() - step_start, res.metadata.num_steps_executed)
+                fault = res.parsed_response if res.matches_schema else None
+                page_error = None
+                emit_result(res.metadata, fault, None)
+
+                if not agent.page.url.startswith(url):
+                    with metrics.GO_TO_URL_SECONDS.time(), tracer.span("go_to_url"):
+                        agent.go_to_url(url)
+                    with tracer.span("page_errors"):
+                        errors = agent.page.page_errors()
+                    if errors:
+                        page_error = {
+                            "agent_id": agent_id,
+                            "page": agent.page.url,
+                            "errors": errors,
+                        }
+                        emit("event", ("page_error", page_error))
+
+                if job.cache_mode != "off":
+                    with tracer.span("result_cache.put"):
+                        result_cache.put(cache_key(index), {
+                            "metadata": res.metadata,
+                            "fault": fault,
+                            "page_error": page_error,
+                        })
+
+                # Also how downstream workflow branches inherit this session.
+                emit("checkpoint", checkpoint(agent, index))
+
+            except Exception as step_error:
+                error_msg = f"Error executing step '{step}' (agent {agent_id}): {str(step_error)}"
+                logger.error(error_msg)
+                logger.debug(traceback.format_exc())
+                metrics.STEP_FAILURES_TOTAL.inc(step=index)
+                emit("error", error_msg)
+                succeeded = False
+                if cached_session:
+                    session_cache.invalidate(job.tenant, url, session_identity(use_agent), f"step {index} failed")
+                break
+            finally:
+                step_end = time.time()
+                logger.info(f"Step '{step}' completed in {step_end - step_start:.2f} seconds")
+                tracer.record(
+                    "step", int(step_start * 1e6), int((step_end - step_start) * 1e6),
+                    step=index, action=step, succeeded=succeeded,
+                )
+
+        if succeeded:
+            try:
+                with tracer.span("save_session"):
+                    save_session(agent, url, use_agent, job.tenant)
+            except Exception as e:
+                logger.warning(f"Failed to cache session (agent {agent_id}): {e}")
+
+    nova = None
+    try:
+        from nova.agent_factory import (
+            agent_pool, capture_storage_state, create_agent, restore_cached_session, restore_storage_state,
+            save_session, session_identity,
+        )
+        from nova.session_cache import session_cache
+        from nova.schemas.fault import Faults
+        from nova.result_cache import result_cache, step_key
+        from nova.step_budget import step_budgets
+        from nova_act import ActExceededMaxStepsError, ActTimeoutError
+        from nova.thinking_dispatcher import thinking_dispatcher
+
+        schema = Faults.model_json_schema()
+
+        if cancelled():
+            return
+
+        if job.cache_mode == "replay":
+            entries = [result_cache.get(cache_key(i)) for i in range(first_step, len(actions))]
+            if all(entries):
+                replay(entries)
+                return
+            # Partial hits cannot be replayed without the browser state they
+            # depend on, so run live and record.
+
+        if agent_pool.enabled:
+            # An agent acting as a declared identity must never inherit another one's
+            # session; others may opt out of the wipe with `clearStorage: false`.
+            clear_storage = bool(session_identity(use_agent) or use_agent_config.get("clearStorage", POOL_CLEAR_STORAGE))
+            with agent_pool.lease(url, clear_storage=clear_storage) as pooled:
+                if on_agent:
+                    on_agent(pooled.request_stop)
+                pooled.call(run_steps)
+            # The pool owns the browser; it is reset and reused, not closed.
+        else:
+            nova = create_agent(url, None, use_agent)
+            # The browser starts on entry; run_steps begins once it is up.
+            with tracer.span("agent_session"), nova:
+                run_steps(nova)
+
+    except Exception as agent_error:
+        error_msg = f"Error during agent execution (agent {agent_id}): {str(agent_error)}"
+        logger.error(error_msg)
+        logger.debug(traceback.format_exc())
+        emit("error", error_msg)
+
+    finally:
+        if nova:
+            try:
+                if hasattr(nova, "close"):
+                    nova.close()
+            except Exception as cleanup_error:
+                logger.warning(f"Error closing Nova agent: {str(cleanup_error)}")
+        if on_agent:
+            on_agent(None)
+
+
+# ── Thread backend ─────────────────────────────────────────────────────────────
+
+class ThreadBackend:
+    """Runs agents on the caller's thread inside the API process."""
+
+    name = "thread"
+    in_process = True
+
+    def run(self, job: AgentJob, emit: Emit, on_agent: Optional[Callable[[object], None]] = None, cancel=None):
+        run_agent(job, emit, on_agent, cancel)
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+    def shutdown(self):
+        pass
+
+
+# ── Process pool backend ───────────────────────────────────────────────────────
+
+def _worker_main(tasks, results, cancel):
+    """Worker process loop: run jobs until told to stop with None."""
+    from nova.agent_factory import agent_pool
+    from nova.thinking_log_handler import ThinkingLogHandler
+    from tracing import forward_to
+
+    def emit(kind: str, payload):
+        results.put((kind, payload))
+
+    metrics.forward_to(lambda record: emit("metric", record))
+    forward_to(lambda record: emit("span", record))
+
+    # A worker runs one job at a time, so every trace line belongs to it.
+    trace_logger = logging.getLogger(ThinkingLogHandler.LOGGER_NAME)
+    trace_logger.addHandler(ThinkingLogHandler(lambda line: emit("thinking", line)))
+
+    try:
+        while True:
+            job = tasks.get()
+            if job is None:
+                break
+            with tracer.bind(job.run_id if job.trace else None), tracer.span("run_agent", agent_id=job.agent_id):
+                run_agent(job, emit, cancel=cancel)
+            results.put(("done", None))
+    finally:
+        agent_pool.shutdown()
+
+
+class _Worker:
+    """One worker process with its own task and result queues."""
+
+    def __init__(self, ctx):
+        self.tasks = ctx.Queue()
+        self.results = ctx.Queue()
+        self.cancel = ctx.Event()
+        self.uses = 0
+        self.killed = False
+        self.process = ctx.Process(
+            target=_worker_main, args=(self.tasks, self.results, self.cancel), name="nova-worker",
+        )
+        self.process.start()
+
+    def run(self, job: AgentJob, emit: Emit, cancel=None) -> bool:
+        """
+        Send `job` and relay output until it finishes. Returns False if the
+        worker died, or was killed because it outlived the cancel grace period.
+        """
+        self.uses += 1
+        self.cancel.clear()
+        self.tasks.put(job)
+        kill_at: Optional[float] = None
+        while True:
+            if kill_at is None and cancel is not None and cancel.is_set():
+                self.cancel.set()
+                kill_at = time.monotonic() + CANCEL_GRACE
+            if kill_at is not None and time.monotonic() >= kill_at:
+                logger.warning(f"Killing worker process {self.process.pid}: agent {job.agent_id} ignored cancel")
+                self.killed = True
+                self.process.kill()
+                self.process.join(5)
+                return False
+            try:
+                kind, payload = self.results.get(timeout=0.25 if kill_at is not None else 1.0)
+            except queue.Empty:
+                if not self.process.is_alive():
+                    emit("error", (
+                        f"Worker process {self.process.pid} exited with code "
+                        f"{self.process.exitcode} (agent {job.agent_id})"
+                    ))
+                    return False
+                continue
+            if kind == "done":
+                return True
+            emit(kind, payload)
+
+    def stop(self, timeout: float = 30.0):
+        if self.process.is_alive():
+            try:
+                self.tasks.put(None)
+                self.process.join(timeout)
+            except Exception as e:
+                logger.warning(f"Error stopping worker process {self.process.pid}: {e}")
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(5)
+        self.tasks.close()
+        self.results.close()
+
+
+class ProcessPoolBackend:
+    """
+    Runs agents in up to `max_workers` worker processes. Idle workers are kept
+    for reuse (together with any warm agent pool inside them) and recycled
+    after `max_tasks_per_worker` jobs. A worker that dies mid-job fails only
+    that agent and is replaced on the next acquire.
+    """
+
+    name = "process"
+    in_process = False
+
+    def __init__(
+        self,
+        max_workers: int = PROCESS_WORKERS,
+        max_tasks_per_worker: int = PROCESS_MAX_TASKS_PER_WORKER,
+        start_method: str = PROCESS_START_METHOD,
+        acquire_timeout: float = PROCESS_ACQUIRE_TIMEOUT,
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.acquire_timeout = acquire_timeout
+        self._ctx = multiprocessing.get_context(start_method)
+
+        self._cond = threading.Condition()
+        self._idle: Deque[_Worker] = deque()
+        self._size = 0                              # live workers, idle or busy
+        self._busy = 0
+        self._closed = False
+        self._counters = {
+            "jobs": 0,
+            "spawned": 0,
+            "recycled": 0,
+            "crashed": 0,
+            "killed": 0,
+        }
+
+    def run(self, job: AgentJob, emit: Emit, on_agent: Optional[Callable[[object], None]] = None, cancel=None):
+        # Live agents stay in the worker process, so `on_agent` is never called.
+        try:
+            worker = self._acquire()
+        except Exception as e:
+            emit("error", f"Error starting worker process (agent {job.agent_id}): {str(e)}")
+            return
+
+        crashed = True
+        try:
+            crashed = not worker.run(job, emit, cancel)
+        finally:
+            self._release(worker, crashed)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "backend": self.name,
+                "max_workers": self.max_workers,
+                "max_tasks_per_worker": self.max_tasks_per_worker,
+                "size": self._size,
+                "idle": len(self._idle),
+                "busy": self._busy,
+                **self._counters,
+            }
+
+    def shutdown(self):
+        with self._cond:
+            self._closed = True
+            workers = list(self._idle)
+            self._idle.clear()
+            self._size -= len(workers)
+            self._cond.notify_all()
+        for worker in workers:
+            worker.stop()
+
+    # ── Internals ──────────────────────────────────────────────────────────────
+
+    def _acquire(self) -> _Worker:
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("Execution backend is shut down")
+                if self._idle:
+                    worker = self._idle.popleft()
+                    if worker.process.is_alive():
+                        break
+                    self._size -= 1
+                    self._counters["crashed"] += 1
+                    continue
+                if self._size < self.max_workers:
+                    self._size += 1
+                    worker = None
+                    break
+                remaining = self.acquire_timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise TimeoutError("Timed out waiting for a worker process")
+                self._cond.wait(remaining)
+            self._busy += 1
+            self._counters["jobs"] += 1
+
+        if worker is None:
+            try:
+                worker = _Worker(self._ctx)
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._busy -= 1
+                    self._cond.notify_all()
+                raise
+            with self._cond:
+                self._counters["spawned"] += 1
+        return worker
+
+    def _release(self, worker: _Worker, crashed: bool):
+        retire = crashed or worker.uses >= self.max_tasks_per_worker
+        with self._cond:
+            self._busy -= 1
+            if not retire and not self._closed:
+                self._idle.append(worker)
+                self._cond.notify_all()
+                return
+
+        worker.stop()
+        with self._cond:
+            self._size -= 1
+            if worker.killed:
+                self._counters["killed"] += 1
+            else:
+                self._counters["crashed" if crashed else "recycled"] += 1
+            self._cond.notify_all()
+
+
+def create_backend(name: str = EXECUTION_BACKEND):
+    if name == "process":
+        return ProcessPoolBackend()
+    if name != "thread":
+        logger.warning(f"Unknown execution backend '{name}', using thread backend")
+    return ThreadBackend()
+
+
+execution_backend = create_backend()
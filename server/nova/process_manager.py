@@ -1,44 +1,145 @@
 import asyncio
-from typing import Dict, Optional, Any
+import os
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
 
-class ProcessManager:
-    def __init__(self):
-        self.processes: Dict[str, dict] = {}
-
-    def register(self, run_id: str, task: asyncio.Task, metadata: dict = {}):
-        self.processes[run_id] = {
-            "task": task,
-            "status": "running",
-            "metadata": metadata,
+RUN_REGISTRY_TTL = float(os.getenv("RUN_REGISTRY_TTL", "3600"))             # seconds a finished run is kept
+RUN_REGISTRY_MAX_FINISHED = int(os.getenv("RUN_REGISTRY_MAX_FINISHED", "1000"))
+
+FINISHED_STATUSES = ("completed", "failed", "cancelled", "error")
+
+
+class RunRecord:
+    """
+    What the registry remembers about a run. The task is only held while the
+    run is active, and the config is reduced to the fields the run endpoints
+    report.
+    """
+
+    __slots__ = (
+        "run_id", "status", "url", "agent_ids", "tenant",
+        "created_at", "updated_at", "finished_at", "task",
+    )
+
+    def __init__(self, run_id: str, task: asyncio.Task, url: str, agent_ids: Tuple[str, ...], tenant: Optional[str]):
+        now = time.time()
+        self.run_id = run_id
+        self.status = "queued"
+        self.url = url
+        self.agent_ids = agent_ids
+        self.tenant = tenant
+        self.created_at = now
+        self.updated_at = now
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = task
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    def to_dict(self) -> dict:
+        return {
+            "run_id": self.run_id,
+            "status": self.status,
+            "url": self.url,
+            "agent_ids": list(self.agent_ids),
+            "tenant": self.tenant,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "finished_at": self.finished_at,
         }
 
+
+class ProcessManager:
+    """
+    Registry of runs started by this server. Finished runs are evicted once
+    they are older than `ttl` seconds or more than `max_finished` of them are
+    kept, oldest first. `on_change` is called with a run's record whenever it
+    is registered or its status changes (see run_state.py).
+    """
+
+    def __init__(self, ttl: float = RUN_REGISTRY_TTL, max_finished: int = RUN_REGISTRY_MAX_FINISHED):
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self.processes: Dict[str, RunRecord] = {}
+        self._finished: "OrderedDict[str, float]" = OrderedDict()   # run_id -> finished_at, oldest first
+        self.on_change: Optional[Callable[[RunRecord], None]] = None
+
+    def register(self, run_id: str, task: asyncio.Task, metadata: Optional[dict] = None, tenant: Optional[str] = None):
+        metadata = metadata or {}
+        agent_ids = tuple(
+            str(agent.get("id") or f"agent-{i}")
+            for i, agent in enumerate(metadata.get("agent_config", []))
+        )
+        self._finished.pop(run_id, None)
+        record = self.processes[run_id] = RunRecord(run_id, task, metadata.get("url", ""), agent_ids, tenant)
+        task.add_done_callback(lambda t: self._on_task_done(run_id, t))
+        if self.on_change:
+            self.on_change(record)
+        self._evict()
+
     def stop(self, run_id: str):
-        entry = self.processes.get(run_id)
-        if entry:
-            task = entry["task"]
-            if not task.done():
-                task.cancel()
-            entry["status"] = "cancelled"
-
-    def get(self, run_id: str) -> Optional[dict]:
+        record = self.processes.get(run_id)
+        if record:
+            if record.task and not record.task.done():
+                record.task.cancel()
+            self.mark_done(run_id, "cancelled")
+
+    def get(self, run_id: str) -> Optional[RunRecord]:
         return self.processes.get(run_id)
 
     def is_running(self, run_id: str) -> bool:
-        entry = self.processes.get(run_id)
-        if not entry:
-            return False
-        return not entry["task"].done()
+        record = self.processes.get(run_id)
+        return bool(record and record.task and not record.task.done())
 
     def mark_done(self, run_id: str, status: str = "completed"):
-        entry = self.processes.get(run_id)
-        if entry:
-            entry["status"] = status
+        record = self.processes.get(run_id)
+        if not record:
+            return
+        record.status = status
+        record.updated_at = time.time()
+        if record.finished:
+            record.finished_at = record.updated_at
+            record.task = None
+            self._finished[run_id] = record.finished_at
+            self._finished.move_to_end(run_id)
+        if self.on_change:
+            self.on_change(record)
+        if record.finished:
+            self._evict()
 
     def list_all(self) -> Dict[str, str]:
-        return {
-            rid: entry["status"]
-            for rid, entry in self.processes.items()
-        }
+        return {rid: record.status for rid, record in self.processes.items()}
+
+    def query(self, status: Optional[str] = None, limit: int = 50, offset: int = 0) -> Tuple[int, List[RunRecord]]:
+        """Newest-first page of runs, optionally filtered by status, and the total match count."""
+        self._evict()
+        records = [r for r in self.processes.values() if status is None or r.status == status]
+        records.sort(key=lambda r: r.created_at, reverse=True)
+        return len(records), records[offset:offset + limit]
+
+    # ── Internals ──────────────────────────────────────────────────────────────
+
+    def _on_task_done(self, run_id: str, task: asyncio.Task):
+        record = self.processes.get(run_id)
+        if record is None or record.task is not task:
+            return
+        if not record.finished:
+            # The run ended without reporting a terminal status.
+            self.mark_done(run_id, "cancelled" if task.cancelled() else "failed")
+        record.task = None
+
+    def _evict(self):
+        cutoff = time.time() - self.ttl
+        while self._finished:
+            run_id, finished_at = next(iter(self._finished.items()))
+            if finished_at >= cutoff and len(self._finished) <= self.max_finished:
+                break
+            self._finished.popitem(last=False)
+            record = self.processes.get(run_id)
+            if record is not None and record.finished:
+                del self.processes[run_id]
 
 
-process_manager = ProcessManager()
\ No newline at end of file
+process_manager = ProcessManager()
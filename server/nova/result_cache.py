@@ -0,0 +1,130 @@
+"""
+Record/replay cache for act_get steps.
+
+A step's result is keyed on everything that determines it: the starting URL,
+the actions that ran before it, the step text, the model parameters and the
+response schema. Each entry stores the ActMetadata, the parsed Faults
+response (if it matched the schema) and any page errors seen after the step.
+
+Entries live in a SQLite file so every process of the execution backend
+shares them. They expire after `ttl` seconds, and the least recently used
+entries are evicted once there are more than `max_entries`.
+
+Cache modes, per run:
+    off      every step runs live (default)
+    record   every step runs live and its result is stored
+    replay   an agent whose steps are all cached is replayed without a
+             browser; otherwise it runs live and is recorded
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+CACHE_MODES = ("off", "record", "replay")
+ACT_CACHE_MODE = os.getenv("NOVA_ACT_CACHE_MODE", "off")
+ACT_CACHE_PATH = os.getenv(
+    "NOVA_ACT_CACHE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), ".act_cache.sqlite3")
+)
+ACT_CACHE_TTL = float(os.getenv("NOVA_ACT_CACHE_TTL", str(7 * 24 * 3600)))
+ACT_CACHE_MAX_ENTRIES = int(os.getenv("NOVA_ACT_CACHE_MAX_ENTRIES", "10000"))
+
+
+def step_key(url: str, previous_steps: List[str], step: str, params: dict, schema: dict) -> str:
+    """Content address of one act_get call."""
+    blob = json.dumps([url, previous_steps, step, params, schema], sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, path: str = ACT_CACHE_PATH, ttl: float = ACT_CACHE_TTL, max_entries: int = ACT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "evicted": 0}
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the stored entry for `key`, or None if missing or expired."""
+        now = time.time()
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute("SELECT value, created_at FROM act_results WHERE key = ?", (key,)).fetchone()
+                if row is None or now - row[1] > self.ttl:
+                    if row is not None:
+                        conn.execute("DELETE FROM act_results WHERE key = ?", (key,))
+                        self._counters["evicted"] += 1
+                    self._counters["misses"] += 1
+                    return None
+                conn.execute("UPDATE act_results SET last_used = ? WHERE key = ?", (now, key))
+                self._counters["hits"] += 1
+                return pickle.loads(row[0])
+        except Exception as e:
+            logger.warning(f"Act cache lookup failed: {e}")
+            return None
+
+    def put(self, key: str, entry: dict):
+        now = time.time()
+        try:
+            value = pickle.dumps(entry)
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO act_results (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now),
+                )
+                self._counters["stores"] += 1
+                self._evict(conn, now)
+        except Exception as e:
+            logger.warning(f"Act cache store failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            try:
+                entries = self._connect().execute("SELECT COUNT(*) FROM act_results").fetchone()[0]
+            except Exception:
+                entries = None
+            return {
+                "mode": ACT_CACHE_MODE,
+                "ttl": self.ttl,
+                "max_entries": self.max_entries,
+                "entries": entries,
+                **self._counters,
+            }
+
+    # ── Internals ──────────────────────────────────────────────────────────────
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use. Lock must be held."""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS act_results ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS act_results_last_used ON act_results (last_used)")
+        return self._conn
+
+    def _evict(self, conn: sqlite3.Connection, now: float):
+        """Drop expired entries, then the least recently used beyond max_entries. Lock must be held."""
+        expired = conn.execute("DELETE FROM act_results WHERE created_at < ?", (now - self.ttl,)).rowcount
+        overflow = conn.execute(
+            "DELETE FROM act_results WHERE key IN ("
+            "SELECT key FROM act_results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        ).rowcount
+        self._counters["evicted"] += max(expired, 0) + max(overflow, 0)
+
+
+result_cache = ResultCache()
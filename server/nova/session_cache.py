@@ -0,0 +1,164 @@
+"""
+Per-origin browser session cache.
+
+Runs against a site behind a login otherwise spend their first steps signing
+in again. An agent whose config declares a `sessionIdentity` (the account it
+acts as) has its browser's storage state saved after every run in which all
+of its steps succeeded. The state covers cookies, localStorage and the
+sessionStorage of the page it ended on, and is keyed by the run's tenant, the
+origin of the agent's start URL and that identity. The next agent of the same
+tenant with the same origin and identity starts from the saved state instead
+of a fresh profile; identities are free-form, so two tenants testing the same
+origin as "admin" never share a session.
+
+An entry is dropped when
+    - it is older than NOVA_SESSION_CACHE_TTL seconds, or every cookie in it
+      has expired,
+    - a restored session lands on a login page (NOVA_SESSION_LOGIN_PATTERN)
+      instead of the page it was sent to, or
+    - an agent that started from it fails a step.
+
+Entries live in a SQLite file shared by every process of the execution
+backend. They hold session cookies, so the file sits in a directory that only
+its owner can enter, and is readable by its owner only.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+SESSION_CACHE = os.getenv("NOVA_SESSION_CACHE", "1") != "0"
+SESSION_CACHE_PATH = os.getenv(
+    "NOVA_SESSION_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), ".session_cache", "sessions.sqlite3"),
+)
+SESSION_CACHE_TTL = float(os.getenv("NOVA_SESSION_CACHE_TTL", str(12 * 3600)))
+SESSION_LOGIN_PATTERN = re.compile(
+    os.getenv("NOVA_SESSION_LOGIN_PATTERN", r"/(log-?in|sign-?in|auth|sso)(/|$)"), re.IGNORECASE
+)
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def looks_like_login(requested_url: str, landed_url: str) -> bool:
+    """Whether navigating to `requested_url` ended on a login page it did not ask for."""
+    return bool(SESSION_LOGIN_PATTERN.search(urlsplit(landed_url).path)) and not SESSION_LOGIN_PATTERN.search(
+        urlsplit(requested_url).path
+    )
+
+
+def live_cookies(state: dict, now: Optional[float] = None) -> list:
+    """Cookies of `state` that have not expired (session cookies, with expires -1, never do)."""
+    now = time.time() if now is None else now
+    return [c for c in state.get("cookies", []) if c.get("expires", -1) in (-1, None) or c["expires"] > now]
+
+
+class SessionCache:
+    def __init__(self, path: str = SESSION_CACHE_PATH, ttl: float = SESSION_CACHE_TTL, enabled: bool = SESSION_CACHE):
+        self.path = path
+        self.ttl = ttl
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._counters = {"hits": 0, "misses": 0, "stores": 0, "invalidated": 0}
+
+    def get(self, tenant: Optional[str], url: str, identity: str) -> Optional[dict]:
+        """Saved storage state of `tenant` for `identity` on the origin of `url`, or None."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        key = (tenant or "", _origin(url), identity)
+        try:
+            with self._lock:
+                conn = self._connect()
+                row = conn.execute(
+                    "SELECT state, created_at FROM sessions WHERE tenant = ? AND origin = ? AND identity = ?", key
+                ).fetchone()
+                state = json.loads(row[0]) if row else None
+                if state is not None and (now - row[1] > self.ttl or (state.get("cookies") and not live_cookies(state, now))):
+                    conn.execute("DELETE FROM sessions WHERE tenant = ? AND origin = ? AND identity = ?", key)
+                    self._counters["invalidated"] += 1
+                    state = None
+                self._counters["hits" if state else "misses"] += 1
+            return state
+        except Exception as e:
+            logger.warning(f"Session cache lookup failed: {e}")
+            return None
+
+    def put(self, tenant: Optional[str], url: str, identity: str, state: dict):
+        if not self.enabled:
+            return
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO sessions (tenant, origin, identity, state, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (tenant or "", _origin(url), identity, json.dumps(state), time.time()),
+                )
+                conn.execute("DELETE FROM sessions WHERE created_at < ?", (time.time() - self.ttl,))
+                self._counters["stores"] += 1
+        except Exception as e:
+            logger.warning(f"Session cache store failed: {e}")
+
+    def invalidate(self, tenant: Optional[str], url: str, identity: str, reason: str):
+        if not self.enabled:
+            return
+        origin = _origin(url)
+        try:
+            with self._lock:
+                deleted = self._connect().execute(
+                    "DELETE FROM sessions WHERE tenant = ? AND origin = ? AND identity = ?", (tenant or "", origin, identity)
+                ).rowcount
+                if deleted:
+                    self._counters["invalidated"] += 1
+            if deleted:
+                logger.info(f"Dropped cached session for {identity} on {origin}: {reason}")
+        except Exception as e:
+            logger.warning(f"Session cache invalidation failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            try:
+                entries = self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+            except Exception:
+                entries = None
+            return {"enabled": self.enabled, "ttl": self.ttl, "entries": entries, **self._counters}
+
+    # ── Internals ──────────────────────────────────────────────────────────────
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use. Lock must be held."""
+        if self._conn is None:
+            # The -wal and -shm files hold the same cookies, so the directory is private too.
+            os.makedirs(os.path.dirname(self.path) or ".", mode=0o700, exist_ok=True)
+            if not os.path.exists(self.path):
+                os.close(os.open(self.path, os.O_CREAT | os.O_WRONLY, 0o600))
+            self._conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(self.path + suffix):
+                    os.chmod(self.path + suffix, 0o600)
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(sessions)")]
+            if columns and "tenant" not in columns:
+                # Entries cached before sessions were scoped to a tenant cannot be attributed to one.
+                self._conn.execute("DROP TABLE sessions")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "tenant TEXT NOT NULL, origin TEXT NOT NULL, identity TEXT NOT NULL, state TEXT NOT NULL, "
+                "created_at REAL NOT NULL, PRIMARY KEY (tenant, origin, identity))"
+            )
+        return self._conn
+
+
+session_cache = SessionCache()
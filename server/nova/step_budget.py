@@ -0,0 +1,172 @@
+"""
+Per-step deadlines and step budgets learned from history.
+
+Every act_get is recorded against the origin of the page it started on and
+its action text: how long it took, how many model steps it used, and whether
+it finished ("ok"), hit its deadline ("timeout") or ran out of steps
+("max_steps"). Once a pair has `min_samples` samples, its next act_get gets
+
+    timeout    p`percentile` duration x margin + slack seconds
+    max_steps  p`percentile` step count x margin, rounded up
+
+clamped between a floor and the defaults (NOVA_STEP_TIMEOUT seconds and
+NOVA_STEP_MAX_STEPS steps), so a budget only ever tightens. Pairs without
+enough history, and every step with NOVA_STEP_BUDGET=fixed, get the defaults.
+
+A step cut short by its budget is recorded at the budget it hit, so a site
+that gets slower pushes its own budget back up over the next samples.
+
+Samples live in a SQLite file shared by every process of the execution
+backend; only the latest `window` per pair are kept.
+"""
+
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import List, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+STEP_TIMEOUT = float(os.getenv("NOVA_STEP_TIMEOUT", "200"))
+STEP_MAX_STEPS = int(os.getenv("NOVA_STEP_MAX_STEPS", "10"))
+STEP_BUDGET_MODE = os.getenv("NOVA_STEP_BUDGET", "adaptive")   # adaptive | fixed
+STEP_BUDGET_PATH = os.getenv(
+    "NOVA_STEP_BUDGET_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), ".step_budget.sqlite3")
+)
+STEP_BUDGET_MIN_SAMPLES = int(os.getenv("NOVA_STEP_BUDGET_MIN_SAMPLES", "5"))
+STEP_BUDGET_WINDOW = int(os.getenv("NOVA_STEP_BUDGET_WINDOW", "50"))
+STEP_BUDGET_PERCENTILE = float(os.getenv("NOVA_STEP_BUDGET_PERCENTILE", "95"))
+STEP_BUDGET_MARGIN = float(os.getenv("NOVA_STEP_BUDGET_MARGIN", "1.5"))
+STEP_BUDGET_SLACK = float(os.getenv("NOVA_STEP_BUDGET_SLACK", "10"))
+STEP_BUDGET_MIN_TIMEOUT = float(os.getenv("NOVA_STEP_BUDGET_MIN_TIMEOUT", "30"))
+STEP_BUDGET_MIN_STEPS = int(os.getenv("NOVA_STEP_BUDGET_MIN_STEPS", "3"))
+
+OUTCOMES = ("ok", "timeout", "max_steps")
+
+
+class Budget(NamedTuple):
+    timeout: float      # seconds act_get may run
+    max_steps: int      # model steps act_get may take
+    samples: int        # history the budget was derived from
+    adaptive: bool      # False when these are the defaults
+
+
+def pair_key(url: str, action: str) -> str:
+    """Key of an (origin, action) pair."""
+    parts = urlsplit(url)
+    origin = f"{parts.scheme}://{parts.netloc}"
+    return hashlib.sha256(f"{origin}\n{' '.join(action.split()).lower()}".encode()).hexdigest()
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(math.ceil(pct / 100 * len(ordered))) - 1)]
+
+
+class StepBudgets:
+    def __init__(
+        self,
+        path: str = STEP_BUDGET_PATH,
+        mode: str = STEP_BUDGET_MODE,
+        min_samples: int = STEP_BUDGET_MIN_SAMPLES,
+        window: int = STEP_BUDGET_WINDOW,
+    ):
+        self.path = path
+        self.mode = mode
+        self.min_samples = max(1, min_samples)
+        self.window = max(self.min_samples, window)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._counters = {"adaptive": 0, "default": 0, "recorded": 0}
+
+    def budget(self, url: str, action: str) -> Budget:
+        """Deadline and step budget for running `action` on the page at `url`."""
+        default = Budget(STEP_TIMEOUT, STEP_MAX_STEPS, 0, False)
+        if self.mode != "adaptive":
+            return default
+        try:
+            with self._lock:
+                rows = self._connect().execute(
+                    "SELECT seconds, steps FROM step_samples WHERE pair = ? ORDER BY id DESC LIMIT ?",
+                    (pair_key(url, action), self.window),
+                ).fetchall()
+        except Exception as e:
+            logger.warning(f"Step budget lookup failed: {e}")
+            return default
+        if len(rows) < self.min_samples:
+            self._counters["default"] += 1
+            return default._replace(samples=len(rows))
+
+        timeout = _percentile([r[0] for r in rows], STEP_BUDGET_PERCENTILE) * STEP_BUDGET_MARGIN + STEP_BUDGET_SLACK
+        steps = [r[1] for r in rows if r[1] is not None]
+        max_steps = (
+            math.ceil(_percentile(steps, STEP_BUDGET_PERCENTILE) * STEP_BUDGET_MARGIN) if steps else STEP_MAX_STEPS
+        )
+        self._counters["adaptive"] += 1
+        return Budget(
+            timeout=round(min(STEP_TIMEOUT, max(STEP_BUDGET_MIN_TIMEOUT, timeout)), 1),
+            max_steps=min(STEP_MAX_STEPS, max(STEP_BUDGET_MIN_STEPS, max_steps)),
+            samples=len(rows),
+            adaptive=True,
+        )
+
+    def record(self, url: str, action: str, seconds: float, steps: Optional[int], outcome: str = "ok"):
+        """Add a sample for `action` on the page at `url`. `steps` is None when unknown."""
+        key = pair_key(url, action)
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT INTO step_samples (pair, seconds, steps, outcome, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (key, seconds, steps, outcome, time.time()),
+                )
+                conn.execute(
+                    "DELETE FROM step_samples WHERE pair = ? AND id NOT IN ("
+                    "SELECT id FROM step_samples WHERE pair = ? ORDER BY id DESC LIMIT ?)",
+                    (key, key, self.window),
+                )
+                self._counters["recorded"] += 1
+        except Exception as e:
+            logger.warning(f"Step budget record failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            try:
+                conn = self._connect()
+                pairs, samples = conn.execute("SELECT COUNT(DISTINCT pair), COUNT(*) FROM step_samples").fetchone()
+                outcomes = dict(conn.execute("SELECT outcome, COUNT(*) FROM step_samples GROUP BY outcome").fetchall())
+            except Exception:
+                pairs = samples = None
+                outcomes = {}
+            return {
+                "mode": self.mode,
+                "default_timeout": STEP_TIMEOUT,
+                "default_max_steps": STEP_MAX_STEPS,
+                "pairs": pairs,
+                "samples": samples,
+                "outcomes": outcomes,
+                **self._counters,
+            }
+
+    # ── Internals ──────────────────────────────────────────────────────────────
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use. Lock must be held."""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS step_samples ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, pair TEXT NOT NULL, seconds REAL NOT NULL, steps INTEGER, "
+                "outcome TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS step_samples_pair ON step_samples (pair, id)")
+        return self._conn
+
+
+step_budgets = StepBudgets()
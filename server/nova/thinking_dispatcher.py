@@ -0,0 +1,91 @@
+"""
+Routes nova_act thinking lines to the run that produced them.
+
+One handler on the `nova_act.trace` logger serves every run in the process.
+A thread that drives an agent binds itself to its run with `bind(run_id)`,
+and each trace record is attributed to the run bound to the thread that
+logged it; lines from unbound threads are dropped. Lines relayed from worker
+processes are fed in directly with `put`.
+
+Routed lines are coalesced per run by a single shared flusher and persisted
+as one `thinking` event per batch, whose data is the list of lines.
+"""
+
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+from event_sink import EventSink
+from nova.thinking_log_handler import ThinkingLogHandler
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+THINKING_BATCH_SIZE = int(os.getenv("THINKING_BATCH_SIZE", "20"))
+THINKING_FLUSH_INTERVAL = float(os.getenv("THINKING_FLUSH_INTERVAL", "0.5"))
+
+
+class ThinkingDispatcher:
+    def __init__(self, max_batch: int = THINKING_BATCH_SIZE, flush_interval: float = THINKING_FLUSH_INTERVAL):
+        self._local = threading.local()
+        self._lines = EventSink(self._write, max_batch=max_batch, flush_interval=flush_interval)
+        self._handler: Optional[ThinkingLogHandler] = None
+        self._lock = threading.Lock()
+
+    def install(self):
+        """Attach the shared handler to `nova_act.trace` (once per process)."""
+        with self._lock:
+            if self._handler is None:
+                self._handler = ThinkingLogHandler(self._on_line)
+                logging.getLogger(ThinkingLogHandler.LOGGER_NAME).addHandler(self._handler)
+
+    @contextmanager
+    def bind(self, run_id: Optional[str]) -> Iterator[None]:
+        """Attribute trace lines logged by the current thread to `run_id`."""
+        previous = getattr(self._local, "run_id", None)
+        self._local.run_id = run_id
+        try:
+            yield
+        finally:
+            self._local.run_id = previous
+
+    def put(self, run_id: str, line: str):
+        self._lines.put(run_id, {"run_id": run_id, "line": line})
+
+    def flush(self, run_id: str, timeout: float = 5.0) -> bool:
+        """Persist every line routed to `run_id` so far and drop its bookkeeping."""
+        done = self._lines.flush(run_id, timeout=timeout)
+        self._lines.forget(run_id)
+        return done
+
+    async def flush_async(self, run_id: str, timeout: float = 5.0) -> bool:
+        """`flush` for the event loop; waits without holding an executor thread."""
+        done = await self._lines.flush_async(run_id, timeout=timeout)
+        self._lines.forget(run_id)
+        return done
+
+    def pending_count(self) -> int:
+        return self._lines.pending_count()
+
+    def close(self, timeout: float = 10.0):
+        self._lines.close(timeout=timeout)
+
+    # ── Internals ──────────────────────────────────────────────────────────────
+
+    def _on_line(self, line: str):
+        run_id = getattr(self._local, "run_id", None)
+        if run_id:
+            self.put(run_id, line)
+
+    def _write(self, rows: List[dict]):
+        from db import persist_event
+
+        # EventSink batches never mix runs.
+        run_id = rows[0]["run_id"]
+        with tracer.span("thinking_dispatcher.write", run_id=run_id, lines=len(rows)):
+            persist_event(run_id, "thinking", [row["line"] for row in rows])
+
+
+thinking_dispatcher = ThinkingDispatcher()
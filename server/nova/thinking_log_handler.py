@@ -1,5 +1,5 @@
 """
-Captures thinking log lines emitted by nova_act and puts them in a queue.
+Captures thinking log lines emitted by nova_act and hands them to a callback.
 
 nova_act logs agent trace lines (e.g. `24df> think("...")`) via the
 `nova_act.trace` logger using trace_log_lines(). This handler intercepts
@@ -7,19 +7,19 @@ them line-by-line.
 """
 
 import logging
-import queue
+from typing import Callable
 
 
 class ThinkingLogHandler(logging.Handler):
     """
-    Attaches to the `nova_act.trace` logger and enqueues each message line.
+    Attaches to the `nova_act.trace` logger and passes each message line to `on_line`.
     """
 
     LOGGER_NAME = "nova_act.trace"
 
-    def __init__(self, line_queue: queue.Queue):
+    def __init__(self, on_line: Callable[[str], None]):
         super().__init__(level=logging.DEBUG)
-        self.line_queue = line_queue
+        self.on_line = on_line
 
     def emit(self, record: logging.LogRecord):
         try:
@@ -27,6 +27,6 @@ class ThinkingLogHandler(logging.Handler):
             for line in msg.splitlines():
                 line = line.strip()
                 if line:
-                    self.line_queue.put(line)
+                    self.on_line(line)
         except Exception:
             self.handleError(record)
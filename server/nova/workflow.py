@@ -0,0 +1,179 @@
+"""
+Workflow planning: turns a run's configuration into branches that can run
+side by side.
+
+A branch is a chain of steps executed in order by one agent session on one
+page. Branches that do not depend on each other run concurrently, each in
+its own browser session; a branch that depends on others starts once they
+have finished, with their cookies and localStorage merged into its session.
+
+Without an explicit workflow, every agent runs its actions on the start URL
+and on each of `pages`, as independent branches. With one, the run is a DAG
+of steps:
+
+    [
+        {"id": "login",   "page": "/login",    "action": "Log in as the demo user"},
+        {"id": "cart",    "page": "/cart",     "action": "Add an item", "depends_on": ["login"]},
+        {"id": "profile", "page": "/settings", "action": "Edit the bio", "depends_on": ["login"]},
+    ]
+
+`page` is resolved against the start URL, and `agent` optionally names the
+agent_config entry whose context and tools the step uses (the first agent by
+default). Consecutive steps on the same page and agent, with no fan-in or
+fan-out between them, are merged into one branch so they share a session.
+"""
+
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urljoin
+
+from nova.types import Agent
+
+
+class WorkflowError(ValueError):
+    """Raised for a workflow that is not a valid DAG of steps."""
+
+
+class Branch(NamedTuple):
+    id: str
+    page: str                     # absolute URL the branch's session starts on
+    agent: Agent                  # agent config whose actions are the branch's steps
+    depends_on: Tuple[str, ...]   # ids of branches that must finish first
+
+
+def plan(url: str, pages: List[str], agent_config: List[Agent], workflow: Optional[List[dict]] = None) -> List[Branch]:
+    """Branches for a run, in an order where every branch follows its dependencies."""
+    if workflow:
+        return _plan_workflow(url, workflow, agent_config)
+    return _plan_pages(url, pages, agent_config)
+
+
+def merge_storage_states(states: List[Optional[dict]]) -> Optional[dict]:
+    """Combine captured storage states; later states win on conflicting cookies and keys."""
+    cookies: Dict[tuple, dict] = {}
+    origins: Dict[str, Dict[str, dict]] = {}
+    session: Dict[str, Dict[str, dict]] = {}
+    for state in states:
+        for cookie in (state or {}).get("cookies", []):
+            cookies[(cookie.get("name"), cookie.get("domain"), cookie.get("path"))] = cookie
+        for entry in (state or {}).get("origins", []):
+            items = origins.setdefault(entry["origin"], {})
+            for item in entry.get("localStorage") or []:
+                items[item["name"]] = item
+        for entry in (state or {}).get("sessionStorage", []):
+            items = session.setdefault(entry["origin"], {})
+            for item in entry.get("items") or []:
+                items[item["name"]] = item
+    if not cookies and not origins and not session:
+        return None
+    merged = {
+        "cookies": list(cookies.values()),
+        "origins": [{"origin": o, "localStorage": list(items.values())} for o, items in origins.items()],
+    }
+    if session:
+        merged["sessionStorage"] = [{"origin": o, "items": list(items.values())} for o, items in session.items()]
+    return merged
+
+
+# ── Internals ──────────────────────────────────────────────────────────────────
+
+def _plan_pages(url: str, pages: List[str], agent_config: List[Agent]) -> List[Branch]:
+    targets = [url]
+    for page in pages or []:
+        resolved = urljoin(url, page) if page else ""
+        if resolved and resolved not in targets:
+            targets.append(resolved)
+
+    branches = []
+    for i, agent in enumerate(agent_config):
+        agent_id = agent.get("id") or f"agent-{i}"
+        for j, page in enumerate(targets):
+            # The start URL keeps the agent's own id, so runs without pages
+            # (and their checkpoints) look exactly as before.
+            branch_id = agent_id if j == 0 else f"{agent_id}@{page}"
+            branches.append(Branch(branch_id, page, dict(agent, id=branch_id, url=page), ()))
+    return branches
+
+
+def _plan_workflow(url: str, workflow: List[dict], agent_config: List[Agent]) -> List[Branch]:
+    if not agent_config:
+        raise WorkflowError("A workflow needs at least one agent in agent_config")
+    agents = {agent.get("id") or f"agent-{i}": agent for i, agent in enumerate(agent_config)}
+    default_agent = next(iter(agents))
+
+    steps: Dict[str, dict] = {}
+    for i, step in enumerate(workflow):
+        step_id = str(step.get("id") or f"step-{i}")
+        if step_id in steps:
+            raise WorkflowError(f"Duplicate workflow step id '{step_id}'")
+        if not step.get("action"):
+            raise WorkflowError(f"Workflow step '{step_id}' has no action")
+        agent_id = step.get("agent") or default_agent
+        if agent_id not in agents:
+            raise WorkflowError(f"Workflow step '{step_id}' uses unknown agent '{agent_id}'")
+        steps[step_id] = {
+            "action": step["action"],
+            "page": urljoin(url, step.get("page") or url),
+            "agent": agent_id,
+            "depends_on": tuple(str(d) for d in step.get("depends_on") or ()),
+        }
+    for step_id, step in steps.items():
+        for dep in step["depends_on"]:
+            if dep not in steps:
+                raise WorkflowError(f"Workflow step '{step_id}' depends on unknown step '{dep}'")
+
+    order = _topological_order(steps)
+    children: Dict[str, int] = {step_id: 0 for step_id in steps}
+    for step in steps.values():
+        for dep in step["depends_on"]:
+            children[dep] += 1
+
+    branch_of: Dict[str, str] = {}
+    chains: Dict[str, dict] = {}   # branch id -> {page, agent, actions, depends_on}, in creation order
+    for step_id in order:
+        step = steps[step_id]
+        deps = step["depends_on"]
+        if len(deps) == 1 and children[deps[0]] == 1:
+            parent = chains[branch_of[deps[0]]]
+            if parent["page"] == step["page"] and parent["agent"] == step["agent"]:
+                parent["actions"].append(step["action"])
+                branch_of[step_id] = branch_of[deps[0]]
+                continue
+        branch_of[step_id] = step_id
+        chains[step_id] = {
+            "page": step["page"],
+            "agent": step["agent"],
+            "actions": [step["action"]],
+            "depends_on": tuple(dict.fromkeys(branch_of[d] for d in deps)),
+        }
+
+    return [
+        Branch(
+            branch_id,
+            chain["page"],
+            dict(agents[chain["agent"]], id=branch_id, url=chain["page"], actions=chain["actions"]),
+            chain["depends_on"],
+        )
+        for branch_id, chain in chains.items()
+    ]
+
+
+def _topological_order(steps: Dict[str, dict]) -> List[str]:
+    remaining = {step_id: len(step["depends_on"]) for step_id, step in steps.items()}
+    dependents: Dict[str, List[str]] = {step_id: [] for step_id in steps}
+    for step_id, step in steps.items():
+        for dep in step["depends_on"]:
+            dependents[dep].append(step_id)
+
+    ready = [step_id for step_id, count in remaining.items() if count == 0]
+    order = []
+    while ready:
+        step_id = ready.pop(0)
+        order.append(step_id)
+        for child in dependents[step_id]:
+            remaining[child] -= 1
+            if remaining[child] == 0:
+                ready.append(child)
+    if len(order) != len(steps):
+        cycle = sorted(step_id for step_id, count in remaining.items() if count > 0)
+        raise WorkflowError(f"Workflow has a dependency cycle among: {', '.join(cycle)}")
+    return order
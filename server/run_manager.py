@@ -3,7 +3,7 @@
 
 import asyncio
 import uuid
-from typing import Dict
+from typing import Dict, List, Optional
 from nova.types import Agent
 
 
@@ -11,6 +11,7 @@ class RunManager:
     def __init__(self):
         self.tasks: Dict[str, asyncio.Task] = {}
         self.run_configs: Dict[str, dict] = {}
+        self.runners: Dict[str, object] = {}   # run_id -> ActRunner, kept while its agent threads are alive
 
     # ── Run lifecycle ──────────────────────────────────────────────────────────
 
@@ -36,9 +37,16 @@ class RunManager:
         task = self.tasks.get(run_id)
         return task is not None and not task.done()
 
+    def agents_running(self, run_id: str) -> List[str]:
+        """Agents of the run whose threads have not exited, e.g. still inside an act_get after a cancel."""
+        runner = self.runners.get(run_id)
+        return runner.running_agents() if runner else []
+
     def cleanup(self, run_id: str):
         self.tasks.pop(run_id, None)
         self.run_configs.pop(run_id, None)
+        for rid in [r for r, runner in self.runners.items() if not runner.running_agents()]:
+            del self.runners[rid]
 
 
 run_manager = RunManager()
@@ -46,41 +54,71 @@ run_manager = RunManager()
 
 # ── Run execution ──────────────────────────────────────────────────────────────
 
-async def execute_act_run(run_id: str, config: dict):
+async def execute_act_run(run_id: str, config: dict, resume: Optional[Dict[str, dict]] = None):
+    """
+    Run `config` under `run_id`. With `resume` (agent id -> last checkpoint),
+    agents continue after their checkpointed step instead of starting over.
+    """
     from nova.act_runner import ActRunner
+    from nova.result_cache import ACT_CACHE_MODE
     from nova.process_manager import process_manager
-    from db import persist_event, update_run_status
+    from blob_store import screenshot_store
+    from checkpoints import checkpoint_store
+    from db import event_positions, persist_event, update_run_status
+    from tracing import tracer
 
     agent_config = list(map(lambda x: Agent(**x), config.get("agent_config", [])))
     url = config.get("url", "")
     pages = config.get("pages", [])
 
-    try:
-        update_run_status(run_id, "running")
-        runner = ActRunner(run_id=run_id)
-
-        async for metadata in runner.run_act(url, pages, agent_config):
-            metadata_dict = {
-                "prompt": metadata.prompt,
-                "num_steps": metadata.num_steps_executed,
-            }
-            if hasattr(metadata, "action_type"):
-                metadata_dict["action_type"] = metadata.action_type
-            if hasattr(metadata, "action"):
-                metadata_dict["action"] = metadata.action
-
-            persist_event(run_id, "metadata", metadata_dict)
-
-        update_run_status(run_id, "completed")
-        process_manager.mark_done(run_id, "completed")
-
-    except asyncio.CancelledError:
-        update_run_status(run_id, "cancelled")
-        process_manager.mark_done(run_id, "cancelled")
-
-    except Exception as e:
-        update_run_status(run_id, "failed")
-        process_manager.mark_done(run_id, "failed")
-
-    finally:
-        run_manager.cleanup(run_id)
+    runner = None
+    with tracer.run(run_id, "execute_act_run"):
+        try:
+            # Both write to disk (the spool, the checkpoint file), so keep them off the event loop.
+            await asyncio.to_thread(update_run_status, run_id, "running")
+            if resume is None:
+                await asyncio.to_thread(checkpoint_store.begin, run_id, config)
+            runner = run_manager.runners[run_id] = ActRunner(
+                run_id=run_id, cache_mode=config.get("cache_mode", ACT_CACHE_MODE), tenant=config.get("tenant"),
+            )
+
+            runs = runner.run_act(url, pages, agent_config, resume=resume, workflow=config.get("workflow"))
+            async for agent_id, metadata in runs:
+                metadata_dict = {
+                    "agent_id": agent_id,
+                    "prompt": metadata.prompt,
+                    "num_steps": metadata.num_steps_executed,
+                }
+                if hasattr(metadata, "action_type"):
+                    metadata_dict["action_type"] = metadata.action_type
+                if hasattr(metadata, "action"):
+                    metadata_dict["action"] = metadata.action
+                if getattr(metadata, "screenshot", None):
+                    with tracer.span("screenshot_store.reference", agent_id=agent_id):
+                        metadata_dict["screenshot"] = await asyncio.to_thread(screenshot_store.reference, metadata.screenshot)
+
+                persist_event(run_id, "metadata", metadata_dict)
+
+            # Terminal statuses wait for the run's queued events to be written,
+            # so keep that wait off the event loop.
+            await asyncio.to_thread(update_run_status, run_id, "completed")
+            await asyncio.to_thread(checkpoint_store.discard, run_id)
+            process_manager.mark_done(run_id, "completed")
+
+        except asyncio.CancelledError:
+            await asyncio.to_thread(update_run_status, run_id, "cancelled")
+            process_manager.mark_done(run_id, "cancelled")
+
+        except Exception as e:
+            await asyncio.to_thread(update_run_status, run_id, "failed")
+            process_manager.mark_done(run_id, "failed")
+
+        finally:
+            # The scheduler frees the run's slot when this returns, so hold it
+            # while agent threads, and their browsers, are still alive.
+            if runner is not None and runner.running_agents():
+                with tracer.span("wait_for_agents", agents=runner.running_agents()):
+                    await runner.wait_stopped()
+            # No agent can emit any more, so this is where a resume numbers on from.
+            await asyncio.to_thread(checkpoint_store.note_positions, run_id, event_positions(run_id))
+            run_manager.cleanup(run_id)
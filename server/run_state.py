@@ -0,0 +1,471 @@
+"""
+Run state shared between API worker processes.
+
+Tasks only exist in the worker that started them, so each worker keeps its
+own ProcessManager. What other workers need to see goes through one of two
+run state backends:
+
+    local    the single-process default. Reads come straight from this
+             process's ProcessManager and cancellation cancels the task.
+    sqlite   a SQLite file (WAL mode) that every worker on the host, or
+             every host on a shared volume, opens. Each worker mirrors its
+             runs into it, heartbeats, and polls for cancel requests
+             addressed to the runs it owns. Runs whose owner stops
+             heartbeating for RUN_STATE_OWNER_TTL seconds are marked failed
+             by a surviving worker.
+
+The backend defaults to sqlite when API_WORKERS > 1.
+
+Both backends also bind keys to runs, which /start-act uses to hand
+duplicate requests the run that is already executing. A key bound with a
+TTL (an idempotency key) holds until it expires; one bound without (a
+config fingerprint) holds while its run is active.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from nova.process_manager import FINISHED_STATUSES, RunRecord, process_manager
+
+logger = logging.getLogger(__name__)
+
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+RUN_STATE_BACKEND = os.getenv("RUN_STATE_BACKEND", "sqlite" if API_WORKERS > 1 else "local")
+RUN_STATE_PATH = os.getenv("RUN_STATE_PATH", os.path.join(os.path.dirname(__file__), ".run_state.sqlite3"))
+RUN_STATE_POLL_INTERVAL = float(os.getenv("RUN_STATE_POLL_INTERVAL", "0.5"))
+RUN_STATE_OWNER_TTL = float(os.getenv("RUN_STATE_OWNER_TTL", "15"))
+RUN_COALESCING = os.getenv("RUN_COALESCING", "1") != "0"
+IDEMPOTENCY_KEY_TTL = float(os.getenv("IDEMPOTENCY_KEY_TTL", "86400"))
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LocalRunState:
+    """Run state of a single API process."""
+
+    name = "local"
+
+    def __init__(self):
+        self._keys: Dict[str, tuple] = {}   # key -> (run_id, fingerprint, created_at, expires_at)
+        self._keys_lock = threading.Lock()
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def get(self, run_id: str) -> Optional[dict]:
+        record = process_manager.get(run_id)
+        return _local_view(record) if record else None
+
+    def query(self, status: Optional[str] = None, limit: int = 50, offset: int = 0) -> Tuple[int, List[dict]]:
+        total, records = process_manager.query(status=status, limit=limit, offset=offset)
+        return total, [_local_view(r) for r in records]
+
+    def request_cancel(self, run_id: str) -> bool:
+        """Cancel the run. Returns False if it is not active."""
+        return _cancel_local(run_id)
+
+    def claim_run(self, run_id: str) -> bool:
+        """Take a finished run over to execute it again (a resume). Returns False if it is active."""
+        return not process_manager.is_running(run_id)
+
+    def release_run(self, run_id: str, status: str):
+        """Give back a run claimed by `claim_run` that did not start, leaving it `status`."""
+
+    def claim_key(self, key: str, run_id: str, fingerprint: str, ttl: Optional[float] = None) -> Tuple[str, str]:
+        """
+        Bind `key` to `run_id` unless it is still bound to another run.
+        Returns the (run_id, fingerprint) the key is bound to afterwards.
+        """
+        now = time.time()
+        with self._keys_lock:
+            for k, (_, _, created_at, expires_at) in list(self._keys.items()):
+                if (created_at + process_manager.ttl if expires_at is None else expires_at) < now:
+                    del self._keys[k]
+            bound = self._keys.get(key)
+            if bound is not None:
+                bound_run, bound_fingerprint, created_at, expires_at = bound
+                if expires_at is not None:
+                    return bound_run, bound_fingerprint
+                record = process_manager.get(bound_run)
+                # A run not registered yet counts as active for one owner TTL.
+                if (record is None and created_at >= now - RUN_STATE_OWNER_TTL) or (record and not record.finished):
+                    return bound_run, bound_fingerprint
+            self._keys[key] = (run_id, fingerprint, now, None if ttl is None else now + ttl)
+        return run_id, fingerprint
+
+    def release_key(self, key: str, run_id: str):
+        """Unbind `key` if it is bound to `run_id`."""
+        with self._keys_lock:
+            if self._keys.get(key, (None,))[0] == run_id:
+                del self._keys[key]
+
+    def stats(self) -> dict:
+        return {"backend": self.name, "worker_id": WORKER_ID, "keys": len(self._keys)}
+
+
+class SqliteRunState:
+    """Run state in a SQLite file shared by every API worker."""
+
+    name = "sqlite"
+
+    def __init__(
+        self,
+        path: str = RUN_STATE_PATH,
+        poll_interval: float = RUN_STATE_POLL_INTERVAL,
+        owner_ttl: float = RUN_STATE_OWNER_TTL,
+    ):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.owner_ttl = owner_ttl
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._poller: Optional[asyncio.Task] = None
+        self._pending: Dict[str, tuple] = {}   # run_id -> latest row not yet written by save()
+        self._pending_lock = threading.Lock()
+        self._flush_scheduled = False
+        self._counters = {"remote_cancels": 0, "reaped": 0}
+
+    async def start(self):
+        process_manager.on_change = self.save
+        self._heartbeat()
+        self._poller = asyncio.create_task(self._poll())
+
+    async def close(self):
+        if self._poller:
+            self._poller.cancel()
+        process_manager.on_change = None
+        await asyncio.to_thread(self._flush)
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM workers WHERE worker_id = ?", (WORKER_ID,))
+
+    def save(self, record: RunRecord):
+        """
+        Mirror a local run's record. Called by ProcessManager, on the event
+        loop, on every change, so the write itself happens on an executor
+        thread; reads made by this worker write pending records first.
+        """
+        row = (
+            record.run_id, WORKER_ID, record.status, record.url, json.dumps(list(record.agent_ids)),
+            record.tenant, record.created_at, record.updated_at, record.finished_at,
+        )
+        with self._pending_lock:
+            self._pending[record.run_id] = row
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        try:
+            asyncio.get_running_loop().run_in_executor(None, self._flush)
+        except RuntimeError:   # no event loop (shutdown): write now
+            self._flush()
+
+    def get(self, run_id: str) -> Optional[dict]:
+        with self._lock:
+            self._write_pending()
+            row = self._connect().execute(f"{_SELECT_RUNS} WHERE r.run_id = ?", (run_id,)).fetchone()
+        return self._view(row) if row else None
+
+    def query(self, status: Optional[str] = None, limit: int = 50, offset: int = 0) -> Tuple[int, List[dict]]:
+        where, args = ("WHERE r.status = ?", (status,)) if status else ("", ())
+        with self._lock:
+            self._write_pending()
+            conn = self._connect()
+            total = conn.execute(f"SELECT COUNT(*) FROM runs r {where}", args).fetchone()[0]
+            rows = conn.execute(
+                f"{_SELECT_RUNS} {where} ORDER BY r.created_at DESC LIMIT ? OFFSET ?", (*args, limit, offset)
+            ).fetchall()
+        return total, [self._view(row) for row in rows]
+
+    def request_cancel(self, run_id: str) -> bool:
+        """
+        Cancel the run here if this worker owns it, otherwise flag it for its
+        owner to pick up on its next poll. Returns False if it is not active.
+        """
+        if _cancel_local(run_id):
+            return True
+        with self._lock:
+            self._write_pending()
+            conn = self._connect()
+            with conn:
+                flagged = conn.execute(
+                    "UPDATE runs SET cancel_requested = 1 WHERE run_id = ? AND finished_at IS NULL", (run_id,)
+                ).rowcount
+        return bool(flagged)
+
+    def claim_run(self, run_id: str) -> bool:
+        """
+        Take a finished run over to execute it again (a resume), unless it is
+        active on a live worker, this one included. The check and the takeover
+        are one statement, so of two workers resuming the same run only one
+        wins. Returns False if the run is active.
+        """
+        now = time.time()
+        with self._lock:
+            self._write_pending()
+            conn = self._connect()
+            with conn:
+                claimed = conn.execute(
+                    "INSERT INTO runs (run_id, owner, status, created_at, updated_at, cancel_requested) "
+                    "VALUES (:run_id, :owner, 'queued', :now, :now, 0) "
+                    "ON CONFLICT(run_id) DO UPDATE SET owner = excluded.owner, status = excluded.status, "
+                    "updated_at = excluded.updated_at, finished_at = NULL, cancel_requested = 0 "
+                    "WHERE runs.finished_at IS NOT NULL OR runs.owner NOT IN "
+                    "(SELECT worker_id FROM workers WHERE heartbeat >= :cutoff)",
+                    {"run_id": run_id, "owner": WORKER_ID, "now": now, "cutoff": now - self.owner_ttl},
+                ).rowcount
+        return bool(claimed)
+
+    def release_run(self, run_id: str, status: str):
+        """Give back a run claimed by `claim_run` that did not start, leaving it `status`."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "UPDATE runs SET status = ?, updated_at = ?, finished_at = ? "
+                    "WHERE run_id = ? AND owner = ? AND finished_at IS NULL",
+                    (status, now, now, run_id, WORKER_ID),
+                )
+
+    def claim_key(self, key: str, run_id: str, fingerprint: str, ttl: Optional[float] = None) -> Tuple[str, str]:
+        """
+        Bind `key` to `run_id` unless it is still bound to another run.
+        Returns the (run_id, fingerprint) the key is bound to afterwards.
+        """
+        now = time.time()
+        with self._lock:
+            self._write_pending()
+            conn = self._connect()
+            with conn:
+                # A run that has not been mirrored yet counts as active for
+                # one owner TTL, so a concurrent duplicate cannot steal its key.
+                conn.execute(
+                    "INSERT INTO run_keys (key, run_id, fingerprint, created_at, expires_at) "
+                    "VALUES (:key, :run_id, :fingerprint, :now, :expires_at) "
+                    "ON CONFLICT(key) DO UPDATE SET run_id = excluded.run_id, fingerprint = excluded.fingerprint, "
+                    "created_at = excluded.created_at, expires_at = excluded.expires_at "
+                    "WHERE NOT (CASE WHEN run_keys.expires_at IS NOT NULL THEN run_keys.expires_at > :now ELSE ("
+                    "EXISTS (SELECT 1 FROM runs r JOIN workers w ON w.worker_id = r.owner "
+                    "WHERE r.run_id = run_keys.run_id AND r.finished_at IS NULL AND w.heartbeat >= :cutoff) "
+                    "OR (NOT EXISTS (SELECT 1 FROM runs r WHERE r.run_id = run_keys.run_id) "
+                    "AND run_keys.created_at >= :cutoff)) END)",
+                    {
+                        "key": key, "run_id": run_id, "fingerprint": fingerprint, "now": now,
+                        "expires_at": None if ttl is None else now + ttl, "cutoff": now - self.owner_ttl,
+                    },
+                )
+                bound_run, bound_fingerprint = conn.execute(
+                    "SELECT run_id, fingerprint FROM run_keys WHERE key = ?", (key,)
+                ).fetchone()
+        return bound_run, bound_fingerprint
+
+    def release_key(self, key: str, run_id: str):
+        """Unbind `key` if it is bound to `run_id`."""
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM run_keys WHERE key = ? AND run_id = ?", (key, run_id))
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._write_pending()
+            conn = self._connect()
+            workers = conn.execute(
+                "SELECT COUNT(*) FROM workers WHERE heartbeat >= ?", (time.time() - self.owner_ttl,)
+            ).fetchone()[0]
+            active = conn.execute("SELECT COUNT(*) FROM runs WHERE finished_at IS NULL").fetchone()[0]
+            keys = conn.execute("SELECT COUNT(*) FROM run_keys").fetchone()[0]
+        return {
+            "backend": self.name,
+            "worker_id": WORKER_ID,
+            "path": self.path,
+            "live_workers": workers,
+            "active_runs": active,
+            "keys": keys,
+            **self._counters,
+        }
+
+    # ── Internals ──────────────────────────────────────────────────────────────
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use. Lock must be held."""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS runs ("
+                "run_id TEXT PRIMARY KEY, owner TEXT NOT NULL, status TEXT NOT NULL, url TEXT, agent_ids TEXT, "
+                "tenant TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL, finished_at REAL, "
+                "cancel_requested INTEGER NOT NULL DEFAULT 0)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS runs_owner ON runs (owner, finished_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS runs_created ON runs (created_at)")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS workers (worker_id TEXT PRIMARY KEY, heartbeat REAL NOT NULL)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS run_keys (key TEXT PRIMARY KEY, run_id TEXT NOT NULL, "
+                "fingerprint TEXT NOT NULL, created_at REAL NOT NULL, expires_at REAL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _flush(self):
+        """Write the records queued by save()."""
+        with self._pending_lock:
+            self._flush_scheduled = False
+        with self._lock:
+            self._write_pending()
+
+    def _write_pending(self):
+        """
+        Write the records queued by save(), newest per run. Lock must be held,
+        so a flush that took its rows earlier cannot overwrite newer ones.
+        """
+        with self._pending_lock:
+            rows = list(self._pending.values())
+            self._pending.clear()
+        if not rows:
+            return
+        try:
+            conn = self._connect()
+            with conn:
+                conn.executemany(_UPSERT_RUN, rows)
+        except Exception as e:
+            logger.error(f"Failed to share state of runs {', '.join(r[0] for r in rows)}: {e}")
+
+    def _view(self, row: tuple) -> dict:
+        run_id, owner, status, url, agent_ids, tenant, created_at, updated_at, finished_at, heartbeat = row
+        return {
+            "run_id": run_id,
+            "status": status,
+            "url": url,
+            "agent_ids": json.loads(agent_ids or "[]"),
+            "tenant": tenant,
+            "created_at": created_at,
+            "updated_at": updated_at,
+            "finished_at": finished_at,
+            "owner": owner,
+            "owner_alive": heartbeat is not None and heartbeat >= time.time() - self.owner_ttl,
+        }
+
+    def _heartbeat(self):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.execute(
+                    "INSERT INTO workers (worker_id, heartbeat) VALUES (?, ?) "
+                    "ON CONFLICT(worker_id) DO UPDATE SET heartbeat = excluded.heartbeat",
+                    (WORKER_ID, time.time()),
+                )
+
+    def _take_cancel_requests(self) -> List[str]:
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                run_ids = [r for (r,) in conn.execute(
+                    "SELECT run_id FROM runs WHERE owner = ? AND cancel_requested = 1 AND finished_at IS NULL",
+                    (WORKER_ID,),
+                )]
+                conn.executemany("UPDATE runs SET cancel_requested = 0 WHERE run_id = ?", [(r,) for r in run_ids])
+        return run_ids
+
+    def _reap_orphans(self) -> List[str]:
+        """Mark failed the active runs of workers that stopped heartbeating, and drop expired runs and keys."""
+        now = time.time()
+        cutoff = now - self.owner_ttl
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                run_ids = [r for (r,) in conn.execute(
+                    "SELECT run_id FROM runs WHERE finished_at IS NULL AND owner NOT IN "
+                    "(SELECT worker_id FROM workers WHERE heartbeat >= ?)",
+                    (cutoff,),
+                )]
+                conn.executemany(
+                    "UPDATE runs SET status = 'failed', updated_at = ?, finished_at = ?, cancel_requested = 0 "
+                    "WHERE run_id = ? AND finished_at IS NULL",
+                    [(now, now, r) for r in run_ids],
+                )
+                conn.execute("DELETE FROM workers WHERE heartbeat < ?", (cutoff,))
+                conn.execute("DELETE FROM runs WHERE finished_at < ?", (now - process_manager.ttl,))
+                conn.execute(
+                    "DELETE FROM run_keys WHERE COALESCE(expires_at, created_at + ?) < ?", (process_manager.ttl, now)
+                )
+        return run_ids
+
+    async def _poll(self):
+        from db import update_run_status
+
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await asyncio.to_thread(self._heartbeat)
+                for run_id in await asyncio.to_thread(self._take_cancel_requests):
+                    logger.info(f"Cancelling run {run_id} on request from another worker")
+                    self._counters["remote_cancels"] += 1
+                    _cancel_local(run_id)
+                for run_id in await asyncio.to_thread(self._reap_orphans):
+                    logger.warning(f"Run {run_id} lost its worker; marking it failed")
+                    self._counters["reaped"] += 1
+                    await asyncio.to_thread(update_run_status, run_id, "failed")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Run state poll failed: {e}")
+
+
+_SELECT_RUNS = (
+    "SELECT r.run_id, r.owner, r.status, r.url, r.agent_ids, r.tenant, r.created_at, r.updated_at, "
+    "r.finished_at, w.heartbeat FROM runs r LEFT JOIN workers w ON w.worker_id = r.owner"
+)
+
+
+_UPSERT_RUN = (
+    "INSERT INTO runs (run_id, owner, status, url, agent_ids, tenant, created_at, updated_at, "
+    "finished_at, cancel_requested) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0) "
+    "ON CONFLICT(run_id) DO UPDATE SET owner = excluded.owner, status = excluded.status, "
+    "updated_at = excluded.updated_at, finished_at = excluded.finished_at, "
+    "cancel_requested = CASE WHEN excluded.finished_at IS NULL THEN cancel_requested ELSE 0 END"
+)
+
+
+def _local_view(record: RunRecord) -> dict:
+    return {**record.to_dict(), "owner": WORKER_ID, "owner_alive": True}
+
+
+def _cancel_local(run_id: str) -> bool:
+    from run_manager import run_manager
+
+    record = process_manager.get(run_id)
+    if record is None or record.task is None or record.task.done():
+        return False
+    record.task.cancel()
+    run_manager.cancel_task(run_id)
+    return True
+
+
+def is_active(run: Optional[dict]) -> bool:
+    """Whether a run view describes a run that is still queued or executing somewhere."""
+    return bool(run) and run["status"] not in FINISHED_STATUSES and run["owner_alive"]
+
+
+def create_run_state(name: str = RUN_STATE_BACKEND):
+    if name == "sqlite":
+        return SqliteRunState()
+    if name != "local":
+        logger.warning(f"Unknown RUN_STATE_BACKEND '{name}', using local")
+    return LocalRunState()
+
+
+run_state = create_run_state()
@@ -0,0 +1,252 @@
+# scheduler.py
+# Admission control in front of execute_act_run. Every run holds at least one
+# Chromium plus worker threads, so only `max_concurrent` runs execute at once;
+# the rest wait in a per-tenant priority queue and are dispatched as slots free up.
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENT_RUNS = int(os.getenv("MAX_CONCURRENT_RUNS", "4"))
+MAX_QUEUED_RUNS = int(os.getenv("MAX_QUEUED_RUNS", "100"))
+MAX_RUNS_PER_TENANT = int(os.getenv("MAX_RUNS_PER_TENANT", "0"))  # 0 = no per-tenant cap
+MAX_RUN_PRIORITY = int(os.getenv("MAX_RUN_PRIORITY", "10"))       # priorities are clamped to ±this
+
+DEFAULT_TENANT = "default"
+
+
+class RunQueueFull(Exception):
+    """Raised when a run is submitted while the wait queue is at capacity."""
+
+
+class _Entry:
+    __slots__ = ("run_id", "tenant", "priority", "seq", "granted", "started", "queued_write")
+
+    def __init__(self, run_id: str, tenant: str, priority: int, seq: int, granted: asyncio.Future):
+        self.run_id = run_id
+        self.tenant = tenant
+        self.priority = priority
+        self.seq = seq
+        self.granted = granted
+        self.started = False
+        self.queued_write: Optional[asyncio.Future] = None   # the "queued" status write, if one was made
+
+    def sort_key(self) -> tuple:
+        # Higher priority first, then FIFO.
+        return (-self.priority, self.seq)
+
+    def __lt__(self, other: "_Entry") -> bool:
+        return self.sort_key() < other.sort_key()
+
+
+class RunScheduler:
+    """
+    Bounded run executor.
+
+    Dispatch order: the waiting run with the highest priority goes first. Ties
+    between tenants are broken round-robin (the tenant served least recently
+    wins), and within a tenant runs are FIFO. With `max_per_tenant` set, a
+    tenant at its cap is skipped until one of its runs finishes.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_RUNS,
+        max_queued: int = MAX_QUEUED_RUNS,
+        max_per_tenant: int = MAX_RUNS_PER_TENANT,
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queued = max_queued
+        self.max_per_tenant = max_per_tenant
+
+        self._seq = itertools.count()
+        self._active: Dict[str, str] = {}                 # run_id -> tenant
+        self._active_per_tenant: Dict[str, int] = {}      # tenant -> active run count
+        self._waiting: Dict[str, List[_Entry]] = {}       # tenant -> heap of entries
+        self._tenant_order: Deque[str] = deque()          # tenants with waiting runs, least recently served first
+        self._queued_count = 0
+
+    # ── Submission ─────────────────────────────────────────────────────────────
+
+    def submit(
+        self,
+        run_id: str,
+        run: Callable[[], Awaitable[None]],
+        tenant: Optional[str] = None,
+        priority: int = 0,
+    ) -> asyncio.Task:
+        """
+        Admit a run and return the task that will execute it. The task waits
+        for a slot first, so cancelling it also removes a queued run.
+
+        Raises:
+            RunQueueFull: If no slot is free and the wait queue is full.
+        """
+        tenant = tenant or DEFAULT_TENANT
+        loop = asyncio.get_running_loop()
+        entry = _Entry(run_id, tenant, priority, next(self._seq), loop.create_future())
+
+        saturated = len(self._active) >= self.max_concurrent
+        if saturated and self.max_queued and self._queued_count >= self.max_queued:
+            raise RunQueueFull(f"Run queue is full ({self._queued_count} waiting)")
+        self._enqueue(entry)
+        self._dispatch()
+
+        task = asyncio.create_task(self._execute(entry, run))
+        task.add_done_callback(lambda t: self._on_done(entry, t))
+        return task
+
+    async def _execute(self, entry: _Entry, run: Callable[[], Awaitable[None]]):
+        from db import update_run_status
+        from nova.process_manager import process_manager
+
+        if not entry.granted.done():
+            loop = asyncio.get_running_loop()
+            entry.queued_write = loop.run_in_executor(None, update_run_status, entry.run_id, "queued")
+            # Shielded, so a cancel cannot mark the write done while it is still
+            # running; _on_done orders the "cancelled" write after it.
+            await asyncio.shield(entry.queued_write)
+            process_manager.mark_done(entry.run_id, "queued")
+            await entry.granted
+
+        entry.started = True
+        process_manager.mark_done(entry.run_id, "running")
+        await run()
+
+    def _on_done(self, entry: _Entry, task: asyncio.Task):
+        # Give back the slot if one was granted, otherwise leave the queue.
+        if entry.run_id in self._active:
+            self._release(entry.run_id)
+        else:
+            self._remove_waiting(entry)
+
+        # execute_act_run finishes the trace of a run that started; this covers
+        # runs cancelled while queued or failing before they got a slot.
+        tracer.finish(entry.run_id)
+
+        if task.cancelled() and not entry.started:
+            from db import update_run_status
+            from nova.process_manager import process_manager
+            from run_manager import run_manager
+
+            process_manager.mark_done(entry.run_id, "cancelled")
+            run_manager.cleanup(entry.run_id)
+            loop = asyncio.get_running_loop()
+
+            def write_cancelled(_=None):
+                loop.run_in_executor(None, update_run_status, entry.run_id, "cancelled")
+
+            if entry.queued_write is not None and not entry.queued_write.done():
+                entry.queued_write.add_done_callback(write_cancelled)
+            else:
+                write_cancelled()
+
+    # ── Introspection ──────────────────────────────────────────────────────────
+
+    def position(self, run_id: str) -> Optional[int]:
+        """0 if running, estimated 1-based queue position if waiting, None if unknown."""
+        if run_id in self._active:
+            return 0
+        ordered = sorted(
+            (e for heap in self._waiting.values() for e in heap),
+            key=_Entry.sort_key,
+        )
+        for i, e in enumerate(ordered, start=1):
+            if e.run_id == run_id:
+                return i
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queued": self.max_queued,
+            "active": len(self._active),
+            "queued": self._queued_count,
+            "tenants": {
+                tenant: {
+                    "active": self._active_per_tenant.get(tenant, 0),
+                    "queued": len(self._waiting.get(tenant, [])),
+                }
+                for tenant in set(self._active_per_tenant) | set(self._waiting)
+            },
+        }
+
+    # ── Internals ──────────────────────────────────────────────────────────────
+
+    def _can_start(self, tenant: str) -> bool:
+        if len(self._active) >= self.max_concurrent:
+            return False
+        if self.max_per_tenant and self._active_per_tenant.get(tenant, 0) >= self.max_per_tenant:
+            return False
+        return True
+
+    def _grant(self, entry: _Entry):
+        self._active[entry.run_id] = entry.tenant
+        self._active_per_tenant[entry.tenant] = self._active_per_tenant.get(entry.tenant, 0) + 1
+        if not entry.granted.done():
+            entry.granted.set_result(None)
+
+    def _enqueue(self, entry: _Entry):
+        heap = self._waiting.setdefault(entry.tenant, [])
+        if not heap and entry.tenant not in self._tenant_order:
+            self._tenant_order.append(entry.tenant)
+        heapq.heappush(heap, entry)
+        self._queued_count += 1
+
+    def _remove_waiting(self, entry: _Entry):
+        heap = self._waiting.get(entry.tenant)
+        if not heap or entry not in heap:
+            return
+        heap.remove(entry)
+        heapq.heapify(heap)
+        self._queued_count -= 1
+        if not heap:
+            self._waiting.pop(entry.tenant, None)
+            if entry.tenant in self._tenant_order:
+                self._tenant_order.remove(entry.tenant)
+
+    def _release(self, run_id: str):
+        tenant = self._active.pop(run_id, None)
+        if tenant is None:
+            return
+        remaining = self._active_per_tenant.get(tenant, 1) - 1
+        if remaining > 0:
+            self._active_per_tenant[tenant] = remaining
+        else:
+            self._active_per_tenant.pop(tenant, None)
+        self._dispatch()
+
+    def _dispatch(self):
+        while len(self._active) < self.max_concurrent and self._queued_count:
+            chosen: Optional[str] = None
+            for tenant in self._tenant_order:
+                if not self._can_start(tenant):
+                    continue
+                head = self._waiting[tenant][0]
+                if chosen is None or head.priority > self._waiting[chosen][0].priority:
+                    chosen = tenant
+            if chosen is None:
+                return
+
+            heap = self._waiting[chosen]
+            entry = heapq.heappop(heap)
+            self._queued_count -= 1
+            self._tenant_order.remove(chosen)
+            if heap:
+                self._tenant_order.append(chosen)
+            else:
+                self._waiting.pop(chosen, None)
+
+            logger.info(f"Dispatching queued run {entry.run_id} (tenant={chosen}, priority={entry.priority})")
+            self._grant(entry)
+
+
+scheduler = RunScheduler()
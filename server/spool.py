@@ -0,0 +1,406 @@
+"""
+Local write-ahead spool between the event sink and Supabase.
+
+Run events and status changes are appended to a SQLite file (WAL mode)
+before anything is sent over the network, so a slow or unavailable Supabase
+never blocks a run and never loses its output. A background shipper replays
+the spool to Supabase:
+
+  * each run's entries are shipped in append order, so a status always lands
+    after the events written before it;
+  * consecutive events are sent as one multi-row insert of up to
+    `batch_size` rows;
+  * a failed write leaves the entries in place and the run backs off
+    exponentially (`retry_base` doubling up to `retry_max` seconds), while
+    other runs keep shipping;
+  * a batch that still fails after `max_attempts` tries is moved to the
+    `dead_letter` table of the spool file, with the last error, so the run's
+    later entries are not held up behind it;
+  * once a batch is written, the run's high-water mark (last shipped seq) is
+    advanced and the shipped entries are deleted. Marks of runs with nothing
+    left to ship are dropped after EVENT_SPOOL_HIGH_WATER_TTL seconds.
+
+Entries left over by a previous process are shipped after `start()`.
+
+Each process holds an exclusive lock on its spool file, so API workers that
+share a directory each take their own file (`path`, `path.1`, ...) and
+never ship the same entry twice. A process that starts up also adopts the
+entries of any spool file whose owner has exited.
+"""
+
+import glob
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:   # Windows: one process per spool file is on the operator
+    fcntl = None
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+EVENT_SPOOL_PATH = os.getenv("EVENT_SPOOL_PATH", os.path.join(os.path.dirname(__file__), ".event_spool.sqlite3"))
+EVENT_SPOOL_BATCH_SIZE = int(os.getenv("EVENT_SPOOL_BATCH_SIZE", "200"))
+EVENT_SPOOL_RETRY_BASE = float(os.getenv("EVENT_SPOOL_RETRY_BASE", "0.5"))
+EVENT_SPOOL_RETRY_MAX = float(os.getenv("EVENT_SPOOL_RETRY_MAX", "30"))
+EVENT_SPOOL_MAX_ATTEMPTS = int(os.getenv("EVENT_SPOOL_MAX_ATTEMPTS", "20"))  # 0 = retry a batch forever
+EVENT_SPOOL_HIGH_WATER_TTL = float(os.getenv("EVENT_SPOOL_HIGH_WATER_TTL", "86400"))  # seconds a drained run's mark is kept
+
+EVENT = "event"
+STATUS = "status"
+
+
+class EventSpool:
+    def __init__(
+        self,
+        ship_events: Callable[[List[dict]], None],
+        ship_status: Callable[[str, str], None],
+        path: str = EVENT_SPOOL_PATH,
+        batch_size: int = EVENT_SPOOL_BATCH_SIZE,
+        retry_base: float = EVENT_SPOOL_RETRY_BASE,
+        retry_max: float = EVENT_SPOOL_RETRY_MAX,
+        max_attempts: int = EVENT_SPOOL_MAX_ATTEMPTS,
+    ):
+        self.ship_events = ship_events
+        self.ship_status = ship_status
+        self.base_path = path
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max_attempts
+
+        self._lock = threading.Lock()                    # guards the connection
+        self._cond = threading.Condition()               # wakes the shipper
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock_file = None
+        self._backoff: Dict[str, Tuple[int, float]] = {}   # run_id -> (failures, monotonic retry time)
+        self._dirty = False
+        self._pruned_at = 0.0
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._counters = {"appended": 0, "shipped": 0, "failures": 0, "dead_lettered": 0}
+
+    # ── Producer side ──────────────────────────────────────────────────────────
+
+    def append_events(self, rows: List[dict]):
+        """Durably queue test_run_events rows. Returns once they are on disk."""
+        if not rows:
+            return
+        now = time.time()
+        self._append([(row["run_id"], EVENT, json.dumps(row), now) for row in rows])
+
+    def append_status(self, run_id: str, status: str):
+        """Durably queue a test_runs status change, ordered after the run's spooled events."""
+        self._append([(run_id, STATUS, status, time.time())])
+
+    def start(self):
+        """Start the shipper, replaying anything a previous process left behind."""
+        with self._lock:
+            self._connect()
+        with self._cond:
+            self._ensure_started()
+            self._dirty = True
+            self._cond.notify_all()
+
+    def high_water(self, run_id: str) -> Optional[int]:
+        """Seq of the last entry shipped for `run_id`, or None if nothing has been shipped."""
+        with self._lock:
+            row = self._connect().execute("SELECT seq FROM shipped WHERE run_id = ?", (run_id,)).fetchone()
+        return row[0] if row else None
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            conn = self._connect()
+            pending, runs, oldest = conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT run_id), MIN(created_at) FROM spool"
+            ).fetchone()
+            dead = conn.execute("SELECT COUNT(*) FROM dead_letter").fetchone()[0]
+        with self._cond:
+            backing_off = len(self._backoff)
+        return {
+            "path": self.path,
+            "pending": pending,
+            "pending_runs": runs,
+            "oldest_pending_age": round(time.time() - oldest, 3) if oldest else None,
+            "runs_backing_off": backing_off,
+            "dead_letter": dead,
+            **self._counters,
+        }
+
+    def close(self, timeout: float = 10.0):
+        """
+        Ship what can be shipped within `timeout` and stop. Entries that could
+        not be written stay in the spool for the next start().
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            thread = self._thread
+            while thread and thread.is_alive() and time.monotonic() < deadline:
+                if not self._has_due_work():
+                    break
+                self._cond.wait(min(0.1, max(0.0, deadline - time.monotonic())))
+            self._stopping = True
+            self._cond.notify_all()
+        if thread:
+            thread.join(timeout=max(0.1, deadline - time.monotonic()))
+
+    # ── Internals ──────────────────────────────────────────────────────────────
+
+    def _append(self, entries: List[tuple]):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                conn.executemany("INSERT INTO spool (run_id, kind, payload, created_at) VALUES (?, ?, ?, ?)", entries)
+            self._counters["appended"] += len(entries)
+        with self._cond:
+            self._ensure_started()
+            self._dirty = True
+            self._cond.notify_all()
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database on first use. Lock must be held."""
+        if self._conn is None:
+            self.path, self._lock_file = self._claim_file()
+            self._conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS spool ("
+                "seq INTEGER PRIMARY KEY AUTOINCREMENT, run_id TEXT NOT NULL, kind TEXT NOT NULL, "
+                "payload TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS spool_run_seq ON spool (run_id, seq)")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS shipped (run_id TEXT PRIMARY KEY, seq INTEGER NOT NULL, shipped_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS dead_letter ("
+                "seq INTEGER PRIMARY KEY, run_id TEXT NOT NULL, kind TEXT NOT NULL, payload TEXT NOT NULL, "
+                "created_at REAL NOT NULL, attempts INTEGER NOT NULL, error TEXT NOT NULL, failed_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+            self._adopt_orphans()
+        return self._conn
+
+    def _claim_file(self) -> tuple:
+        """Lock the first spool file that no live process holds. Returns (path, lock handle)."""
+        if fcntl is None:
+            return self.base_path, None
+        index = 0
+        while True:
+            path = self.base_path if index == 0 else f"{self.base_path}.{index}"
+            handle = _try_lock(path)
+            if handle is not None:
+                return path, handle
+            index += 1
+
+    def _adopt_orphans(self):
+        """Move entries out of sibling spool files whose owner has exited. Lock must be held."""
+        if fcntl is None:
+            return
+        siblings = [self.base_path] + [
+            p for p in glob.glob(glob.escape(self.base_path) + ".*") if p[len(self.base_path) + 1:].isdigit()
+        ]
+        for path in siblings:
+            if path == self.path or not os.path.exists(path):
+                continue
+            handle = _try_lock(path)
+            if handle is None:
+                continue   # a live process owns it
+            try:
+                self._conn.execute("ATTACH DATABASE ? AS orphan", (path,))
+                try:
+                    with self._conn:
+                        adopted = self._conn.execute(
+                            "INSERT INTO spool (run_id, kind, payload, created_at) "
+                            "SELECT run_id, kind, payload, created_at FROM orphan.spool ORDER BY seq"
+                        ).rowcount
+                        self._conn.execute("DELETE FROM orphan.spool")
+                finally:
+                    self._conn.execute("DETACH DATABASE orphan")
+                if adopted:
+                    logger.info(f"Adopted {adopted} spooled entries from {path}")
+            except sqlite3.OperationalError:
+                pass   # not a spool (no table yet)
+            except Exception as e:
+                logger.warning(f"Failed to adopt spool {path}: {e}")
+            finally:
+                handle.close()
+
+    def _ensure_started(self):
+        """Lock (_cond) must be held."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="event-spool", daemon=True)
+            self._thread.start()
+
+    def _has_due_work(self) -> bool:
+        """Whether some run has entries that are not backing off. _cond must be held."""
+        if self._dirty:
+            return True
+        with self._lock:
+            runs = [r for (r,) in self._connect().execute("SELECT DISTINCT run_id FROM spool")]
+        now = time.monotonic()
+        return any(self._backoff.get(r, (0, 0.0))[1] <= now for r in runs)
+
+    def _next_wakeup(self) -> Optional[float]:
+        """Seconds until the earliest retry is due, or None. _cond must be held."""
+        if not self._backoff:
+            return None
+        return max(0.0, min(at for _, at in self._backoff.values()) - time.monotonic())
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty and not self._stopping:
+                    wakeup = self._next_wakeup()
+                    if wakeup == 0.0:
+                        break
+                    self._cond.wait(wakeup)
+                if self._stopping:
+                    return
+                self._dirty = False
+
+            try:
+                with self._lock:
+                    runs = [r for (r,) in self._connect().execute("SELECT DISTINCT run_id FROM spool")]
+            except Exception as e:
+                logger.error(f"Event spool unreadable: {e}")
+                runs = []
+
+            now = time.monotonic()
+            for run_id in runs:
+                with self._cond:
+                    if self._stopping:
+                        return
+                    retry_at = self._backoff.get(run_id, (0, 0.0))[1]
+                if retry_at <= now:
+                    self._ship_run(run_id)
+
+            self._prune()
+            with self._cond:
+                self._cond.notify_all()
+
+    def _prune(self):
+        """Drop stale high-water marks, at most once a minute."""
+        now = time.time()
+        if now - self._pruned_at < 60:
+            return
+        self._pruned_at = now
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.execute(
+                        "DELETE FROM shipped WHERE shipped_at < ? AND run_id NOT IN (SELECT run_id FROM spool)",
+                        (now - EVENT_SPOOL_HIGH_WATER_TTL,),
+                    )
+        except Exception as e:
+            logger.warning(f"Failed to prune event spool high-water marks: {e}")
+
+    def _ship_run(self, run_id: str):
+        """Ship everything spooled for `run_id`, one batch at a time, until it is drained or a write fails."""
+        while True:
+            with self._lock:
+                entries = self._connect().execute(
+                    "SELECT seq, kind, payload FROM spool WHERE run_id = ? ORDER BY seq LIMIT ?",
+                    (run_id, self.batch_size),
+                ).fetchall()
+            if not entries:
+                with self._cond:
+                    self._backoff.pop(run_id, None)
+                return
+
+            # Ship the leading run of events as one insert, or a single status.
+            if entries[0][1] == STATUS:
+                batch = entries[:1]
+            else:
+                batch = []
+                for entry in entries:
+                    if entry[1] != EVENT:
+                        break
+                    batch.append(entry)
+
+            try:
+                if batch[0][1] == STATUS:
+                    self.ship_status(run_id, batch[0][2])
+                else:
+                    self.ship_events([json.loads(payload) for _, _, payload in batch])
+            except Exception as e:
+                with self._cond:
+                    failures = self._backoff.get(run_id, (0, 0.0))[0] + 1
+                    delay = min(self.retry_max, self.retry_base * 2 ** (failures - 1))
+                    self._backoff[run_id] = (failures, time.monotonic() + delay)
+                    self._counters["failures"] += 1
+                metrics.SPOOL_SHIP_FAILURES_TOTAL.inc()
+                if self.max_attempts and failures >= self.max_attempts and self._dead_letter(run_id, batch, failures, e):
+                    continue
+                logger.warning(
+                    f"Failed to ship {len(batch)} spooled entries for run {run_id} "
+                    f"(attempt {failures}, retrying in {delay:.1f}s): {e}"
+                )
+                return
+
+            last_seq = batch[-1][0]
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.execute("DELETE FROM spool WHERE run_id = ? AND seq <= ?", (run_id, last_seq))
+                    conn.execute(
+                        "INSERT INTO shipped (run_id, seq, shipped_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(run_id) DO UPDATE SET seq = excluded.seq, shipped_at = excluded.shipped_at",
+                        (run_id, last_seq, time.time()),
+                    )
+                self._counters["shipped"] += len(batch)
+            with self._cond:
+                self._backoff.pop(run_id, None)
+
+    def _dead_letter(self, run_id: str, batch: List[tuple], attempts: int, error: Exception) -> bool:
+        """Move a batch that keeps failing out of the spool, so the run's later entries can ship. Returns whether it moved."""
+        first, last = batch[0][0], batch[-1][0]
+        try:
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.execute(
+                        "INSERT INTO dead_letter (seq, run_id, kind, payload, created_at, attempts, error, failed_at) "
+                        "SELECT seq, run_id, kind, payload, created_at, ?, ?, ? FROM spool "
+                        "WHERE run_id = ? AND seq BETWEEN ? AND ?",
+                        (attempts, f"{type(error).__name__}: {error}", time.time(), run_id, first, last),
+                    )
+                    conn.execute("DELETE FROM spool WHERE run_id = ? AND seq BETWEEN ? AND ?", (run_id, first, last))
+                self._counters["dead_lettered"] += len(batch)
+        except Exception as e:
+            logger.error(f"Failed to dead-letter spooled entries {first}-{last} of run {run_id}: {e}")
+            return False
+        with self._cond:
+            self._backoff.pop(run_id, None)
+        metrics.SPOOL_DEAD_LETTERED_TOTAL.inc(len(batch))
+        logger.error(
+            f"Gave up on {len(batch)} spooled entries for run {run_id} after {attempts} attempts; "
+            f"moved them to the dead_letter table of {self.path}: {error}"
+        )
+        return True
+
+
+def _try_lock(path: str):
+    """Take an exclusive lock on `path`.lock without blocking. Returns the handle, or None if held."""
+    handle = open(f"{path}.lock", "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
@@ -0,0 +1,114 @@
+"""
+Startup checks, warm-up and readiness.
+
+Importing `api` only loads FastAPI and the light bookkeeping modules. The
+expensive ones (the Supabase client in db.py, nova_act and Playwright behind
+nova.agent_factory) are loaded by `warm_up()`, which the lifespan runs in
+the background so the server is accepting connections while it happens.
+/healthz answers as soon as the process is up; /readyz answers 200 once
+every required warm-up step has succeeded.
+
+Missing configuration is caught by `check_config()` before the server
+starts listening, rather than by the first run that needs it.
+
+Every step is timed and its count of newly imported modules is recorded, so
+`report()` (served by /readyz and logged when warm-up ends) doubles as a
+cold-start profile.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+REQUIRED_ENV = ("NOVA_ACT_API_KEY", "SUPABASE_URL", "SUPABASE_KEY")
+PREWARM_URLS = [u.strip() for u in os.getenv("NOVA_AGENT_POOL_PREWARM", "").split(",") if u.strip()]
+
+
+class StartupError(Exception):
+    """Raised when the server cannot start with the current configuration."""
+
+
+def _start_db():
+    from db import event_spool
+    event_spool.start()
+
+
+def _load_nova():
+    import nova.act_runner      # noqa: F401  nova_act, execution backend
+    import nova.agent_factory   # noqa: F401  Playwright
+
+
+def _prewarm_browsers():
+    from nova.agent_factory import agent_pool
+    if agent_pool.enabled:
+        for url in PREWARM_URLS:
+            agent_pool.prewarm(url)
+
+
+class Startup:
+    def __init__(self):
+        self.created_at = time.time()
+        self.steps: Dict[str, dict] = {}
+        self.ready = False
+        self.finished_at: Optional[float] = None
+
+    def check_config(self):
+        missing = [name for name in REQUIRED_ENV if not os.getenv(name)]
+        if missing:
+            raise StartupError(f"Missing required environment variables: {', '.join(missing)}")
+
+    def record(self, name: str, started: float, modules_before: int, required: bool = True, error: Optional[str] = None):
+        """Record a step that began at perf_counter() `started` with `modules_before` modules loaded."""
+        self.steps[name] = {
+            "status": "failed" if error else "ok",
+            "seconds": round(time.perf_counter() - started, 4),
+            "modules_loaded": len(sys.modules) - modules_before,
+            "required": required,
+            "error": error,
+        }
+
+    async def warm_up(self, prewarm: bool = True):
+        """Load heavy modules and start background services, then mark the server ready."""
+        steps: List[tuple] = [("db", _start_db, True), ("nova_act", _load_nova, True)]
+        if prewarm and PREWARM_URLS:
+            steps.append(("browsers", _prewarm_browsers, False))
+
+        for name, fn, required in steps:
+            self.steps[name] = {"status": "running", "required": required}
+            await asyncio.to_thread(self._run_step, name, fn, required)
+
+        self.ready = all(s["status"] == "ok" for s in self.steps.values() if s["required"])
+        self.finished_at = time.time()
+        summary = ", ".join(f"{name} {s['seconds']:.2f}s" for name, s in self.steps.items() if "seconds" in s)
+        if self.ready:
+            logger.info(f"Warm-up finished in {self.finished_at - self.created_at:.2f}s: {summary}")
+        else:
+            logger.error(f"Warm-up failed, server is not ready: {summary}")
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "uptime": round(time.time() - self.created_at, 3),
+            "warm_up_seconds": round(self.finished_at - self.created_at, 3) if self.finished_at else None,
+            "modules": len(sys.modules),
+            "steps": self.steps,
+        }
+
+    def _run_step(self, name: str, fn: Callable[[], None], required: bool):
+        started = time.perf_counter()
+        modules_before = len(sys.modules)
+        try:
+            fn()
+        except Exception as e:
+            logger.error(f"Warm-up step '{name}' failed: {e}")
+            self.record(name, started, modules_before, required, error=str(e))
+        else:
+            self.record(name, started, modules_before, required)
+
+
+startup = Startup()
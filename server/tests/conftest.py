@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The server modules import each other as top-level modules (`import metrics`,
+# `from nova.workflow import plan`), the way main.py runs them.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,48 @@
+import os
+import time
+
+from blob_store import ScreenshotStore
+
+
+def _age(store, blob_id, seconds):
+    then = time.time() - seconds
+    os.utime(store.path(blob_id), (then, then))
+
+
+def test_sweep_evicts_blobs_past_the_ttl(tmp_path):
+    store = ScreenshotStore(directory=str(tmp_path), thumbnail_size=0, ttl=60, max_bytes=0, sweep_interval=None)
+    old, new = store.put(b"old frame"), store.put(b"new frame")
+    _age(store, old, 120)
+
+    assert store.sweep() == 1
+    assert store.get(old) is None
+    assert store.get(new) == b"new frame"
+
+
+def test_sweep_evicts_least_recently_stored_blobs_over_the_size_cap(tmp_path):
+    store = ScreenshotStore(directory=str(tmp_path), thumbnail_size=0, ttl=0, max_bytes=25, sweep_interval=None)
+    ids = [store.put(f"frame {i}".encode() * 2) for i in range(3)]   # 14 bytes each
+    for age, blob_id in zip((30, 20, 10), ids):
+        _age(store, blob_id, age)
+    store.put(b"frame 0" * 2)   # stored again, so it is the most recent now
+
+    assert store.sweep() == 2
+    assert [store.get(blob_id) is not None for blob_id in ids] == [True, False, False]
+
+
+def test_sweep_removes_thumbnails_with_their_original(tmp_path):
+    store = ScreenshotStore(directory=str(tmp_path), thumbnail_size=0, ttl=60, max_bytes=0, sweep_interval=None)
+    blob_id = store.put(b"frame")
+    with open(store.path(blob_id, thumbnail=True), "wb") as f:
+        f.write(b"thumb")
+    _age(store, blob_id, 120)
+
+    store.sweep()
+    assert os.listdir(tmp_path) == []
+
+
+def test_put_sweeps_in_the_background(tmp_path):
+    store = ScreenshotStore(directory=str(tmp_path), thumbnail_size=0, ttl=0, max_bytes=1, sweep_interval=0)
+    store.put(b"frame")
+    store._thumbnailer.shutdown(wait=True)
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,17 @@
+from checkpoints import CheckpointStore
+
+
+def test_positions_only_move_forward(tmp_path):
+    store = CheckpointStore(directory=str(tmp_path))
+    store.note_positions("run", {"event_seq": 4})   # no checkpoints yet, so nothing to note on
+    assert store.load("run") is None
+
+    store.begin("run", {"url": "https://example.com/"})
+    store.save("run", "agent", {"step": 0}, {"event_seq": 3, "stream_id": 5})
+    store.note_positions("run", {"event_seq": 9, "stream_id": 2})
+    store.save("run", "agent", {"step": 1}, {"event_seq": 7})
+    store.begin("run", {"url": "https://example.com/"})
+
+    state = store.load("run")
+    assert (state["event_seq"], state["stream_id"]) == (9, 5)
+    assert state["agents"] == {"agent": {"step": 1}}
@@ -0,0 +1,29 @@
+import asyncio
+
+from event_bus import EventBus
+
+
+def _collect(bus, run_id, last_id):
+    async def collect():
+        return [(m.type, m.id) async for m in bus.subscribe(run_id, last_id)]
+    return asyncio.run(collect())
+
+
+def test_a_seeded_stream_numbers_on_and_reports_the_gap_before_it():
+    bus = EventBus()
+    bus.seed("run", 41)
+    bus.publish("run", "metadata", {})
+    bus.publish("run", "status", "completed")
+
+    assert bus.next_id("run") == 43
+    assert _collect(bus, "run", 40) == [("metadata", 41), ("status", 42), ("end", 0)]
+    assert _collect(bus, "run", 0) == [("gap", 0), ("metadata", 41), ("status", 42), ("end", 0)]
+
+
+def test_an_id_ahead_of_the_stream_starts_over_with_a_reset():
+    bus = EventBus()
+    bus.publish("run", "metadata", {})
+    bus.publish("run", "status", "failed")
+
+    assert _collect(bus, "run", 7) == [("reset", 0), ("metadata", 1), ("status", 2), ("end", 0)]
+    assert _collect(bus, "run", 2) == [("end", 0)]
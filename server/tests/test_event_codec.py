@@ -0,0 +1,92 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from event_codec import BATCH_TYPE, PREFIX, decode, encode_events, pack_rows, unpack_row
+
+
+def _row(seq, event_type="metadata", data=None, ms=0, run_id="run-1"):
+    return {
+        "run_id": run_id,
+        "type": event_type,
+        "data": json.dumps(data if data is not None else {"n": seq}),
+        "created_at": f"2026-01-01T00:00:{ms // 1000:02d}.{ms % 1000:03d}000+00:00",
+        "seq": seq,
+    }
+
+
+def _unpack_all(rows):
+    return [event for row in rows for event in unpack_row(row)]
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_encode_events_round_trips(compression):
+    rows = [
+        _row(0, "metadata", {"step": 0, "url": "https://example.com/" * 20}, ms=0),
+        _row(1, "thinking", ["line one", "line two"], ms=250),
+        _row(2, "custom_type", {"ok": True}, ms=1250),
+    ]
+    stored = {"run_id": "run-1", "type": BATCH_TYPE, "data": encode_events(rows, compression=compression)}
+
+    assert stored["data"].startswith(PREFIX)
+    events = unpack_row(stored)
+    assert [e["type"] for e in events] == ["metadata", "thinking", "custom_type"]
+    assert [json.loads(e["data"]) for e in events] == [json.loads(r["data"]) for r in rows]
+    assert [e["seq"] for e in events] == [0, 1, 2]
+    assert [datetime.fromisoformat(e["created_at"]) for e in events] == [
+        datetime.fromisoformat(r["created_at"]) for r in rows
+    ]
+
+
+def test_encode_events_compresses_large_envelopes():
+    rows = [_row(i, data={"text": "same words again " * 10}, ms=i) for i in range(20)]
+    assert encode_events(rows, compression="zlib").startswith(f"{PREFIX}z:")
+    assert encode_events(rows, compression="none").startswith(f"{PREFIX}j:")
+
+
+def test_unpack_row_passes_legacy_rows_through():
+    row = {"run_id": "run-1", "type": "fault", "data": "{}", "created_at": "2026-01-01T00:00:00+00:00"}
+    assert unpack_row(row) == [{**row, "seq": None}]
+
+
+def test_decode_rejects_unknown_envelopes():
+    with pytest.raises(ValueError):
+        decode('{"not": "an envelope"}')
+    with pytest.raises(ValueError):
+        decode(f"{PREFIX}q:payload")
+    with pytest.raises(ValueError):
+        decode(f'{PREFIX}j:{{"v": 99, "s": 0, "t": 0, "e": []}}')
+
+
+def test_pack_rows_keeps_seq_order_around_standalone_faults():
+    rows = [_row(0), _row(1), _row(2, "fault"), _row(3), _row(4, "thinking")]
+    packed = pack_rows(rows, event_format="compact")
+
+    assert [r["type"] for r in packed] == [BATCH_TYPE, "fault", BATCH_TYPE]
+    assert "seq" not in packed[1]
+    events = _unpack_all(packed)
+    assert [e["seq"] for e in events if e["type"] != "fault"] == [0, 1, 3, 4]
+    assert [e["type"] for e in events] == ["metadata", "metadata", "fault", "metadata", "thinking"]
+
+
+def test_pack_rows_starts_a_new_envelope_at_a_seq_gap():
+    rows = [_row(0), _row(1), _row(5), _row(6)]
+    packed = pack_rows(rows, event_format="compact")
+
+    assert len(packed) == 2
+    assert [e["seq"] for e in _unpack_all(packed)] == [0, 1, 5, 6]
+
+
+def test_pack_rows_batches_each_run_separately():
+    rows = [_row(0, run_id="a"), _row(0, run_id="b"), _row(1, run_id="a"), _row(1, run_id="b")]
+    packed = pack_rows(rows, event_format="compact")
+
+    assert sorted(r["run_id"] for r in packed) == ["a", "b"]
+    for row in packed:
+        assert [(e["run_id"], e["seq"]) for e in unpack_row(row)] == [(row["run_id"], 0), (row["run_id"], 1)]
+
+
+def test_pack_rows_json_format_drops_seq():
+    rows = [_row(0), _row(1)]
+    assert pack_rows(rows, event_format="json") == [{k: v for k, v in r.items() if k != "seq"} for r in rows]
@@ -0,0 +1,76 @@
+import threading
+
+from event_sink import EventSink
+
+
+def _sink(written, **kwargs):
+    return EventSink(written.extend, max_batch=7, flush_interval=0.01, seq_field="seq", **kwargs)
+
+
+def test_seqs_follow_the_written_order_across_threads():
+    written = []
+    sink = _sink(written)
+
+    def produce(name):
+        for i in range(200):
+            sink.put("run", {"by": name, "i": i})
+
+    threads = [threading.Thread(target=produce, args=(n,)) for n in "abcd"]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert sink.flush("run")
+    sink.close()
+
+    assert [row["seq"] for row in written] == list(range(800))
+
+
+def test_seq_carries_on_after_forget():
+    written = []
+    sink = _sink(written)
+    for _ in range(3):
+        sink.put("run", {})
+    sink.flush("run")
+    sink.forget("run")
+    sink.put("run", {})
+    sink.flush("run")
+    sink.close()
+
+    assert [row["seq"] for row in written] == [0, 1, 2, 3]
+
+
+def test_only_the_latest_forgotten_seqs_are_kept():
+    written = []
+    sink = _sink(written, keep_seqs=1)
+    for run_id in ("a", "b", "a"):
+        sink.put(run_id, {"run": run_id})
+        sink.flush(run_id)
+        sink.forget(run_id)
+    sink.close()
+
+    assert [(row["run"], row["seq"]) for row in written] == [("a", 0), ("b", 0), ("a", 0)]
+
+
+def test_rows_are_not_numbered_without_seq_field():
+    written = []
+    sink = EventSink(written.extend, flush_interval=0.01)
+    sink.put("run", {"line": "x"})
+    sink.flush("run")
+    sink.close()
+
+    assert written == [{"line": "x", "created_at": written[0]["created_at"]}]
+
+
+def test_a_seeded_run_numbers_on_from_the_seed():
+    written = []
+    sink = _sink(written)
+    sink.seed_seq("run", 5)
+    sink.put("run", {})
+    sink.seed_seq("run", 2)   # never goes back
+    sink.put("run", {})
+    sink.flush("run")
+    sink.close()
+
+    assert [row["seq"] for row in written] == [5, 6]
+    assert sink.next_seq("run") == 7
@@ -0,0 +1,33 @@
+import run_state
+from run_state import SqliteRunState
+
+
+def test_only_one_worker_claims_a_finished_run(tmp_path, monkeypatch):
+    path = str(tmp_path / "run_state.sqlite3")
+    first, second = SqliteRunState(path=path), SqliteRunState(path=path)
+    monkeypatch.setattr(run_state, "WORKER_ID", "worker-1")
+    first._heartbeat()
+    monkeypatch.setattr(run_state, "WORKER_ID", "worker-2")
+    second._heartbeat()
+
+    monkeypatch.setattr(run_state, "WORKER_ID", "worker-1")
+    assert first.claim_run("run")
+    assert not first.claim_run("run")
+    monkeypatch.setattr(run_state, "WORKER_ID", "worker-2")
+    assert not second.claim_run("run")
+
+    monkeypatch.setattr(run_state, "WORKER_ID", "worker-1")
+    first.release_run("run", "cancelled")
+    assert first.get("run")["status"] == "cancelled"
+    monkeypatch.setattr(run_state, "WORKER_ID", "worker-2")
+    assert second.claim_run("run")
+    assert second.get("run")["owner"] == "worker-2"
+
+
+def test_a_run_of_a_dead_worker_can_be_claimed(tmp_path, monkeypatch):
+    state = SqliteRunState(path=str(tmp_path / "run_state.sqlite3"), owner_ttl=60)
+    monkeypatch.setattr(run_state, "WORKER_ID", "gone")
+    assert state.claim_run("run")   # never heartbeated, so not alive
+    monkeypatch.setattr(run_state, "WORKER_ID", "alive")
+    state._heartbeat()
+    assert state.claim_run("run")
@@ -0,0 +1,46 @@
+import os
+import sqlite3
+import stat
+
+from nova.session_cache import SessionCache
+
+STATE = {"cookies": [{"name": "sid", "value": "1", "expires": -1}]}
+
+
+def test_sessions_are_scoped_to_a_tenant(tmp_path):
+    cache = SessionCache(path=str(tmp_path / "sessions.sqlite3"), enabled=True)
+    cache.put("acme", "http://localhost:3000/app", "admin", STATE)
+
+    assert cache.get("acme", "http://localhost:3000/other", "admin") == STATE
+    assert cache.get("globex", "http://localhost:3000/app", "admin") is None
+    assert cache.get(None, "http://localhost:3000/app", "admin") is None
+
+    cache.invalidate("globex", "http://localhost:3000/", "admin", "test")
+    assert cache.get("acme", "http://localhost:3000/", "admin") == STATE
+    cache.invalidate("acme", "http://localhost:3000/", "admin", "test")
+    assert cache.get("acme", "http://localhost:3000/", "admin") is None
+
+
+def test_cache_files_are_private(tmp_path):
+    path = tmp_path / "private" / "sessions.sqlite3"
+    cache = SessionCache(path=str(path), enabled=True)
+    cache.put("acme", "http://localhost:3000/", "admin", STATE)
+
+    assert stat.S_IMODE(os.stat(path.parent).st_mode) == 0o700
+    for name in os.listdir(path.parent):
+        assert stat.S_IMODE(os.stat(path.parent / name).st_mode) == 0o600, name
+
+
+def test_entries_without_a_tenant_are_dropped(tmp_path):
+    path = tmp_path / "sessions.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE sessions (origin TEXT NOT NULL, identity TEXT NOT NULL, state TEXT NOT NULL, "
+        "created_at REAL NOT NULL, PRIMARY KEY (origin, identity))"
+    )
+    conn.execute("INSERT INTO sessions VALUES ('http://localhost:3000', 'admin', '{}', 0)")
+    conn.commit()
+    conn.close()
+
+    cache = SessionCache(path=str(path), enabled=True)
+    assert cache.stats()["entries"] == 0
@@ -0,0 +1,115 @@
+import pytest
+
+from nova.workflow import WorkflowError, merge_storage_states, plan
+
+URL = "https://shop.example.com/"
+AGENTS = [{"id": "buyer", "actions": ["ignored"]}, {"id": "admin", "actions": []}]
+
+
+def _by_id(branches):
+    return {b.id: b for b in branches}
+
+
+def test_plan_without_workflow_runs_each_agent_on_every_page():
+    branches = plan(URL, ["/cart", "https://shop.example.com/cart", ""], AGENTS)
+
+    assert [b.id for b in branches] == [
+        "buyer", f"buyer@{URL}cart", "admin", f"admin@{URL}cart",
+    ]
+    assert all(b.depends_on == () for b in branches)
+    assert branches[1].agent["url"] == f"{URL}cart"
+
+
+def test_plan_merges_a_linear_chain_on_one_page():
+    branches = plan(URL, [], AGENTS, [
+        {"id": "open", "action": "Open the catalog"},
+        {"id": "pick", "action": "Pick an item", "depends_on": ["open"]},
+        {"id": "pay", "action": "Pay", "depends_on": ["pick"]},
+    ])
+
+    assert len(branches) == 1
+    assert branches[0].id == "open"
+    assert branches[0].agent["actions"] == ["Open the catalog", "Pick an item", "Pay"]
+    assert branches[0].agent["id"] == "open"
+
+
+def test_plan_splits_fan_out_and_merges_fan_in():
+    branches = _by_id(plan(URL, [], AGENTS, [
+        {"id": "login", "page": "/login", "action": "Log in"},
+        {"id": "cart", "page": "/cart", "action": "Add an item", "depends_on": ["login"]},
+        {"id": "profile", "page": "/settings", "action": "Edit the bio", "depends_on": ["login"]},
+        {"id": "checkout", "page": "/cart", "action": "Check out", "depends_on": ["cart", "profile"]},
+    ]))
+
+    assert set(branches) == {"login", "cart", "profile", "checkout"}
+    assert branches["cart"].depends_on == ("login",)
+    assert branches["profile"].depends_on == ("login",)
+    # A fan-in step never joins its parent's chain, even on the same page.
+    assert branches["checkout"].depends_on == ("cart", "profile")
+    assert branches["checkout"].page == f"{URL}cart"
+
+
+def test_plan_orders_branches_after_their_dependencies():
+    branches = plan(URL, [], AGENTS, [
+        {"id": "last", "action": "c", "depends_on": ["middle", "first"]},
+        {"id": "middle", "action": "b", "depends_on": ["first"], "page": "/other"},
+        {"id": "first", "action": "a"},
+    ])
+
+    position = {b.id: i for i, b in enumerate(branches)}
+    for branch in branches:
+        assert all(position[dep] < position[branch.id] for dep in branch.depends_on)
+
+
+def test_plan_does_not_merge_across_agents_or_pages():
+    branches = _by_id(plan(URL, [], AGENTS, [
+        {"id": "a", "action": "a"},
+        {"id": "b", "action": "b", "depends_on": ["a"], "agent": "admin"},
+        {"id": "c", "action": "c", "depends_on": ["b"], "agent": "admin", "page": "/admin"},
+    ]))
+
+    assert set(branches) == {"a", "b", "c"}
+    assert branches["b"].agent["actions"] == ["b"]
+    assert branches["c"].depends_on == ("b",)
+
+
+@pytest.mark.parametrize("workflow, message", [
+    ([{"id": "a", "action": "a", "depends_on": ["b"]}, {"id": "b", "action": "b", "depends_on": ["a"]}], "cycle"),
+    ([{"id": "a", "action": "a", "depends_on": ["a"]}], "cycle"),
+    ([{"id": "a", "action": "a"}, {"id": "a", "action": "b"}], "Duplicate"),
+    ([{"id": "a"}], "no action"),
+    ([{"id": "a", "action": "a", "agent": "nobody"}], "unknown agent"),
+    ([{"id": "a", "action": "a", "depends_on": ["missing"]}], "unknown step"),
+])
+def test_plan_rejects_invalid_workflows(workflow, message):
+    with pytest.raises(WorkflowError, match=message):
+        plan(URL, [], AGENTS, workflow)
+
+
+def test_plan_reports_only_the_steps_in_a_cycle():
+    with pytest.raises(WorkflowError, match="among: b, c$"):
+        plan(URL, [], AGENTS, [
+            {"id": "a", "action": "a"},
+            {"id": "b", "action": "b", "depends_on": ["a", "c"]},
+            {"id": "c", "action": "c", "depends_on": ["b"]},
+        ])
+
+
+def test_plan_needs_an_agent_for_a_workflow():
+    with pytest.raises(WorkflowError):
+        plan(URL, [], [], [{"id": "a", "action": "a"}])
+
+
+def test_merge_storage_states_lets_later_states_win():
+    merged = merge_storage_states([
+        {"cookies": [{"name": "sid", "domain": "d", "path": "/", "value": "old"}],
+         "origins": [{"origin": "o", "localStorage": [{"name": "k", "value": "1"}]}]},
+        None,
+        {"cookies": [{"name": "sid", "domain": "d", "path": "/", "value": "new"}],
+         "origins": [{"origin": "o", "localStorage": [{"name": "k", "value": "2"}]}]},
+    ])
+
+    assert merged["cookies"] == [{"name": "sid", "domain": "d", "path": "/", "value": "new"}]
+    assert merged["origins"] == [{"origin": "o", "localStorage": [{"name": "k", "value": "2"}]}]
+    assert "sessionStorage" not in merged
+    assert merge_storage_states([None, {}]) is None
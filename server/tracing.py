@@ -0,0 +1,240 @@
+"""
+Per-run span timelines, exported in the Chrome trace event format.
+
+A sampled run records a span for every stage it goes through: waiting in the
+scheduler queue, execute_act_run, each agent's thread, browser launch, every
+act_get, URL recovery, page-error scraping, checkpoints, and the database and
+thinking-line writes made on its behalf. Spans are recorded on whichever
+thread, or worker process, did the work. GET /runs/{run_id}/trace returns them
+as JSON that chrome://tracing and ui.perfetto.dev open directly, with one lane
+per thread and spans nested by time.
+
+A run is traced with probability TRACE_SAMPLE_RATE, or always when its request
+sets `"trace": true`. For an untraced run a span costs a context variable
+lookup. A trace holds at most TRACE_MAX_EVENTS spans; later ones are counted
+as dropped. The latest TRACE_KEEP finished traces are kept in memory.
+
+Code working for one run calls `bind(run_id)` once per thread (asyncio tasks
+and asyncio.to_thread inherit the binding), after which `span(name)` is
+attributed to that run. Code serving several runs, like the spool, names the
+runs explicitly. Process-backend workers call `forward_to`, and their spans
+travel back over the job's result queue like metrics samples; the API process
+adds them with `add`.
+"""
+
+import contextvars
+import multiprocessing
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_MAX_EVENTS = int(os.getenv("TRACE_MAX_EVENTS", "20000"))
+TRACE_KEEP = int(os.getenv("TRACE_KEEP", "100"))
+
+_forward: Optional[Callable[[tuple], None]] = None
+_bound_run: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_run_id", default=None)
+
+
+def forward_to(fn: Optional[Callable[[tuple], None]]):
+    """Send spans to `fn` instead of recording them locally (used by worker processes)."""
+    global _forward
+    _forward = fn
+
+
+def _now_us() -> int:
+    # Wall clock, so spans from worker processes line up with the API's.
+    return time.time_ns() // 1000
+
+
+class _Trace:
+    def __init__(self):
+        self.queued_at = _now_us()
+        self.events: List[dict] = []
+        self.processes: Dict[int, str] = {}
+        self.threads: Dict[Tuple[int, int], str] = {}
+        self.dropped = 0
+        self.finished = False
+
+
+class Tracer:
+    def __init__(self, sample_rate: float = TRACE_SAMPLE_RATE, max_events: int = TRACE_MAX_EVENTS, keep: int = TRACE_KEEP):
+        self.sample_rate = sample_rate
+        self.max_events = max(1, max_events)
+        self.keep = max(1, keep)
+        self._lock = threading.Lock()
+        self._traces: "OrderedDict[str, _Trace]" = OrderedDict()
+        self._counters = {"sampled": 0, "unsampled": 0, "dropped_events": 0}
+
+    def start(self, run_id: str, sampled: Optional[bool] = None) -> bool:
+        """
+        Decide whether `run_id` is traced, by sampling unless `sampled` is
+        given. A run that still has a trace (a resumed run) adds to it.
+        """
+        if sampled is None:
+            sampled = random.random() < self.sample_rate
+        with self._lock:
+            trace = self._traces.get(run_id)
+            if trace is not None:
+                trace.queued_at = _now_us()
+                trace.finished = False
+                self._traces.move_to_end(run_id)
+                return True
+            self._counters["sampled" if sampled else "unsampled"] += 1
+            if sampled:
+                self._traces[run_id] = _Trace()
+        return sampled
+
+    def sampled(self, run_id: Optional[str]) -> bool:
+        return run_id is not None and run_id in self._traces
+
+    @contextmanager
+    def bind(self, run_id: Optional[str]) -> Iterator[None]:
+        """Attribute spans opened by the current thread or task to `run_id`."""
+        token = _bound_run.set(run_id)
+        try:
+            yield
+        finally:
+            _bound_run.reset(token)
+
+    @contextmanager
+    def run(self, run_id: str, name: str) -> Iterator[None]:
+        """
+        Bind the current task to `run_id`, record how long the run was queued
+        and a `name` span around the body, then finish the trace.
+        """
+        with self.bind(run_id):
+            trace = self._traces.get(run_id)
+            if trace is not None:
+                self.record("queued", trace.queued_at, _now_us() - trace.queued_at)
+            try:
+                with self.span(name):
+                    yield
+            finally:
+                self.finish(run_id)
+
+    @contextmanager
+    def span(self, name: str, run_id: Optional[str] = None, **args) -> Iterator[None]:
+        """Time the body as a span of `run_id`, or of the bound run. No-op for untraced runs."""
+        run_id = run_id or _bound_run.get()
+        if run_id is None or (_forward is None and run_id not in self._traces):
+            yield
+            return
+        with self._timed(name, [run_id], args):
+            yield
+
+    @contextmanager
+    def span_each(self, name: str, run_ids: Iterable[str], **args) -> Iterator[None]:
+        """Time the body once and record it as a span of every traced run in `run_ids`."""
+        traced = [r for r in set(run_ids) if r in self._traces]
+        if not traced:
+            yield
+            return
+        with self._timed(name, traced, args):
+            yield
+
+    def record(self, name: str, start_us: int, dur_us: int, run_id: Optional[str] = None, **args):
+        """Record a span of `run_id`, or of the bound run, that was timed elsewhere."""
+        run_id = run_id or _bound_run.get()
+        if run_id is not None and (_forward is not None or run_id in self._traces):
+            self._emit(run_id, name, start_us, dur_us, args)
+
+    def add(self, run_id: str, record: dict, process_name: str, thread_name: str):
+        """Add a span recorded on `thread_name` of `process_name` (possibly a worker process)."""
+        with self._lock:
+            trace = self._traces.get(run_id)
+            if trace is None:
+                return
+            if len(trace.events) >= self.max_events:
+                trace.dropped += 1
+                self._counters["dropped_events"] += 1
+                return
+            trace.events.append(record)
+            trace.processes.setdefault(record["pid"], process_name)
+            trace.threads.setdefault((record["pid"], record["tid"]), thread_name)
+
+    def finish(self, run_id: str):
+        """Mark the trace complete; only the latest `keep` finished traces are kept."""
+        with self._lock:
+            trace = self._traces.get(run_id)
+            if trace is None:
+                return
+            trace.finished = True
+            finished = [r for r, t in self._traces.items() if t.finished]
+            for old in finished[:max(0, len(finished) - self.keep)]:
+                del self._traces[old]
+
+    def export(self, run_id: str) -> Optional[dict]:
+        """The run's trace in the Chrome trace event format, or None if it was not traced."""
+        with self._lock:
+            trace = self._traces.get(run_id)
+            if trace is None:
+                return None
+            events = sorted(trace.events, key=lambda e: e["ts"])
+            processes = dict(trace.processes)
+            threads = dict(trace.threads)
+            dropped, finished = trace.dropped, trace.finished
+
+        metadata = [
+            {"name": "process_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": name}}
+            for pid, name in processes.items()
+        ] + [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for (pid, tid), name in threads.items()
+        ]
+        return {
+            "traceEvents": metadata + events,
+            "displayTimeUnit": "ms",
+            "otherData": {"run_id": run_id, "finished": finished, "dropped_events": dropped},
+        }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "sample_rate": self.sample_rate,
+                "max_events": self.max_events,
+                "traces": len(self._traces),
+                "active": sum(1 for t in self._traces.values() if not t.finished),
+                **self._counters,
+            }
+
+    # ── Internals ──────────────────────────────────────────────────────────────
+
+    @contextmanager
+    def _timed(self, name: str, run_ids: List[str], args: dict) -> Iterator[None]:
+        """Record the body as a span of each of `run_ids`, noting an escaping exception in its args."""
+        start = _now_us()
+        started = time.perf_counter_ns()
+        try:
+            yield
+        except BaseException as e:
+            args["error"] = type(e).__name__
+            raise
+        finally:
+            duration = (time.perf_counter_ns() - started) // 1000
+            for run_id in run_ids:
+                self._emit(run_id, name, start, duration, args)
+
+    def _emit(self, run_id: str, name: str, start_us: int, dur_us: int, args: dict):
+        thread = threading.current_thread()
+        record = {
+            "name": name,
+            "ph": "X",
+            "ts": start_us,
+            "dur": dur_us,
+            "pid": os.getpid(),
+            "tid": thread.native_id or thread.ident,
+            "args": args,
+        }
+        process_name = multiprocessing.current_process().name
+        if _forward is not None:
+            _forward((run_id, record, process_name, thread.name))
+        else:
+            self.add(run_id, record, process_name, thread.name)
+
+
+tracer = Tracer()
@@ -0,0 +1,46 @@
+// proxy a run's live event stream (server-sent events) from the Nova Act API
+
+const NOVA_ACT_API_URL = process.env.NOVA_ACT_API_URL;
+
+if (!NOVA_ACT_API_URL) {
+    throw new Error("Nova Act configuration is missing");
+}
+
+export const dynamic = 'force-dynamic';
+
+export async function GET(request: Request) {
+    const { searchParams } = new URL(request.url);
+    const runId = searchParams.get('run_id');
+    if (!runId) {
+        return new Response(JSON.stringify({ error: "Missing run_id" }), {
+            status: 400,
+            headers: { "Content-Type": "application/json" }
+        });
+    }
+
+    // EventSource sends Last-Event-ID when it reconnects; pass it on so the
+    // stream resumes where it stopped.
+    const headers: Record<string, string> = { Accept: 'text/event-stream' };
+    const lastEventId = request.headers.get('Last-Event-ID');
+    if (lastEventId) headers['Last-Event-ID'] = lastEventId;
+
+    const res = await fetch(`${NOVA_ACT_API_URL}/runs/${encodeURIComponent(runId)}/events`, {
+        headers,
+        cache: 'no-store',
+        signal: request.signal,
+    });
+    if (!res.ok || !res.body) {
+        return new Response(JSON.stringify({ error: "No live event stream" }), {
+            status: res.status === 200 ? 502 : res.status,
+            headers: { "Content-Type": "application/json" }
+        });
+    }
+    return new Response(res.body, {
+        status: 200,
+        headers: {
+            "Content-Type": "text/event-stream",
+            "Cache-Control": "no-cache, no-transform",
+            "Connection": "keep-alive",
+        }
+    });
+}
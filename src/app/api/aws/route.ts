@@ -7,16 +7,18 @@ if (!NOVA_ACT_API_URL) {
 }
 
 export async function POST(request: Request) {
+    const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+    const idempotencyKey = request.headers.get('Idempotency-Key');
+    if (idempotencyKey) headers['Idempotency-Key'] = idempotencyKey;
+
     const res = await fetch(`${NOVA_ACT_API_URL}/start-act`, {
         method: 'POST',
-        headers: {
-            'Content-Type': 'application/json',
-        },
+        headers,
         body: JSON.stringify(await request.json())
     });
     if (res.ok) {
         const data = await res.json();
-        // { run_id: string }
+        // { run_id: string, coalesced: boolean } — coalesced runs are already in flight
         return new Response(JSON.stringify({ message: "Job started successfully", data }), {
             status: 200,
             headers: {
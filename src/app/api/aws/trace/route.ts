@@ -0,0 +1,35 @@
+// proxy a run's span timeline (Chrome trace JSON) from the Nova Act API as a download
+
+const NOVA_ACT_API_URL = process.env.NOVA_ACT_API_URL;
+
+if (!NOVA_ACT_API_URL) {
+    throw new Error("Nova Act configuration is missing");
+}
+
+export const dynamic = 'force-dynamic';
+
+export async function GET(request: Request) {
+    const { searchParams } = new URL(request.url);
+    const runId = searchParams.get('run_id');
+    if (!runId) {
+        return new Response(JSON.stringify({ error: "Missing run_id" }), {
+            status: 400,
+            headers: { "Content-Type": "application/json" }
+        });
+    }
+
+    const res = await fetch(`${NOVA_ACT_API_URL}/runs/${encodeURIComponent(runId)}/trace`, { cache: 'no-store' });
+    if (!res.ok) {
+        return new Response(JSON.stringify({ error: res.status === 404 ? "This run was not traced" : "Trace unavailable" }), {
+            status: res.status,
+            headers: { "Content-Type": "application/json" }
+        });
+    }
+    return new Response(res.body, {
+        status: 200,
+        headers: {
+            "Content-Type": "application/json",
+            "Content-Disposition": `attachment; filename="trace-${runId}.json"`,
+        }
+    });
+}
@@ -1,6 +1,7 @@
 import { createClient } from '@supabase/supabase-js';
 import { NextResponse } from 'next/server';
 import { verifyJWT } from '@/lib/jwt';
+import { expandEvents } from '@/lib/eventCodec';
 import type { TestRun, TestRunEvent, Agent, Project } from '@/types/nova';
 
 const supabaseUrl = process.env.SUPABASE_URL!;
@@ -145,7 +146,7 @@ export async function GET(request: Request) {
             .eq('run_id', runId)
             .order('created_at', { ascending: true });
         if (error) return NextResponse.json({ error: error.message }, { status: 500 });
-        return NextResponse.json(data.map(rowToTestRunEvent));
+        return NextResponse.json(await expandEvents(data.map(rowToTestRunEvent)));
     }
 
     if (resource === 'fault-counts') {
@@ -7,6 +7,7 @@ import { TestRun, TestRunEvent, Fault } from '@/types/nova';
 import { useState, useEffect } from 'react';
 import { getTestRunFresh, getTestRunEvents } from '@/lib/supabase';
 import { supabase } from '@/lib/supabaseClient';
+import { expandEvent } from '@/lib/eventCodec';
 
 function applyEvents(events: TestRunEvent[]): { logs: string[]; thinking: string[]; faults: Fault[] } {
     const logs: string[] = [];
@@ -18,13 +19,20 @@ function applyEvents(events: TestRunEvent[]): { logs: string[]; thinking: string
             const parsed = JSON.parse(event.data);
             if (event.type === 'metadata') logs.push('Metadata: ' + JSON.stringify(parsed));
             else if (event.type === 'thinking') {
-                if (parsed[4] === '>') thinking.push(parsed);
-                else logs.push(parsed);
+                // Thinking events carry a batch of lines (older runs stored one line per event).
+                for (const line of Array.isArray(parsed) ? parsed : [parsed]) {
+                    if (line[4] === '>') thinking.push(line);
+                    else logs.push(line);
+                }
             }
             else if (event.type === 'fault') {
                 if (Array.isArray(parsed)) faults.push(...parsed);
                 else faults.push(parsed);
             }
+            else if (event.type === 'step_timeout') {
+                const limit = parsed.reason === 'timeout' ? `${parsed.timeout}s deadline` : `${parsed.max_steps}-step budget`;
+                logs.push(`Step ${parsed.step} (${parsed.agent_id}) aborted after ${parsed.elapsed}s: exceeded its ${limit}`);
+            }
         } catch {
             if (event.type === 'thinking') logs.push(event.data);
         }
@@ -49,15 +57,57 @@ export default function TestDetailPage() {
     useEffect(() => {
         if (!testId) return;
 
+        // While the API's live stream is connected it is the source of events
+        // and Realtime inserts are ignored; without it (finished run, another
+        // API worker, lost events) the page reads the database and Realtime.
+        let live = false;
+
         Promise.all([
             getTestRunFresh(testId),
             getTestRunEvents(testId),
         ]).then(([r, e]) => {
             setRun(r);
-            setEvents(e);
+            if (!live) setEvents(e);
             setLoadError(false);
         }).catch(() => setLoadError(true));
 
+        const stream = new EventSource(`/api/aws/events?run_id=${encodeURIComponent(testId)}`);
+        const fallBack = () => {
+            stream.close();
+            if (!live) return;
+            live = false;
+            getTestRunEvents(testId).then(setEvents).catch(() => setLoadError(true));
+        };
+        stream.onmessage = (msg) => {
+            const { type, data, created_at } = JSON.parse(msg.data);
+            if (type === 'status') {
+                setRun(prev => prev && { ...prev, status: data });
+                return;
+            }
+            const event: TestRunEvent = {
+                id: `live-${msg.lastEventId}`,
+                run_id: testId,
+                type,
+                data: JSON.stringify(data),
+                created_at,
+            };
+            // The stream starts from the run's first event unless it reports a gap.
+            if (!live) {
+                live = true;
+                setEvents([event]);
+            } else {
+                setEvents(prev => [...prev, event]);
+            }
+        };
+        stream.addEventListener('gap', fallBack);
+        stream.addEventListener('reset', fallBack);
+        stream.addEventListener('end', () => stream.close());
+        stream.onerror = () => {
+            // EventSource reconnects on its own (resuming via Last-Event-ID)
+            // unless the stream was refused.
+            if (stream.readyState === EventSource.CLOSED) fallBack();
+        };
+
         // Watch for status/duration updates on the run row
         const runChannel = supabase
             .channel(`test-run-detail-${testId}`)
@@ -82,26 +132,33 @@ export default function TestDetailPage() {
             .subscribe();
 
         // Watch for new events — filter client-side by run_id since server-side
-        // filter requires RLS to be enabled on the table
+        // filter requires RLS to be enabled on the table. Compact batches are
+        // decoded asynchronously, so decoding is chained to keep arrival order.
+        let decoded: Promise<void> = Promise.resolve();
         const eventsChannel = supabase
             .channel(`test-run-events-${testId}`)
             .on(
                 'postgres_changes',
                 { event: 'INSERT', schema: 'public', table: 'test_run_events' },
                 ({ new: row }) => {
-                    if (row.run_id !== testId) return;
-                    setEvents(prev => [...prev, {
+                    if (row.run_id !== testId || live) return;
+                    const event: TestRunEvent = {
                         id: row.id,
                         run_id: row.run_id,
                         type: row.type,
                         data: row.data,
                         created_at: row.created_at,
-                    }]);
+                    };
+                    decoded = decoded
+                        .then(() => expandEvent(event))
+                        .then(expanded => setEvents(prev => [...prev, ...expanded]))
+                        .catch(err => console.error('Failed to decode run events', err));
                 }
             )
             .subscribe();
 
         return () => {
+            stream.close();
             supabase.removeChannel(runChannel);
             supabase.removeChannel(eventsChannel);
         };
@@ -109,6 +166,7 @@ export default function TestDetailPage() {
 
     const statusBadge = (status: TestRun['status']) => {
         const styles = {
+            queued: 'bg-amber-500/15 text-amber-400',
             running: 'bg-blue-500/15 text-blue-400',
             completed: 'bg-emerald-500/15 text-emerald-400',
             failed: 'bg-rose-500/15 text-rose-400',
@@ -15,6 +15,10 @@ function isValidUrl(url: string) {
     try { new URL(url); return true; } catch { return false; }
 }
 
+function isActive(status: TestRun['status']) {
+    return status === 'queued' || status === 'running';
+}
+
 export default function TestPage() {
     const params = useParams();
     const repositoryId = Number(params.repository_id);
@@ -45,14 +49,14 @@ export default function TestPage() {
                     getFaultCounts(repositoryId),
                 ]);
                 const sanitised = runs.map(r =>
-                    r.status === 'running' && !channelsRef.current[r.id]
+                    isActive(r.status) && !channelsRef.current[r.id]
                         ? { ...r, status: 'failed' as const }
                         : r
                 );
                 setTestRuns(sanitised);
                 setFaultCounts(counts);
                 for (const orig of runs) {
-                    if (orig.status === 'running' && !channelsRef.current[orig.id]) {
+                    if (isActive(orig.status) && !channelsRef.current[orig.id]) {
                         const fixed = sanitised.find(r => r.id === orig.id)!;
                         saveTestRun(fixed).catch(console.error);
                     }
@@ -111,7 +115,7 @@ export default function TestPage() {
                         duration: row.duration,
                     };
                     setTestRuns(prev => prev.map(r => r.id === runId ? updated : r));
-                    if (updated.status !== 'running') {
+                    if (!isActive(updated.status)) {
                         supabase.removeChannel(runChannel);
                         supabase.removeChannel(faultChannel);
                         delete channelsRef.current[runId];
@@ -146,6 +150,7 @@ export default function TestPage() {
             session_id: `session-${Date.now()}`,
             url: testUrl,
             pages: subpages,
+            repo_id: repositoryId,
             agent_config: [defaultUiAgent],
         };
 
@@ -165,7 +170,12 @@ export default function TestPage() {
                 duration: '—',
             };
 
-            setTestRuns(prev => [newRun, ...prev]);
+            // A duplicate launch may be handed a run that is already listed.
+            if (channelsRef.current[runId]) {
+                setView('list');
+                return;
+            }
+            setTestRuns(prev => [newRun, ...prev.filter(r => r.id !== runId)]);
             setFaultCounts(prev => ({ ...prev, [runId]: 0 }));
             await saveTestRun(newRun);
             subscribeToRun(runId);
@@ -2,9 +2,11 @@ import { TestRun } from '@/types/nova';
 
 export default function StatusBadge({ status }: { status: TestRun['status'] }) {
     const styles = {
+        queued: 'bg-amber-500/15 text-amber-400',
         running: 'bg-blue-500/15 text-blue-400',
         completed: 'bg-emerald-500/15 text-emerald-400',
         failed: 'bg-rose-500/15 text-rose-400',
+        cancelled: 'bg-rose-500/15 text-rose-400',
     };
 
     return (
@@ -0,0 +1,75 @@
+import { TestRunEvent, TestRunEventType } from "@/types/nova";
+
+// Decoder for the compact test_run_events format written by server/event_codec.py.
+//
+// A row of type "batch" carries several events of one run in its data column:
+//   nf1:j:<envelope JSON>
+//   nf1:z:<base64 of the zlib-compressed envelope JSON>
+// where the envelope is {"v": 1, "s": firstSeq, "t": firstEpochMs, "e": [[typeCode, msSincePrevious, data], ...]}.
+// Other rows are in the legacy one-event-per-row format and pass through unchanged.
+
+const PREFIX = "nf1:";
+const FORMAT_VERSION = 1;
+const BATCH_TYPE = "batch";
+
+const TYPE_NAMES: Record<string, string> = {
+    m: "metadata",
+    t: "thinking",
+    f: "fault",
+    p: "page_error",
+    e: "error",
+    s: "status",
+    d: "step_timeout",
+};
+
+type Envelope = {
+    v: number;
+    s: number | null;
+    t: number;
+    e: [string, number, unknown][];
+};
+
+async function inflate(base64: string): Promise<string> {
+    const bytes = Uint8Array.from(atob(base64), c => c.charCodeAt(0));
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("deflate"));
+    return new Response(stream).text();
+}
+
+export async function decodeEnvelope(data: string): Promise<Envelope> {
+    if (!data.startsWith(PREFIX)) throw new Error("Not a compact event envelope");
+    const rest = data.slice(PREFIX.length);
+    const codec = rest.slice(0, rest.indexOf(":"));
+    const payload = rest.slice(codec.length + 1);
+
+    let text: string;
+    if (codec === "j") text = payload;
+    else if (codec === "z") text = await inflate(payload);
+    else throw new Error(`Unsupported envelope codec '${codec}'`);
+
+    const envelope = JSON.parse(text) as Envelope;
+    if (envelope.v !== FORMAT_VERSION) throw new Error(`Unsupported envelope version ${envelope.v}`);
+    return envelope;
+}
+
+/** Expand a stored row into legacy-shaped events, with `data` as a JSON string. */
+export async function expandEvent(event: TestRunEvent): Promise<TestRunEvent[]> {
+    if ((event.type as string) !== BATCH_TYPE) return [event];
+
+    const envelope = await decodeEnvelope(event.data);
+    let at = envelope.t;
+    return envelope.e.map(([code, delta, data], i) => {
+        at += delta;
+        return {
+            id: `${event.id}:${i}`,
+            run_id: event.run_id,
+            type: (TYPE_NAMES[code] ?? code) as TestRunEventType,
+            data: JSON.stringify(data),
+            created_at: new Date(at).toISOString(),
+            seq: envelope.s === null ? undefined : envelope.s + i,
+        };
+    });
+}
+
+export async function expandEvents(events: TestRunEvent[]): Promise<TestRunEvent[]> {
+    return (await Promise.all(events.map(expandEvent))).flat();
+}
@@ -1,9 +1,11 @@
 import { ActRequestBody } from "@/types/nova";
 
 export async function startNovaActJob(data: ActRequestBody): Promise<string> {
+    // Retries of the same launch carry the same session_id, so the server
+    // hands them the run it already started.
     const response = await fetch("/api/aws", {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: { 'Content-Type': 'application/json', 'Idempotency-Key': data.session_id },
         body: JSON.stringify(data),
     });
 
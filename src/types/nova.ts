@@ -19,11 +19,13 @@ export type ActRequestBody = {
     session_id: string;
     url: string;
     pages: string[];
+    repo_id?: number;
+    priority?: number;
     auto_approve_inputs?: boolean;
     agent_config: Agent[];
 }
 
-export type TestRunStatus = 'running' | 'completed' | 'failed' | 'cancelled';
+export type TestRunStatus = 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
 
 export type TestRun = {
     id: string;
@@ -38,7 +40,7 @@ export type TestRun = {
     duration: string;
 }
 
-export type TestRunEventType = 'metadata' | 'fault' | 'thinking';
+export type TestRunEventType = 'metadata' | 'fault' | 'thinking' | 'page_error' | 'step_timeout';
 
 export type TestRunEvent = {
     id: string;
@@ -46,6 +48,7 @@ export type TestRunEvent = {
     type: TestRunEventType;
     data: string;       // text column — JSON-encoded string from the server
     created_at: string;
+    seq?: number;       // per-run sequence number, for events expanded from a compact batch
 }
 
 export type Fault = {